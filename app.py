@@ -1,12 +1,30 @@
-from fastapi import FastAPI, HTTPException, Request
+from fastapi import FastAPI, HTTPException, Query, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+import asyncio
+import hmac
+import json
+import signal
+import time
 import uvicorn
-from pydantic import BaseModel
-from typing import List, Optional
+from pydantic import BaseModel, Field
+from typing import Any, Dict, List, Optional, Union
 
+from config import config
+from services import metrics
+from services.catalog_payload import etag_matches, page_etag
+from services.catalog_watcher import CatalogWatcher
+from services.coview_model import CoViewModel
+from services.fallback_ranker import FallbackRanker
 from services.llm_service import LLMService
+from services.product_record import json_default
 from services.product_service import ProductService
+from services.persistent_cache import PersistentRecommendationStore
+from services.precompute_scheduler import PrecomputeScheduler
+from services.recommendation_cache import RecommendationCache
+from services.request_profiler import RequestProfiler
+from services.retrieval_service import RetrievalService
+from services.session_store import SequenceGap, SessionStore, session_key
 
 app = FastAPI(title="AI Product Recommendation API")
 
@@ -21,17 +39,91 @@ app.add_middleware(
 
 # Initialize services
 product_service = ProductService()
-llm_service = LLMService()
+coview_model = CoViewModel() if config['COVIEW_ENABLED'] else None
+retrieval_service = RetrievalService(product_service, coview=coview_model)
+recommendation_cache = RecommendationCache()
+recommendation_store = PersistentRecommendationStore() if config['PERSISTENT_CACHE_PATH'] else None
+fallback_ranker = FallbackRanker(product_service, retrieval_service)
+llm_service = LLMService(product_service, retrieval_service, recommendation_cache, fallback_ranker, recommendation_store)
+if config['PRECOMPUTE_ENABLED']:
+    llm_service.precomputer = PrecomputeScheduler(llm_service)
+session_store = SessionStore(product_service)
+catalog_watcher = CatalogWatcher(product_service, config['CATALOG_WATCH_INTERVAL_SECONDS'])
+request_profiler = RequestProfiler()
+
+# Gauges read at scrape time
+metrics.CATALOG_VERSION.set_function(lambda: product_service.version)
+metrics.CACHE_ENTRIES.set_function(lambda: recommendation_cache.stats()["entries"])
+metrics.CACHE_BYTES.set_function(lambda: recommendation_cache.stats()["bytes"])
+metrics.SESSIONS.set_function(lambda: len(session_store))
+
+@app.middleware("http")
+async def record_request_timing(request: Request, call_next):
+    """
+    Time every request by route, report its recommendation stages in a Server-Timing header,
+    offer it to the slow-request log and profile it when sampled or asked to
+    """
+    stages = {}
+    details = {}
+    stages_token = metrics.request_stages.set(stages)
+    details_token = metrics.request_details.set(details)
+    profile = request_profiler.start(request.headers)
+    start = time.perf_counter()
+    try:
+        response = await call_next(request)
+    finally:
+        elapsed = time.perf_counter() - start
+        started_at = time.time() - elapsed
+        metrics.request_stages.reset(stages_token)
+        metrics.request_details.reset(details_token)
+        if profile is not None:
+            profile_id = request_profiler.finish(profile, {
+                "path": request.url.path,
+                "method": request.method,
+                "duration_ms": round(elapsed * 1000, 2),
+                "started_at": started_at,
+            })
+
+    route = request.scope.get("route")
+    route = route.path if route is not None else "unmatched"
+    metrics.HTTP_REQUEST_SECONDS.observe(elapsed, route=route, method=request.method, status=response.status_code)
+    request_profiler.record({
+        "route": route,
+        "path": request.url.path,
+        "method": request.method,
+        "status": response.status_code,
+        "duration_ms": round(elapsed * 1000, 2),
+        "started_at": started_at,
+        "stages_ms": {stage: round(seconds * 1000, 2) for stage, seconds in stages.items()},
+        "details": details,
+        "profile_id": profile_id if profile is not None else None,
+    })
+    if profile is not None:
+        response.headers["X-Profile-Id"] = profile_id
+    # Streamed responses send their headers before the LLM stage, so they only carry the earlier stages
+    timings = [f"{stage};dur={seconds * 1000:.2f}" for stage, seconds in stages.items()]
+    timings.append(f"app;dur={elapsed * 1000:.2f}")
+    response.headers["Server-Timing"] = ", ".join(timings)
+    return response
 
 # Models
 class UserPreferences(BaseModel):
     priceRange: str = "all"
     categories: List[str] = []
     brands: List[str] = []
+    inStock: bool = False
 
 class RecommendationRequest(BaseModel):
     preferences: UserPreferences
-    browsing_history: List[str] = []
+    # Omit to use the session's server-side history; history_seq is how many history
+    # items the client has sent, so a session the server lost is detected
+    browsing_history: Optional[List[str]] = None
+    history_seq: Optional[int] = Field(None, ge=0)
+
+class HistoryDelta(BaseModel):
+    append: List[str] = []
+    seq: Optional[int] = Field(None, ge=0)
+    reset: bool = False
 
 class Product(BaseModel):
     id: str
@@ -46,6 +138,12 @@ class Product(BaseModel):
     inventory: Optional[int]
     tags: Optional[List[str]]
 
+class ProductPage(BaseModel):
+    # With fields=..., each item carries only those fields (always including id)
+    products: List[Dict[str, Any]]
+    next_cursor: Optional[str] = None
+    total: int
+
 class Recommendation(BaseModel):
     product: Product
     explanation: str
@@ -54,22 +152,181 @@ class Recommendation(BaseModel):
 class RecommendationResponse(BaseModel):
     recommendations: List[Recommendation]
     count: int
+    source: str = "llm"  # "llm", "cache" or "fallback"
+    fallback_reason: Optional[str] = None
+
+async def reload_catalog():
+    """
+    Rebuild the catalog in a worker thread so requests keep being served from the current snapshot
+    """
+    snapshot, changed = await asyncio.to_thread(product_service.reload)
+    return {**snapshot.info(), "changed": changed}
+
+def _reload_on_signal():
+    async def run():
+        try:
+            result = await reload_catalog()
+            print(f"Catalog reload on SIGHUP: version {result['version']} (changed: {result['changed']})")
+        except Exception as e:
+            print(f"Catalog reload on SIGHUP failed, keeping version {product_service.version}: {str(e)}")
+    asyncio.ensure_future(run())
+
+@app.on_event("startup")
+async def start_catalog_reloaders():
+    if hasattr(signal, "SIGHUP"):
+        try:
+            asyncio.get_running_loop().add_signal_handler(signal.SIGHUP, _reload_on_signal)
+        except (RuntimeError, NotImplementedError, ValueError) as e:
+            # Signal handlers need the main thread (not the case under TestClient or embedded servers)
+            print(f"Catalog reload on SIGHUP unavailable: {str(e)}")
+    if config['CATALOG_WATCH_INTERVAL_SECONDS'] > 0:
+        catalog_watcher.start()
+
+@app.on_event("startup")
+async def warm_recommendation_cache():
+    # Load the most requested persisted answers before serving, so a restart does not start cold
+    if recommendation_store is not None and config['PERSISTENT_CACHE_WARM_ENTRIES'] > 0:
+        loaded = await asyncio.to_thread(llm_service.warm_cache, config['PERSISTENT_CACHE_WARM_ENTRIES'])
+        print(f"Warmed the recommendation cache with {loaded} persisted results")
+
+@app.on_event("startup")
+async def start_precompute():
+    if llm_service.precomputer is not None:
+        llm_service.precomputer.start()
+
+@app.on_event("shutdown")
+async def close_llm_client():
+    catalog_watcher.stop()
+    if llm_service.precomputer is not None:
+        await llm_service.precomputer.stop()
+    await llm_service.aclose()
+    if recommendation_store is not None:
+        await asyncio.to_thread(recommendation_store.close)
+
+def _split_params(values):
+    """
+    Flatten repeated and comma-separated query parameter values
+    """
+    return [v.strip() for value in values or [] for v in value.split(",") if v.strip()]
+
+# Query parameters that select the paged response; any others (cache busters, tracking) are ignored
+_PAGE_PARAMS = frozenset(("limit", "cursor", "fields", "category", "brand", "min_price", "max_price", "in_stock"))
+
+# Without paging parameters the whole catalog is returned as one pre-serialized, compressed body;
+# clients revalidate with If-None-Match and get a 304 while the catalog is unchanged.
+# With a non-empty limit/cursor/fields or a filter, one page is returned as
+# {"products": [...], "next_cursor": ..., "total": ...} in product ID order, with an ETag
+# derived from the catalog fingerprint and the query so unchanged pages revalidate to a 304.
+@app.get("/api/products", response_model=Union[List[Product], ProductPage])
+async def get_products(
+    request: Request,
+    limit: Optional[int] = Query(None, ge=1, le=1000),
+    cursor: Optional[str] = None,
+    fields: Optional[str] = None,
+    category: Optional[List[str]] = Query(None),
+    brand: Optional[List[str]] = Query(None),
+    min_price: Optional[float] = Query(None, ge=0),
+    max_price: Optional[float] = Query(None, ge=0),
+    in_stock: bool = False,
+):
+    page_query = [(key, value) for key, value in request.query_params.multi_items() if key in _PAGE_PARAMS and value]
+    if page_query:
+        projection = _split_params([fields]) if fields else None
+        if projection:
+            unknown = [f for f in projection if f not in Product.model_fields]
+            if unknown:
+                raise HTTPException(status_code=400, detail=f"Unknown product fields: {', '.join(unknown)}")
+            # The id is always kept so clients can key and reference the projected items
+            projection = ["id"] + [f for f in dict.fromkeys(projection) if f != "id"]
+        catalog = product_service.snapshot
+        headers = {"ETag": page_etag(catalog.fingerprint, page_query), "Cache-Control": "no-cache"}
+        if etag_matches(request.headers.get("if-none-match"), [headers["ETag"]]):
+            return Response(status_code=304, headers=headers)
+        try:
+            page = product_service.page_products(
+                limit or 100,
+                cursor=cursor,
+                fields=projection,
+                categories=_split_params(category),
+                brands=_split_params(brand),
+                min_price=min_price,
+                max_price=max_price,
+                in_stock=in_stock,
+                catalog=catalog,
+            )
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        return JSONResponse(page, headers=headers)
+
+    payload = product_service.catalog_payload
+    coding, body, etag = payload.select(request.headers.get("accept-encoding"))
+    headers = {"ETag": etag, "Cache-Control": "no-cache", "Vary": "Accept-Encoding"}
+    if payload.matches(request.headers.get("if-none-match")):
+        return Response(status_code=304, headers=headers)
+    if coding is not None:
+        headers["Content-Encoding"] = coding
+    return Response(content=body, media_type="application/json", headers=headers)
+
+@app.get("/api/products/{product_id}/similar", response_model=List[Product])
+async def get_similar_products(product_id: str, limit: int = Query(5, ge=1, le=50)):
+    similar = product_service.get_similar_products(product_id, limit)
+    if similar is None:
+        raise HTTPException(status_code=404, detail=f"Product '{product_id}' not found.")
+    return similar
+
+def _session_key(http_request: Request):
+    return session_key(http_request.headers.get("authorization"), http_request.headers.get("x-session-id"))
+
+def _require_session_key(http_request: Request):
+    key = _session_key(http_request)
+    if key is None:
+        raise HTTPException(status_code=400, detail="Send an X-Session-Id header or a signed bearer token.")
+    return key
+
+def _require_admin(http_request: Request):
+    token = config['ADMIN_TOKEN']
+    if not token:
+        raise HTTPException(status_code=403, detail="Admin endpoint disabled; set ADMIN_TOKEN to enable it.")
+    sent = http_request.headers.get("x-admin-token", "")
+    if not hmac.compare_digest(sent.encode("utf-8"), token.encode("utf-8")):
+        raise HTTPException(status_code=401, detail="Missing or invalid X-Admin-Token header.")
+
+def _resolve_history(request: RecommendationRequest, http_request: Request):
+    """
+    (browsing_history, SessionHistory or None): the history sent with the request,
+    else the one kept in the caller's session
+    """
+    if request.browsing_history is not None:
+        return request.browsing_history, None
+    key = _session_key(http_request)
+    history = session_store.history(key) if key is not None else None
+    received = history.received if history is not None else 0
+    if request.history_seq is not None and request.history_seq > received:
+        raise HTTPException(status_code=409, detail=f"Session history is missing items; the server has received {received}.")
+    if history is None:
+        return [], None
+    return list(history.ids), history
 
-@app.get("/api/products", response_model=List[Product])
-async def get_products():
-    return product_service.get_all_products()
+def _record_coviews(browsing_history):
+    """
+    Feed the co-view model the history's catalog products; unknown ids would
+    otherwise take slots in its bounded item table
+    """
+    if coview_model is not None:
+        products_by_id = product_service.snapshot.products_by_id
+        coview_model.record([pid for pid in browsing_history if pid in products_by_id])
 
 @app.post("/api/recommendations", response_model=RecommendationResponse)
-async def get_recommendations(request: RecommendationRequest):
+async def get_recommendations(request: RecommendationRequest, http_request: Request):
     try:
         user_preferences = request.preferences.dict()
-        browsing_history = request.browsing_history
-        all_products = product_service.get_all_products()
+        browsing_history, history = _resolve_history(request, http_request)
+        _record_coviews(browsing_history)
 
-        recommendations = llm_service.generate_recommendations(
+        recommendations = await llm_service.arecommend(
             user_preferences,
             browsing_history,
-            all_products
+            history
         )
 
         if "recommendations" not in recommendations or len(recommendations["recommendations"]) == 0:
@@ -82,6 +339,122 @@ async def get_recommendations(request: RecommendationRequest):
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
 
+# Server-sent events: one "recommendation" event per item as soon as the LLM produces it,
+# then a final "done" event (or an "error" event if the upstream call fails)
+@app.post("/api/recommendations/stream")
+async def stream_recommendations(request: RecommendationRequest, http_request: Request):
+    user_preferences = request.preferences.dict()
+    browsing_history, history = _resolve_history(request, http_request)
+    _record_coviews(browsing_history)
+
+    async def events():
+        count = 0
+        try:
+            async for recommendation in llm_service.astream_recommendations(user_preferences, browsing_history, history):
+                count += 1
+                yield f"event: recommendation\ndata: {json.dumps(recommendation, default=json_default)}\n\n"
+            yield f"event: done\ndata: {json.dumps({'count': count})}\n\n"
+        except Exception as e:
+            yield f"event: error\ndata: {json.dumps({'detail': str(e)})}\n\n"
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+
+# Server-side browsing history: clients append the products viewed since their last sync
+# (seq = items sent before this delta; 409 with "received" means replay from there)
+@app.get("/api/session/history")
+async def get_session_history(http_request: Request):
+    history = session_store.history(_require_session_key(http_request))
+    if history is None:
+        return {"history": [], "received": 0, "affinity": {"categories": {}, "brands": {}}}
+    return {"history": list(history.ids), "received": history.received, "affinity": history.affinity()}
+
+@app.post("/api/session/history")
+async def post_session_history(delta: HistoryDelta, http_request: Request):
+    key = _require_session_key(http_request)
+    try:
+        return session_store.append(key, delta.append, delta.seq, delta.reset)
+    except SequenceGap as e:
+        return JSONResponse(status_code=409, content={"detail": str(e), "received": e.received})
+
+@app.get("/api/admin/catalog")
+async def get_catalog_stats():
+    return product_service.stats()
+
+@app.post("/api/admin/reload")
+async def post_catalog_reload(http_request: Request):
+    _require_admin(http_request)
+    try:
+        return await reload_catalog()
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Catalog reload failed, keeping version {product_service.version}: {str(e)}")
+
+@app.get("/api/admin/cache")
+async def get_cache_stats():
+    stats = recommendation_cache.stats()
+    if recommendation_store is not None:
+        stats["persistent"] = await asyncio.to_thread(recommendation_store.stats)
+    return stats
+
+@app.get("/api/admin/coalescing")
+async def get_coalescing_stats():
+    return llm_service.coalescer.stats()
+
+@app.get("/api/admin/batching")
+async def get_batching_stats():
+    if llm_service.batcher is None:
+        return {"enabled": False}
+    return llm_service.batcher.stats()
+
+@app.get("/api/admin/coview")
+async def get_coview_stats():
+    if coview_model is None:
+        return {"enabled": False}
+    return coview_model.stats()
+
+@app.get("/api/admin/sessions")
+async def get_session_stats():
+    return session_store.stats()
+
+@app.get("/api/admin/precompute")
+async def get_precompute_stats():
+    if llm_service.precomputer is None:
+        return {"enabled": False}
+    return llm_service.precomputer.stats()
+
+@app.get("/api/admin/slow-requests")
+async def get_slow_requests():
+    return {**request_profiler.stats(), "slowest": request_profiler.slowest()}
+
+@app.delete("/api/admin/slow-requests")
+async def clear_slow_requests(http_request: Request):
+    _require_admin(http_request)
+    request_profiler.clear_slowest()
+    return {"cleared": True}
+
+@app.get("/api/admin/profiles")
+async def get_profiles(http_request: Request):
+    _require_admin(http_request)
+    return request_profiler.profiles()
+
+@app.get("/api/admin/profiles/{profile_id}")
+async def get_profile(http_request: Request, profile_id: str, format: str = Query("prof", pattern="^(prof|text)$"),
+                      sort: str = Query("cumulative", pattern="^(cumulative|tottime|calls)$")):
+    _require_admin(http_request)
+    if format == "text":
+        report = request_profiler.profile_text(profile_id, sort)
+        if report is None:
+            raise HTTPException(status_code=404, detail="Profile not found")
+        return Response(report, media_type="text/plain; charset=utf-8")
+    data = request_profiler.profile_data(profile_id)
+    if data is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return Response(data, media_type="application/octet-stream",
+                    headers={"Content-Disposition": f'attachment; filename="{profile_id}.prof"'})
+
+@app.get("/metrics")
+async def get_metrics():
+    return Response(metrics.REGISTRY.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
 @app.exception_handler(Exception)
 async def generic_exception_handler(request: Request, exc: Exception):
     return JSONResponse(
@@ -21,7 +21,7 @@ app.add_middleware(
 
 # Initialize services
 product_service = ProductService()
-llm_service = LLMService()
+llm_service = LLMService(product_service)
 
 # Define request models
 class UserPreferences(BaseModel):
@@ -6,10 +6,11 @@ class LLMService:
     Service to handle interactions with the LLM API
     """
     
-    def __init__(self):
+    def __init__(self, product_service):
         """
-        Initialize the LLM service with configuration
+        Initialize the LLM service with configuration and the indexed product catalog
         """
+        self.product_service = product_service
         openai.api_key = config['OPENAI_API_KEY']
         self.model_name = config['MODEL_NAME']
         self.max_tokens = config['MAX_TOKENS']
@@ -30,13 +31,8 @@ class LLMService:
         # TODO: Implement LLM-based recommendation logic
         # This is where your prompt engineering expertise will be evaluated
         
-        # Get browsed products details
-        browsed_products = []
-        for product_id in browsing_history:
-            for product in all_products:
-                if product["id"] == product_id:
-                    browsed_products.append(product)
-                    break
+        # Get browsed products details through the id index
+        browsed_products = self.product_service.get_products_by_ids(browsing_history)
         
         # Create a prompt for the LLM
         # IMPLEMENT YOUR PROMPT ENGINEERING HERE
@@ -146,13 +142,9 @@ class LLMService:
             recommendations = []
             for rec in rec_data:
                 product_id = rec.get('product_id')
-                product_details = None
                 
                 # Find the full product details
-                for product in all_products:
-                    if product['id'] == product_id:
-                        product_details = product
-                        break
+                product_details = self.product_service.get_product_by_id(product_id)
                 
                 if product_details:
                     recommendations.append({
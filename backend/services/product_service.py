@@ -1,4 +1,5 @@
 import json
+from bisect import bisect_left, bisect_right
 from config import config
 
 class ProductService:
@@ -12,6 +13,7 @@ class ProductService:
         """
         self.data_path = config['DATA_PATH']
         self.products = self._load_products()
+        self._build_indexes()
     
     def _load_products(self):
         """
@@ -24,6 +26,29 @@ class ProductService:
             print(f"Error loading product data: {str(e)}")
             return []
     
+    def _build_indexes(self):
+        """
+        Build the id map, inverted indexes and price index once at load time
+        """
+        self.products_by_id = {}
+        self.category_index = {}
+        self.subcategory_index = {}
+        self.brand_index = {}
+        self.tag_index = {}
+
+        for product in self.products:
+            self.products_by_id[product['id']] = product
+            self.category_index.setdefault(product.get('category'), []).append(product)
+            self.subcategory_index.setdefault(product.get('subcategory'), []).append(product)
+            self.brand_index.setdefault(product.get('brand'), []).append(product)
+            for tag in product.get('tags') or []:
+                self.tag_index.setdefault(tag, []).append(product)
+
+        # Parallel lists sorted by price so range queries are two bisections
+        by_price = sorted(self.products, key=lambda p: p.get('price', 0))
+        self.sorted_prices = [p.get('price', 0) for p in by_price]
+        self.products_by_price = by_price
+    
     def get_all_products(self):
         """
         Return all products
@@ -34,13 +59,43 @@ class ProductService:
         """
         Get a specific product by ID
         """
-        for product in self.products:
-            if product['id'] == product_id:
-                return product
-        return None
+        return self.products_by_id.get(product_id)
+    
+    def get_products_by_ids(self, product_ids):
+        """
+        Get products for a list of IDs, preserving order and skipping unknown IDs
+        """
+        lookup = self.products_by_id
+        return [lookup[pid] for pid in product_ids if pid in lookup]
     
     def get_products_by_category(self, category):
         """
         Get products filtered by category
         """
-        return [p for p in self.products if p['category'] == category]
\ No newline at end of file
+        return list(self.category_index.get(category, []))
+    
+    def get_products_by_subcategory(self, subcategory):
+        """
+        Get products filtered by subcategory
+        """
+        return list(self.subcategory_index.get(subcategory, []))
+    
+    def get_products_by_brand(self, brand):
+        """
+        Get products filtered by brand
+        """
+        return list(self.brand_index.get(brand, []))
+    
+    def get_products_by_tag(self, tag):
+        """
+        Get products carrying the given tag
+        """
+        return list(self.tag_index.get(tag, []))
+    
+    def get_products_in_price_range(self, low=None, high=None):
+        """
+        Get products whose price lies within [low, high], ordered by price
+        """
+        start = 0 if low is None else bisect_left(self.sorted_prices, low)
+        end = len(self.sorted_prices) if high is None else bisect_right(self.sorted_prices, high)
+        return self.products_by_price[start:end]
@@ -0,0 +1,126 @@
+"""
+Local stand-in for the OpenAI chat completions API, for offline benchmarks
+
+Answers POST /v1/chat/completions (streamed or not) by recommending the
+first products of the prompt's candidate table, or every user's shortlist
+for batched prompts, after a latency drawn from a log-normal distribution.
+A configurable share of calls fails with a 500 or 429. GET /stats reports
+the calls served.
+
+    python -m benchmarks.fake_llm_server --port 9901 --latency-ms 800 --latency-sigma 0.4 --error-rate 0.02
+"""
+import argparse
+import asyncio
+import json
+import math
+import random
+import re
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+CANDIDATE_ROW = re.compile(r"^([0-9a-z]+)\|", re.M)
+BATCH_USER = re.compile(r"^User (\w+):\n(?:.*\n)*?Shortlist: (.*)$", re.M)
+
+
+class FakeLLM:
+    """
+    Latency, error and streaming behaviour of the fake upstream
+    """
+
+    def __init__(self, latency_ms=800.0, latency_sigma=0.4, error_rate=0.0, chunk_chars=16, seed=None):
+        self.latency_ms = latency_ms
+        self.latency_sigma = latency_sigma
+        self.error_rate = error_rate
+        self.chunk_chars = chunk_chars
+        self.rng = random.Random(seed)
+        self.calls = 0
+        self.streamed = 0
+        self.errors = 0
+
+    def latency(self):
+        """
+        One latency sample in seconds; latency_ms is the median
+        """
+        if self.latency_sigma <= 0:
+            return self.latency_ms / 1000.0
+        return self.latency_ms / 1000.0 * math.exp(self.rng.gauss(0.0, self.latency_sigma))
+
+    @staticmethod
+    def answer(prompt):
+        """
+        A plausible model answer for the prompt
+        """
+        users = BATCH_USER.findall(prompt)
+        if users:
+            return json.dumps({
+                label: [{"product_id": i, "explanation": "Matches this user's history.", "score": 7}
+                        for i in shortlist.split(", ")[:5]]
+                for label, shortlist in users
+            })
+        table = prompt.split("Candidates (", 1)[-1]
+        ids = CANDIDATE_ROW.findall(table)[:5] or ["0"]
+        items = [{"product_id": i, "explanation": "Fits the stated preferences.", "score": 8} for i in ids]
+        return "```json\n" + json.dumps(items, indent=2) + "\n```"
+
+
+def create_app(llm):
+    """
+    FastAPI app serving the fake API
+    """
+    app = FastAPI(title="Fake LLM")
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        body = await request.json()
+        llm.calls += 1
+        delay = llm.latency()
+
+        if llm.rng.random() < llm.error_rate:
+            llm.errors += 1
+            await asyncio.sleep(delay / 4)
+            status = llm.rng.choice((429, 500))
+            return JSONResponse(status_code=status, content={"error": {"message": "injected failure"}})
+
+        content = llm.answer(body["messages"][-1]["content"])
+        if not body.get("stream"):
+            await asyncio.sleep(delay)
+            return {"choices": [{"message": {"role": "assistant", "content": content}}]}
+
+        llm.streamed += 1
+        chunks = [content[i:i + llm.chunk_chars] for i in range(0, len(content), llm.chunk_chars)]
+
+        async def events():
+            for chunk in chunks:
+                await asyncio.sleep(delay / len(chunks))
+                yield "data: " + json.dumps({"choices": [{"delta": {"content": chunk}}]}) + "\n\n"
+            yield "data: [DONE]\n\n"
+
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+    @app.get("/stats")
+    async def stats():
+        return {"calls": llm.calls, "streamed": llm.streamed, "errors": llm.errors}
+
+    return app
+
+
+def main(argv=None):
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="Offline fake OpenAI chat completions server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9901)
+    parser.add_argument("--latency-ms", type=float, default=800.0, help="median response latency")
+    parser.add_argument("--latency-sigma", type=float, default=0.4, help="log-normal spread (0 = fixed)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of calls answered with 429/500")
+    parser.add_argument("--chunk-chars", type=int, default=16, help="characters per streamed delta")
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args(argv)
+
+    llm = FakeLLM(args.latency_ms, args.latency_sigma, args.error_rate, args.chunk_chars, args.seed)
+    uvicorn.run(create_app(llm), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,416 @@
+"""
+Concurrent load test of the recommendation API, fully offline
+
+By default it starts benchmarks.fake_llm_server and the API (uvicorn app:app)
+on free local ports, with the API pointed at the fake upstream, then runs
+concurrent async clients for a fixed duration. The clients replay a mix of
+catalog reads and recommendation requests built from the catalog itself:
+random preference/history profiles plus a pool of "hot" profiles that
+repeat, as real traffic does. Pass --base-url to target an already running
+server instead.
+
+The JSON report has overall and per-endpoint RPS and p50/p95/p99 latency,
+time to first event for streamed recommendations, per-stage server timings
+(from Server-Timing headers, when the server sends them), the recommendation
+source mix and the server's admin counters. --compare checks a run against
+an earlier report and --max-regression turns a slowdown into a failing exit
+code.
+
+    python -m benchmarks.load_test --duration 30 --concurrency 32 --output results.json
+    python -m benchmarks.load_test --compare results.json --max-regression 0.15
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+import httpx
+import numpy as np
+
+ROOT = Path(__file__).resolve().parent.parent
+DEFAULT_MIX = "products=1,products_page=1,recommendations=6,stream=2"
+PRICE_RANGES = ["all", "all", "0-50", "25-100", "50-150", "100-300", "200+"]
+ADMIN_ENDPOINTS = ("catalog", "cache", "coalescing", "batching")
+
+
+def free_port():
+    """
+    An unused local TCP port
+    """
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def percentiles(values):
+    """
+    Summary statistics of a list of seconds, reported in milliseconds
+    """
+    if not values:
+        return {"count": 0}
+    ms = np.asarray(values) * 1000.0
+    p50, p95, p99 = np.percentile(ms, [50, 95, 99])
+    return {
+        "count": len(values),
+        "mean_ms": round(float(ms.mean()), 2),
+        "p50_ms": round(float(p50), 2),
+        "p95_ms": round(float(p95), 2),
+        "p99_ms": round(float(p99), 2),
+        "max_ms": round(float(ms.max()), 2),
+    }
+
+
+def parse_server_timing(header):
+    """
+    {stage: seconds} from a Server-Timing header ("retrieval;dur=1.2, llm;dur=800")
+    """
+    stages = {}
+    for metric in (header or "").split(","):
+        name, *params = [part.strip() for part in metric.split(";")]
+        for param in params:
+            if param.startswith("dur="):
+                try:
+                    stages[name] = float(param[4:]) / 1000.0
+                except ValueError:
+                    pass
+    return stages
+
+
+class Workload:
+    """
+    Request generator built from the served catalog
+    """
+
+    def __init__(self, products, hot_share, hot_profiles=20, seed=7):
+        self.rng = random.Random(seed)
+        self.products = products
+        self.ids = [p["id"] for p in products]
+        self.categories = sorted({p["category"] for p in products})
+        self.brands = sorted({p["brand"] for p in products})
+        self.by_category = {}
+        for p in products:
+            self.by_category.setdefault(p["category"], []).append(p["id"])
+        self.hot_share = hot_share
+        self.hot = [self.random_profile() for _ in range(hot_profiles)]
+
+    def random_profile(self):
+        """
+        Preferences and a browsing history that mostly stays within the preferred categories
+        """
+        rng = self.rng
+        categories = rng.sample(self.categories, rng.choice((0, 1, 1, 2))) if self.categories else []
+        brands = rng.sample(self.brands, rng.choice((0, 0, 1, 2))) if self.brands else []
+        pool = [pid for c in categories for pid in self.by_category[c]] or self.ids
+        history = rng.sample(pool, min(len(pool), rng.choice((0, 1, 2, 3, 5))))
+        return {
+            "preferences": {
+                "priceRange": rng.choice(PRICE_RANGES),
+                "categories": categories,
+                "brands": brands,
+                "inStock": rng.random() < 0.3,
+            },
+            "browsing_history": history,
+        }
+
+    def recommendation_body(self):
+        """
+        A hot profile with probability hot_share, otherwise a fresh random one
+        """
+        if self.hot and self.rng.random() < self.hot_share:
+            return self.rng.choice(self.hot)
+        return self.random_profile()
+
+    def page_params(self):
+        """
+        Query parameters of a paginated, projected and sometimes filtered catalog read
+        """
+        params = {"limit": self.rng.choice((20, 50, 100)), "fields": "id,name,category,brand,price"}
+        if self.categories and self.rng.random() < 0.5:
+            params["category"] = self.rng.choice(self.categories)
+        if self.rng.random() < 0.3:
+            params["in_stock"] = "true"
+        return params
+
+
+class LoadTest:
+    """
+    Concurrent clients and the latency samples they collect
+    """
+
+    def __init__(self, client, workload, mix, concurrency, duration):
+        self.client = client
+        self.workload = workload
+        self.mix_names = list(mix)
+        self.mix_weights = [mix[name] for name in self.mix_names]
+        self.concurrency = concurrency
+        self.duration = duration
+        self.samples = {name: [] for name in self.mix_names}
+        self.first_event = []
+        self.statuses = {name: {} for name in self.mix_names}
+        self.sources = {}
+        self.stages = {}
+        self.errors = []
+        self.etag = None
+
+    async def run(self):
+        """
+        Run all clients until the duration elapses; returns the wall time
+        """
+        deadline = time.perf_counter() + self.duration
+        start = time.perf_counter()
+        await asyncio.gather(*(self._client_loop(deadline, seed) for seed in range(self.concurrency)))
+        return time.perf_counter() - start
+
+    async def _client_loop(self, deadline, seed):
+        rng = random.Random(seed)
+        while time.perf_counter() < deadline:
+            name = rng.choices(self.mix_names, self.mix_weights)[0]
+            start = time.perf_counter()
+            try:
+                status = await getattr(self, f"_{name}")(start)
+            except Exception as e:
+                status = type(e).__name__
+                if len(self.errors) < 20:
+                    self.errors.append(f"{name}: {str(e) or status}")
+            self.samples[name].append(time.perf_counter() - start)
+            counts = self.statuses[name]
+            counts[str(status)] = counts.get(str(status), 0) + 1
+
+    def _record_stages(self, response):
+        for stage, seconds in parse_server_timing(response.headers.get("server-timing")).items():
+            self.stages.setdefault(stage, []).append(seconds)
+
+    async def _products(self, start):
+        # Half of the clients revalidate like a browser with a cached copy
+        headers = {"If-None-Match": self.etag} if self.etag and random.random() < 0.5 else {}
+        response = await self.client.get("/api/products", headers=headers)
+        self.etag = response.headers.get("etag", self.etag)
+        await response.aread()
+        return response.status_code
+
+    async def _products_page(self, start):
+        response = await self.client.get("/api/products", params=self.workload.page_params())
+        return response.status_code
+
+    async def _recommendations(self, start):
+        response = await self.client.post("/api/recommendations", json=self.workload.recommendation_body())
+        self._record_stages(response)
+        if response.status_code == 200:
+            source = response.json().get("source", "unknown")
+            self.sources[source] = self.sources.get(source, 0) + 1
+        return response.status_code
+
+    async def _stream(self, start):
+        body = self.workload.recommendation_body()
+        async with self.client.stream("POST", "/api/recommendations/stream", json=body) as response:
+            first = None
+            async for line in response.aiter_lines():
+                if first is None and line.startswith("event: recommendation"):
+                    first = time.perf_counter() - start
+                    self.first_event.append(first)
+                if line.startswith("event: error"):
+                    return "stream_error"
+            return response.status_code
+
+    def report(self, wall_time):
+        """
+        The JSON-serializable result of the run
+        """
+        total = sum(len(v) for v in self.samples.values())
+        all_samples = [s for v in self.samples.values() for s in v]
+        ok = sum(c for counts in self.statuses.values() for status, c in counts.items() if status in ("200", "304"))
+        endpoints = {}
+        for name in self.mix_names:
+            endpoints[name] = {
+                "rps": round(len(self.samples[name]) / wall_time, 2),
+                "statuses": self.statuses[name],
+                "latency": percentiles(self.samples[name]),
+            }
+        if self.first_event:
+            endpoints["stream"]["first_event"] = percentiles(self.first_event)
+        return {
+            "overall": {
+                "requests": total,
+                "wall_seconds": round(wall_time, 2),
+                "rps": round(total / wall_time, 2),
+                "success_rate": round(ok / total, 4) if total else 0.0,
+                "latency": percentiles(all_samples),
+            },
+            "endpoints": endpoints,
+            "recommendation_sources": self.sources,
+            "server_timing": {stage: percentiles(values) for stage, values in self.stages.items()},
+            "sample_errors": self.errors,
+        }
+
+
+def spawn_servers(args):
+    """
+    Start the fake LLM and the API as subprocesses; returns (base_url, llm_url, processes)
+    """
+    llm_port, api_port = free_port(), free_port()
+    llm = subprocess.Popen([
+        sys.executable, "-m", "benchmarks.fake_llm_server", "--port", str(llm_port),
+        "--latency-ms", str(args.llm_latency_ms), "--latency-sigma", str(args.llm_latency_sigma),
+        "--error-rate", str(args.llm_error_rate), "--seed", str(args.seed),
+    ], cwd=ROOT)
+    env = {
+        **os.environ,
+        "OPENAI_API_BASE": f"http://127.0.0.1:{llm_port}/v1",
+        "OPENAI_API_KEY": "offline-benchmark",
+        "DATA_PATH": args.data_path,
+    }
+    api = subprocess.Popen([
+        sys.executable, "-m", "uvicorn", "app:app", "--port", str(api_port),
+        "--log-level", "warning", "--workers", str(args.workers),
+    ], cwd=ROOT, env=env)
+    return f"http://127.0.0.1:{api_port}", f"http://127.0.0.1:{llm_port}", [api, llm]
+
+
+async def wait_ready(url, timeout=60.0):
+    """
+    Poll a URL until it answers
+    """
+    deadline = time.perf_counter() + timeout
+    async with httpx.AsyncClient() as client:
+        while True:
+            try:
+                await client.get(url)
+                return
+            except httpx.TransportError:
+                if time.perf_counter() > deadline:
+                    raise RuntimeError(f"{url} did not come up within {timeout:.0f}s")
+                await asyncio.sleep(0.2)
+
+
+async def fetch_json(client, path):
+    """
+    GET a JSON endpoint, or None if it is unavailable
+    """
+    try:
+        response = await client.get(path)
+        return response.json() if response.status_code == 200 else None
+    except (httpx.HTTPError, ValueError):
+        return None
+
+
+async def run(args):
+    """
+    Set up the servers and workload, run the load and assemble the report
+    """
+    processes = []
+    llm_url = None
+    base_url = args.base_url
+    if base_url is None:
+        base_url, llm_url, processes = spawn_servers(args)
+    try:
+        await wait_ready(f"{base_url}/api/admin/cache")
+        if llm_url:
+            await wait_ready(f"{llm_url}/stats")
+
+        limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+        async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=args.timeout) as client:
+            products = (await client.get("/api/products")).json()
+            workload = Workload(products, args.hot_share, seed=args.seed)
+            mix = {name: float(weight) for name, weight in (item.split("=") for item in args.mix.split(","))}
+
+            test = LoadTest(client, workload, mix, args.concurrency, args.duration)
+            wall_time = await test.run()
+            report = test.report(wall_time)
+            report["server_stats"] = {name: await fetch_json(client, f"/api/admin/{name}") for name in ADMIN_ENDPOINTS}
+
+        if llm_url:
+            async with httpx.AsyncClient(base_url=llm_url) as client:
+                report["llm_stats"] = await fetch_json(client, "/stats")
+    finally:
+        for process in processes:
+            process.terminate()
+        for process in processes:
+            process.wait(timeout=10)
+
+    report["config"] = {
+        "base_url": args.base_url or "spawned",
+        "concurrency": args.concurrency,
+        "duration": args.duration,
+        "mix": args.mix,
+        "hot_share": args.hot_share,
+        "llm_latency_ms": args.llm_latency_ms if llm_url else None,
+        "llm_latency_sigma": args.llm_latency_sigma if llm_url else None,
+        "llm_error_rate": args.llm_error_rate if llm_url else None,
+        "catalog_size": len(products),
+        "started_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    }
+    return report
+
+
+def compare(report, baseline, max_regression):
+    """
+    Print latency and throughput changes against a baseline; returns False on a regression beyond the limit
+    """
+    ok = True
+    rows = [("overall", report["overall"], baseline.get("overall", {}))]
+    rows += [(name, data, baseline.get("endpoints", {}).get(name, {})) for name, data in report["endpoints"].items()]
+    print(f"{'endpoint':<18}{'metric':<8}{'baseline':>12}{'current':>12}{'change':>10}")
+    for name, current, base in rows:
+        for metric in ("p50_ms", "p95_ms", "p99_ms"):
+            before = base.get("latency", {}).get(metric)
+            after = current.get("latency", {}).get(metric)
+            if not before or after is None:
+                continue
+            change = after / before - 1.0
+            flag = ""
+            if max_regression is not None and change > max_regression:
+                ok = False
+                flag = "  REGRESSION"
+            print(f"{name:<18}{metric[:-3]:<8}{before:>12.1f}{after:>12.1f}{change:>+10.1%}{flag}")
+        before, after = base.get("rps"), current.get("rps")
+        if before and after is not None:
+            change = after / before - 1.0
+            flag = ""
+            if max_regression is not None and -change > max_regression:
+                ok = False
+                flag = "  REGRESSION"
+            print(f"{name:<18}{'rps':<8}{before:>12.1f}{after:>12.1f}{change:>+10.1%}{flag}")
+    return ok
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Offline concurrent load test of the recommendation API")
+    parser.add_argument("--base-url", default=None, help="target a running server instead of spawning one")
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--duration", type=float, default=20.0, help="seconds of load")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help="endpoint weights, e.g. " + DEFAULT_MIX)
+    parser.add_argument("--hot-share", type=float, default=0.3, help="share of recommendation requests replaying hot profiles")
+    parser.add_argument("--timeout", type=float, default=60.0)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--data-path", default=str(ROOT / "backend" / "data" / "products.json"))
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn workers for the spawned API")
+    parser.add_argument("--llm-latency-ms", type=float, default=800.0)
+    parser.add_argument("--llm-latency-sigma", type=float, default=0.4)
+    parser.add_argument("--llm-error-rate", type=float, default=0.0)
+    parser.add_argument("--output", default=None, help="write the JSON report here")
+    parser.add_argument("--compare", default=None, help="baseline JSON report to compare against")
+    parser.add_argument("--max-regression", type=float, default=None,
+                        help="fail if a latency percentile grows (or RPS drops) by more than this fraction")
+    args = parser.parse_args(argv)
+
+    report = asyncio.run(run(args))
+    text = json.dumps(report, indent=2)
+    if args.output:
+        Path(args.output).write_text(text + "\n")
+    print(text)
+
+    if args.compare:
+        baseline = json.loads(Path(args.compare).read_text())
+        if not compare(report, baseline, args.max_regression):
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,102 @@
+"""
+Memory benchmark: bytes per product for plain dicts vs ProductRecord
+
+Generates a synthetic catalog from the sample products (unique ids, names
+and prices; categories, brands, features and tags drawn from the sample),
+writes it to a temporary file and measures with tracemalloc the memory
+retained by the loaded catalog and the peak while loading it, for json.load
+into dicts and for the streaming loader that builds compact records.
+
+    python -m benchmarks.memory_benchmark [--products 100000]
+"""
+import argparse
+import gc
+import json
+import os
+import random
+import sys
+import tempfile
+import tracemalloc
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from services.catalog_loader import load_catalog  # noqa: E402
+
+SAMPLE_PATH = Path(__file__).resolve().parent.parent / "backend" / "data" / "products.json"
+
+
+def make_catalog_text(n, seed=11):
+    """
+    JSON text of a synthetic catalog with n products
+    """
+    rng = random.Random(seed)
+    sample = json.loads(SAMPLE_PATH.read_text())
+    products = []
+    for i in range(n):
+        base = sample[i % len(sample)]
+        products.append({
+            **base,
+            "id": f"prod{i:07d}",
+            "name": f"{base['name']} {i}",
+            "price": round(rng.uniform(5, 500), 2),
+            "rating": round(rng.uniform(3, 5), 1),
+            "inventory": rng.randint(0, 200),
+            "features": rng.sample(base["features"], len(base["features"])),
+        })
+    return json.dumps(products)
+
+
+def load_dicts(path):
+    """
+    The previous loader: json.load of the whole file into dicts
+    """
+    with open(path, "r") as file:
+        return json.load(file)
+
+
+def load_records(path):
+    """
+    The streaming loader building ProductRecords
+    """
+    products, _ = load_catalog(path)
+    return products
+
+
+def measure(load, path):
+    """
+    (retained_bytes, peak_bytes) of load(path), keeping the result alive while measuring
+    """
+    gc.collect()
+    tracemalloc.start()
+    catalog = load(path)
+    gc.collect()
+    retained, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del catalog
+    return retained, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--products", type=int, default=100000)
+    args = parser.parse_args()
+
+    with tempfile.NamedTemporaryFile("w", suffix=".json", delete=False) as file:
+        file.write(make_catalog_text(args.products))
+    try:
+        report = {"products": args.products, "json_bytes": os.path.getsize(file.name), "loaders": {}}
+        for name, load in (("dicts", load_dicts), ("records", load_records)):
+            retained, peak = measure(load, file.name)
+            report["loaders"][name] = {
+                "bytes_per_product": round(retained / args.products, 1),
+                "retained_mb": round(retained / 2 ** 20, 1),
+                "peak_mb": round(peak / 2 ** 20, 1),
+            }
+    finally:
+        os.unlink(file.name)
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
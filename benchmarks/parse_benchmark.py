@@ -0,0 +1,166 @@
+"""
+Micro-benchmark of LLM response parsing: legacy find/rfind parser vs RecommendationParser
+
+Builds a synthetic catalog and a corpus of realistic and malformed model
+outputs (code fences, prose with stray brackets, trailing commas,
+truncated completions, broken items, duplicates), then reports the mean
+parse time and the failure rate (responses that yield no recommendation
+and would force a retry) for each parser.
+
+    python -m benchmarks.parse_benchmark [--products 10000] [--responses 2000] [--repeat 5]
+"""
+import argparse
+import io
+import json
+import random
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from services.response_parser import RecommendationParser  # noqa: E402
+
+
+def make_catalog(n):
+    """
+    Synthetic products with the fields the parsers touch
+    """
+    return [
+        {"id": f"prod{i:06d}", "name": f"Product {i}", "category": "Electronics", "brand": "Brand", "price": 10.0 + i % 500}
+        for i in range(n)
+    ]
+
+
+def legacy_parse(llm_response, all_products, sink):
+    """
+    The previous LLMService._parse_recommendation_response, with its debug print sent to a sink
+    """
+    try:
+        print("\n== RAW LLM RESPONSE ==\n", llm_response, file=sink)
+        start_idx = llm_response.find('[')
+        end_idx = llm_response.rfind(']') + 1
+        if start_idx == -1 or end_idx == 0:
+            return {"recommendations": [], "error": "Could not find JSON array in LLM response"}
+        rec_data = json.loads(llm_response[start_idx:end_idx])
+        recommendations = []
+        for rec in rec_data:
+            product_id = rec.get('product_id')
+            product_details = next((p for p in all_products if p['id'] == product_id), None)
+            if product_details:
+                recommendations.append({
+                    "product": product_details,
+                    "explanation": rec.get('explanation', ''),
+                    "confidence_score": rec.get('score', 5)
+                })
+        return {"recommendations": recommendations, "count": len(recommendations)}
+    except Exception as e:
+        return {"recommendations": [], "error": str(e)}
+
+
+def _items(rng, catalog, count=5):
+    picks = rng.sample(catalog, count)
+    return [
+        {
+            "product_id": p["id"],
+            "explanation": f"Matches your interest in {p['category']} (similar to items you viewed) and fits your budget.",
+            "score": rng.randint(5, 10),
+        }
+        for p in picks
+    ]
+
+
+def _array(items, indent=2):
+    return json.dumps(items, indent=indent)
+
+
+def _trailing_commas(items):
+    lines = ["["]
+    for item in items:
+        lines.append("  {")
+        for key, value in item.items():
+            lines.append(f"    {json.dumps(key)}: {json.dumps(value)},")
+        lines.append("  },")
+    lines.append("]")
+    return "\n".join(lines)
+
+
+# Each variant turns a list of items into one model output
+VARIANTS = {
+    "clean": lambda rng, items: _array(items),
+    "code_fence": lambda rng, items: "```json\n" + _array(items) + "\n```",
+    "prose_around": lambda rng, items: "Here are my recommendations:\n\n" + _array(items) + "\n\nLet me know if you need more!",
+    "bracket_in_prose_before": lambda rng, items: "Based on your history [3 items] here are the top [5] picks:\n" + _array(items),
+    "bracket_in_prose_after": lambda rng, items: _array(items) + "\n\nNote: scores are on a [1-10] scale.",
+    "trailing_commas": lambda rng, items: _trailing_commas(items),
+    "wrapped_object": lambda rng, items: json.dumps({"recommendations": items}, indent=2),
+    "truncated": lambda rng, items: _array(items)[: int(len(_array(items)) * rng.uniform(0.55, 0.9))],
+    "broken_item": lambda rng, items: _array(items).replace('"score": ', "score: ", 1),
+    "duplicates": lambda rng, items: _array(items + items[:2]),
+    "score_as_string": lambda rng, items: _array([{**item, "score": str(item["score"])} for item in items]),
+    "compact_single_line": lambda rng, items: json.dumps(items, separators=(",", ":")),
+}
+
+
+def make_corpus(catalog, n, seed=7):
+    """
+    n (variant, text) pairs spread evenly over the variants
+    """
+    rng = random.Random(seed)
+    names = list(VARIANTS)
+    return [(names[i % len(names)], VARIANTS[names[i % len(names)]](rng, _items(rng, catalog))) for i in range(n)]
+
+
+def run(parse, corpus, repeat):
+    """
+    Best-of-repeat total time and the per-variant failure counts for one parser
+    """
+    best = float("inf")
+    failures = {}
+    for _ in range(repeat):
+        failures = {}
+        start = time.perf_counter()
+        for variant, text in corpus:
+            result = parse(text)
+            if not result["recommendations"]:
+                failures[variant] = failures.get(variant, 0) + 1
+        best = min(best, time.perf_counter() - start)
+    return best, failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--products", type=int, default=10000)
+    parser.add_argument("--responses", type=int, default=2400)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    catalog = make_catalog(args.products)
+    by_id = {p["id"]: p for p in catalog}
+    corpus = make_corpus(catalog, args.responses)
+    sink = io.StringIO()
+
+    def legacy(text):
+        sink.seek(0)
+        sink.truncate()
+        return legacy_parse(text, catalog, sink)
+
+    parsers = {
+        "legacy": legacy,
+        "single_pass": RecommendationParser(by_id.get).parse,
+    }
+
+    per_variant = len(corpus) / len(VARIANTS)
+    report = {"products": args.products, "responses": len(corpus), "parsers": {}}
+    for name, parse in parsers.items():
+        elapsed, failures = run(parse, corpus, args.repeat)
+        report["parsers"][name] = {
+            "us_per_parse": round(1e6 * elapsed / len(corpus), 2),
+            "failure_rate": round(sum(failures.values()) / len(corpus), 4),
+            "failure_rate_by_variant": {v: round(failures.get(v, 0) / per_variant, 3) for v in VARIANTS},
+        }
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -7,8 +7,89 @@ load_dotenv()
 # Configuration settings
 config = {
     'OPENAI_API_KEY': os.getenv('OPENAI_API_KEY'),
+    'OPENAI_API_BASE': os.getenv('OPENAI_API_BASE', 'https://api.openai.com/v1'),
     'MODEL_NAME': os.getenv('MODEL_NAME', 'gpt-3.5-turbo'),
     'MAX_TOKENS': int(os.getenv('MAX_TOKENS', 1000)),
     'TEMPERATURE': float(os.getenv('TEMPERATURE', 0.7)),
-    'DATA_PATH': os.getenv('DATA_PATH', 'data/products.json')
+    # Defaults to the bundled sample catalog, found relative to this file rather than the working directory
+    'DATA_PATH': os.getenv(
+        'DATA_PATH', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'backend', 'data', 'products.json')
+    ),
+    # Poll DATA_PATH every N seconds and hot-reload the catalog when it changes (0 disables)
+    'CATALOG_WATCH_INTERVAL_SECONDS': float(os.getenv('CATALOG_WATCH_INTERVAL_SECONDS', 0)),
+    # Load the catalog from the shared segment published in this directory instead of DATA_PATH
+    # (set by `python -m services.catalog_segments` for its workers)
+    'CATALOG_SEGMENT_DIR': os.getenv('CATALOG_SEGMENT_DIR', ''),
+    # Co-view model learned from browsing histories: on/off, products tracked, neighbours kept
+    # per product and the half-life of co-view counts
+    'COVIEW_ENABLED': os.getenv('COVIEW_ENABLED', 'true').lower() == 'true',
+    'COVIEW_MAX_ITEMS': int(os.getenv('COVIEW_MAX_ITEMS', 200000)),
+    'COVIEW_NEIGHBOURS': int(os.getenv('COVIEW_NEIGHBOURS', 20)),
+    'COVIEW_HALF_LIFE_SECONDS': float(os.getenv('COVIEW_HALF_LIFE_SECONDS', 7 * 24 * 3600)),
+    # Server-side browsing history sessions: sessions kept, distinct products remembered per
+    # session, idle lifetime, and the HS256 secret that verifies bearer tokens so sessions follow
+    # the signed-in user (empty: sessions are identified by the X-Session-Id header only)
+    'SESSION_MAX_SESSIONS': int(os.getenv('SESSION_MAX_SESSIONS', 10000)),
+    'SESSION_HISTORY_SIZE': int(os.getenv('SESSION_HISTORY_SIZE', 50)),
+    'SESSION_TTL_SECONDS': float(os.getenv('SESSION_TTL_SECONDS', 24 * 3600)),
+    'SESSION_JWT_SECRET': os.getenv('SESSION_JWT_SECRET', ''),
+    # Number of scored candidates the retrieval stage offers to the prompt builder
+    'RETRIEVAL_TOP_K': int(os.getenv('RETRIEVAL_TOP_K', 50)),
+    # Prompt token budget: model context window minus MAX_TOKENS minus this safety margin
+    'MODEL_CONTEXT_WINDOW': int(os.getenv('MODEL_CONTEXT_WINDOW', 4096)),
+    'PROMPT_TOKEN_MARGIN': int(os.getenv('PROMPT_TOKEN_MARGIN', 64)),
+    # Local text similarity index: hashed vector width, "exact", "approximate" or "auto",
+    # and the catalog size above which "auto" switches to approximate (LSH) search
+    'SIMILARITY_DIM': int(os.getenv('SIMILARITY_DIM', 256)),
+    'SIMILARITY_MODE': os.getenv('SIMILARITY_MODE', 'auto'),
+    'SIMILARITY_EXACT_LIMIT': int(os.getenv('SIMILARITY_EXACT_LIMIT', 5000)),
+    # Recommendation result cache bounds
+    'CACHE_MAX_ENTRIES': int(os.getenv('CACHE_MAX_ENTRIES', 10000)),
+    'CACHE_MAX_BYTES': int(os.getenv('CACHE_MAX_BYTES', 64 * 1024 * 1024)),
+    'CACHE_TTL_SECONDS': float(os.getenv('CACHE_TTL_SECONDS', 900)),
+    # Persistent second-tier recommendation cache (SQLite file; empty path disables it): size bound,
+    # entry lifetime, writer batching, and how many of the most hit entries to load into memory at boot
+    'PERSISTENT_CACHE_PATH': os.getenv('PERSISTENT_CACHE_PATH', ''),
+    'PERSISTENT_CACHE_MAX_BYTES': int(os.getenv('PERSISTENT_CACHE_MAX_BYTES', 256 * 1024 * 1024)),
+    'PERSISTENT_CACHE_TTL_SECONDS': float(os.getenv('PERSISTENT_CACHE_TTL_SECONDS', 7 * 24 * 3600)),
+    'PERSISTENT_CACHE_FLUSH_MS': float(os.getenv('PERSISTENT_CACHE_FLUSH_MS', 200)),
+    'PERSISTENT_CACHE_BATCH_SIZE': int(os.getenv('PERSISTENT_CACHE_BATCH_SIZE', 256)),
+    'PERSISTENT_CACHE_WARM_ENTRIES': int(os.getenv('PERSISTENT_CACHE_WARM_ENTRIES', 1000)),
+    # Async upstream client: concurrent in-flight LLM calls (also the connection pool size)
+    # and the per-call timeout
+    'LLM_MAX_CONCURRENCY': int(os.getenv('LLM_MAX_CONCURRENCY', 32)),
+    'LLM_TIMEOUT_SECONDS': float(os.getenv('LLM_TIMEOUT_SECONDS', 30)),
+    # Latency budget for /api/recommendations before the local fallback ranker answers
+    'RECOMMENDATION_DEADLINE_SECONDS': float(os.getenv('RECOMMENDATION_DEADLINE_SECONDS', 5)),
+    # Optional micro-batching of concurrent users into one LLM call: collection window,
+    # users per call, ceiling on estimated prompt + reserved completion tokens per call,
+    # and the completion tokens reserved for each user's answer
+    'BATCHING_ENABLED': os.getenv('BATCHING_ENABLED', 'false').lower() == 'true',
+    'BATCH_WINDOW_MS': float(os.getenv('BATCH_WINDOW_MS', 30)),
+    'BATCH_MAX_SIZE': int(os.getenv('BATCH_MAX_SIZE', 8)),
+    'BATCH_MAX_TOKENS': int(os.getenv('BATCH_MAX_TOKENS', 3500)),
+    'BATCH_COMPLETION_TOKENS_PER_USER': int(os.getenv('BATCH_COMPLETION_TOKENS_PER_USER', 300)),
+    # Background precomputation of popular request profiles: request keys tracked by the
+    # heavy-hitters sketch, how many of the top ones to keep cached and the minimum count,
+    # cycle interval, refresh this long before expiry, upstream budget (calls per minute and
+    # in flight) and how often counts are halved
+    'PRECOMPUTE_ENABLED': os.getenv('PRECOMPUTE_ENABLED', 'false').lower() == 'true',
+    'PRECOMPUTE_TRACKED_KEYS': int(os.getenv('PRECOMPUTE_TRACKED_KEYS', 2000)),
+    'PRECOMPUTE_TOP_N': int(os.getenv('PRECOMPUTE_TOP_N', 100)),
+    'PRECOMPUTE_MIN_COUNT': int(os.getenv('PRECOMPUTE_MIN_COUNT', 3)),
+    'PRECOMPUTE_INTERVAL_SECONDS': float(os.getenv('PRECOMPUTE_INTERVAL_SECONDS', 30)),
+    'PRECOMPUTE_REFRESH_MARGIN_SECONDS': float(os.getenv('PRECOMPUTE_REFRESH_MARGIN_SECONDS', 120)),
+    'PRECOMPUTE_CALLS_PER_MINUTE': float(os.getenv('PRECOMPUTE_CALLS_PER_MINUTE', 30)),
+    'PRECOMPUTE_CONCURRENCY': int(os.getenv('PRECOMPUTE_CONCURRENCY', 2)),
+    'PRECOMPUTE_DECAY_SECONDS': float(os.getenv('PRECOMPUTE_DECAY_SECONDS', 3600)),
+    # On-demand profiling: share of requests to cProfile, the X-Profile header value that
+    # profiles one request (empty disables the header), profiles kept, and the size of the
+    # slowest-requests log
+    'PROFILE_SAMPLE_RATE': float(os.getenv('PROFILE_SAMPLE_RATE', 0)),
+    'PROFILE_TOKEN': os.getenv('PROFILE_TOKEN', ''),
+    'PROFILE_MAX_STORED': int(os.getenv('PROFILE_MAX_STORED', 20)),
+    'SLOW_REQUEST_LOG_SIZE': int(os.getenv('SLOW_REQUEST_LOG_SIZE', 50)),
+    # Shared secret that catalog reloads, profile downloads and clearing the slow-request log
+    # require in an X-Admin-Token header (empty: those endpoints are disabled)
+    'ADMIN_TOKEN': os.getenv('ADMIN_TOKEN', '')
 }
\ No newline at end of file
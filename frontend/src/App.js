@@ -4,7 +4,7 @@ import Catalog from './components/Catalog';
 import UserPreferences from './components/UserPreferences';
 import Recommendations from './components/Recommendations';
 import BrowsingHistory from './components/BrowsingHistory';
-import { fetchProducts, getRecommendations } from './services/api';
+import { appendHistory, clearHistory, fetchProducts, loadHistory, streamRecommendations } from './services/api';
 import { AuthContext } from './context/authcontext';
 import Register from './components/Register';
 import Login from './components/Login';
@@ -25,11 +25,17 @@ function App() {
 
 
   useEffect(() => {
+    // Ignore pages from a superseded load (effects run twice under StrictMode)
+    let cancelled = false;
+
     const loadProducts = async () => {
       try {
-        const data = await fetchProducts();
-        setProducts(data);
-        console.log('Fetched products:', data);
+        const data = await fetchProducts((page) => {
+          if (cancelled) return;
+          setProducts(prevProducts => [...prevProducts, ...page]);
+          setIsProductLoading(false);
+        });
+        console.log('Fetched products:', data.length);
       } catch (error) {
         console.error('Error fetching products:', error);
       } finally {
@@ -37,9 +43,21 @@ function App() {
       }
     };
 
+    setProducts([]);
     loadProducts();
+    return () => {
+      cancelled = true;
+    };
   }, []);
 
+  useEffect(() => {
+    if (!token) return;
+    // Pick up the history the server kept for this session (e.g. after a reload)
+    loadHistory()
+      .then(setBrowsingHistory)
+      .catch(error => console.error('Error loading browsing history:', error));
+  }, [token]);
+
   const [showRegister, setShowRegister] = useState(false);
 
   if (!token) {
@@ -64,8 +82,11 @@ function App() {
   }
 
   const handleProductClick = (productId) => {
-    if (!browsingHistory.includes(productId)) {
-      setBrowsingHistory([...browsingHistory, productId]);
+    if (browsingHistory[browsingHistory.length - 1] !== productId) {
+      // A product viewed again moves to the most recent position, here and on the server
+      setBrowsingHistory([...browsingHistory.filter(id => id !== productId), productId]);
+      // Only the new product goes to the server, which keeps the rest of the history
+      appendHistory([productId]).catch(error => console.error('Error syncing browsing history:', error));
     }
   };
 
@@ -78,9 +99,13 @@ function App() {
 
   const handleGetRecommendations = async () => {
     setIsLoading(true);
+    setRecommendations([]);
     try {
-      const data = await getRecommendations(userPreferences, browsingHistory);
-      setRecommendations(data.recommendations || []);
+      // Show each recommendation as soon as it arrives instead of waiting for all of them
+      await streamRecommendations(userPreferences, (rec) => {
+        setRecommendations(prev => [...prev, rec]);
+        setIsLoading(false);
+      });
     } catch (error) {
       console.error('Error getting recommendations:', error);
     } finally {
@@ -90,6 +115,7 @@ function App() {
 
   const handleClearHistory = () => {
     setBrowsingHistory([]);
+    clearHistory().catch(error => console.error('Error clearing browsing history:', error));
   };
 
   return (
@@ -1,41 +1,157 @@
 const API_BASE_URL = 'http://localhost:5000/api';
 
+// Per-tab id of the server-side browsing history session (kept across reloads of the tab)
+const getSessionId = () => {
+  let sessionId = sessionStorage.getItem('sessionId');
+  if (!sessionId) {
+    sessionId = crypto.randomUUID();
+    sessionStorage.setItem('sessionId', sessionId);
+  }
+  return sessionId;
+};
+
 // Helper to get auth headers
 const getAuthHeaders = () => {
   const token = localStorage.getItem('token');
   return {
     'Content-Type': 'application/json',
+    'X-Session-Id': getSessionId(),
     ...(token && { Authorization: `Bearer ${token}` }),
   };
 };
 
-// Fetch all products from the API
-export const fetchProducts = async () => {
+// Fields the catalog UI actually renders; everything else stays on the server
+const CATALOG_FIELDS = 'id,name,category,brand,price';
+const CATALOG_PAGE_SIZE = 500;
+
+// Fetch the catalog page by page, calling onPage with each page as it arrives
+// so the UI can render incrementally. Resolves with all loaded products.
+export const fetchProducts = async (onPage) => {
   try {
-    const response = await fetch(`${API_BASE_URL}/products`, {
-      headers: getAuthHeaders()
-    });
-    if (!response.ok) {
-      throw new Error(`HTTP error ${response.status}`);
-    }
-    return await response.json();
+    const products = [];
+    let cursor = null;
+
+    do {
+      const params = new URLSearchParams({ limit: CATALOG_PAGE_SIZE, fields: CATALOG_FIELDS });
+      if (cursor) params.set('cursor', cursor);
+
+      const response = await fetch(`${API_BASE_URL}/products?${params}`, {
+        headers: getAuthHeaders()
+      });
+      if (!response.ok) {
+        throw new Error(`HTTP error ${response.status}`);
+      }
+
+      const page = await response.json();
+      products.push(...page.products);
+      if (onPage) onPage(page.products);
+      cursor = page.next_cursor;
+    } while (cursor);
+
+    return products;
   } catch (error) {
     console.error('Error fetching products:', error);
     throw error;
   }
 };
 
-// Get recommendations based on user preferences and browsing history
-export const getRecommendations = async (preferences, browsingHistory) => {
-  try {
-    const response = await fetch(`${API_BASE_URL}/recommendations`, {
+// The backend keeps the browsing history per session, so the client only sends the
+// products viewed since the last sync. seq (items sent before a delta) lets the server
+// skip items a retried delta repeats and report a gap when it lost some.
+let viewedHistory = [];  // every product viewed since the last clear, oldest first
+let syncedCount = 0;     // how many of them the server has acknowledged
+let receivedCount = 0;   // the server's item count, i.e. the next delta's seq
+let historySync = Promise.resolve();
+
+const postHistory = async (delta) => {
+  const response = await fetch(`${API_BASE_URL}/session/history`, {
+    method: 'POST',
+    headers: getAuthHeaders(),
+    body: JSON.stringify(delta),
+  });
+  if (!response.ok && response.status !== 409) {
+    throw new Error(`HTTP error ${response.status}`);
+  }
+  return response;
+};
+
+const sendPendingHistory = async () => {
+  const target = viewedHistory.length;
+  if (syncedCount >= target) return;
+  let response = await postHistory({ append: viewedHistory.slice(syncedCount, target), seq: receivedCount });
+  if (response.status === 409) {
+    // The server lost part of the session (restart or eviction): replay all of it
+    response = await postHistory({ append: viewedHistory.slice(0, target), reset: true });
+  }
+  receivedCount = (await response.json()).received;
+  syncedCount = target;
+};
+
+// Queue the pending products for the server; syncs run one at a time and in order
+export const syncHistory = () => {
+  historySync = historySync.catch(() => {}).then(sendPendingHistory);
+  return historySync;
+};
+
+// Load the session's history from the server, e.g. after the page is reloaded
+export const loadHistory = async () => {
+  const response = await fetch(`${API_BASE_URL}/session/history`, {
+    headers: getAuthHeaders()
+  });
+  if (!response.ok) {
+    throw new Error(`HTTP error ${response.status}`);
+  }
+  const session = await response.json();
+  viewedHistory = [...session.history];
+  syncedCount = viewedHistory.length;
+  receivedCount = session.received;
+  return session.history;
+};
+
+export const appendHistory = (productIds) => {
+  viewedHistory.push(...productIds);
+  return syncHistory();
+};
+
+export const clearHistory = () => {
+  viewedHistory = [];
+  historySync = historySync.catch(() => {}).then(async () => {
+    const response = await postHistory({ reset: true });
+    receivedCount = (await response.json()).received;
+    syncedCount = 0;
+  });
+  return historySync;
+};
+
+// Send a recommendation request that uses the session's history, replaying the
+// history once if the server reports it is missing items
+const postWithSessionHistory = async (path, preferences) => {
+  const send = async () => {
+    await syncHistory();
+    return fetch(`${API_BASE_URL}${path}`, {
       method: 'POST',
       headers: getAuthHeaders(),
       body: JSON.stringify({
         preferences: preferences,
-        browsing_history: browsingHistory
+        history_seq: receivedCount
       }),
     });
+  };
+
+  let response = await send();
+  if (response.status === 409) {
+    // Resend the whole history: the server reports the same gap for it and
+    // sendPendingHistory replays everything with a reset
+    syncedCount = 0;
+    response = await send();
+  }
+  return response;
+};
+
+// Get recommendations based on user preferences and the session's browsing history
+export const getRecommendations = async (preferences) => {
+  try {
+    const response = await postWithSessionHistory('/recommendations', preferences);
 
     if (!response.ok) {
       throw new Error(`HTTP error ${response.status}`);
@@ -46,4 +162,55 @@ export const getRecommendations = async (preferences, browsingHistory) => {
     console.error('Error getting recommendations:', error);
     throw error;
   }
-};
\ No newline at end of file
+};
+
+// Stream recommendations as server-sent events, calling onRecommendation for each
+// item as soon as the backend emits it. Resolves with the final count.
+export const streamRecommendations = async (preferences, onRecommendation) => {
+  try {
+    const response = await postWithSessionHistory('/recommendations/stream', preferences);
+
+    if (!response.ok) {
+      throw new Error(`HTTP error ${response.status}`);
+    }
+
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+    let count = 0;
+
+    while (true) {
+      const { value, done } = await reader.read();
+      if (done) break;
+      buffer += decoder.decode(value, { stream: true });
+
+      // Events are separated by a blank line
+      let boundary;
+      while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+        const rawEvent = buffer.slice(0, boundary);
+        buffer = buffer.slice(boundary + 2);
+
+        let event = 'message';
+        let data = '';
+        for (const line of rawEvent.split('\n')) {
+          if (line.startsWith('event:')) event = line.slice(6).trim();
+          else if (line.startsWith('data:')) data += line.slice(5).trim();
+        }
+
+        if (event === 'recommendation') {
+          count += 1;
+          onRecommendation(JSON.parse(data));
+        } else if (event === 'error') {
+          throw new Error(JSON.parse(data).detail);
+        } else if (event === 'done') {
+          return JSON.parse(data).count;
+        }
+      }
+    }
+
+    return count;
+  } catch (error) {
+    console.error('Error streaming recommendations:', error);
+    throw error;
+  }
+};
@@ -0,0 +1,178 @@
+import asyncio
+import json
+
+from config import config
+from services.prompt_builder import estimate_tokens
+
+_DECODER = json.JSONDecoder()
+
+
+class _PendingRequest:
+    """
+    One user's request waiting in the current batch
+    """
+
+    __slots__ = ("label", "user_preferences", "browsed_products", "candidate_products", "future")
+
+    def __init__(self, label, user_preferences, browsed_products, candidate_products, future):
+        self.label = label
+        self.user_preferences = user_preferences
+        self.browsed_products = browsed_products
+        self.candidate_products = candidate_products
+        self.future = future
+
+
+class BatchScheduler:
+    """
+    Micro-batching of recommendation requests into shared LLM calls
+
+    Requests arriving within BATCH_WINDOW_MS of the first one in a batch
+    (up to BATCH_MAX_SIZE users, and as long as the estimated prompt plus
+    reserved completion tokens stay under BATCH_MAX_TOKENS) are sent as
+    one chat completion. The candidate catalog section is written once for
+    the whole batch, each user gets a short section with their preferences,
+    history and shortlist, and the model answers with a JSON object keyed
+    by user label that is split back to the waiting requests.
+    """
+
+    def __init__(self, llm_service, window_ms=None, max_batch_size=None, max_tokens=None,
+                 completion_tokens_per_user=None):
+        """
+        Initialize the scheduler with limits from config unless given explicitly
+        """
+        self.llm_service = llm_service
+        self.window = (window_ms or config['BATCH_WINDOW_MS']) / 1000.0
+        self.max_batch_size = max_batch_size or config['BATCH_MAX_SIZE']
+        self.max_tokens = max_tokens or config['BATCH_MAX_TOKENS']
+        self.completion_tokens_per_user = completion_tokens_per_user or config['BATCH_COMPLETION_TOKENS_PER_USER']
+
+        self._pending = []
+        self._pending_tokens = 0
+        self._seen_candidates = set()
+        self._timer = None
+
+        self.upstream_calls = 0
+        self.requests = 0
+        self.prompt_tokens = 0
+
+    async def submit(self, user_preferences, browsed_products, candidate_products):
+        """
+        Queue one user's request and wait for their share of the batched response
+
+        Returns (content, offered): the JSON text of that user's recommendation
+        array, ready for LLMService._parse_recommendation_response, and the
+        candidate products the prompt offered that user.
+        """
+        added_tokens = self._estimate_added_tokens(user_preferences, browsed_products, candidate_products)
+        if self._pending and self._pending_tokens + added_tokens > self.max_tokens:
+            self._flush()
+            added_tokens = self._estimate_added_tokens(user_preferences, browsed_products, candidate_products)
+
+        loop = asyncio.get_running_loop()
+        request = _PendingRequest(
+            f"u{len(self._pending) + 1}", user_preferences, browsed_products, candidate_products, loop.create_future()
+        )
+        self._pending.append(request)
+        self._pending_tokens += added_tokens
+        self._seen_candidates.update(p["id"] for p in candidate_products)
+        self.requests += 1
+
+        if len(self._pending) >= self.max_batch_size:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.window, self._flush)
+
+        return await request.future
+
+    def stats(self):
+        """
+        Counters for monitoring; requests per 1k prompt tokens is the batching payoff
+        """
+        return {
+            "enabled": True,
+            "upstream_calls": self.upstream_calls,
+            "requests": self.requests,
+            "avg_batch_size": self.requests / self.upstream_calls if self.upstream_calls else 0.0,
+            "estimated_prompt_tokens": self.prompt_tokens,
+            "requests_per_1k_prompt_tokens": 1000.0 * self.requests / self.prompt_tokens if self.prompt_tokens else 0.0,
+        }
+
+    def _estimate_added_tokens(self, user_preferences, browsed_products, candidate_products):
+        """
+        Tokens this request adds to the current batch: its user section, any candidates
+        not already in the shared section, and its reserved completion budget
+        """
+        if not self._pending:
+            self._seen_candidates = set()
+        builder = self.llm_service.prompt_builder
+        catalog = builder.product_service.snapshot
+        section = builder.batch_user_section("u0", user_preferences, browsed_products, candidate_products, catalog)
+        new_candidates = [p for p in candidate_products if p["id"] not in self._seen_candidates]
+        rows = builder.rows_for(new_candidates, catalog)
+        row_tokens = int(catalog.prompt_fragments.tokens[rows].sum()) if rows else 0
+        return estimate_tokens(section) + row_tokens + self.completion_tokens_per_user
+
+    def _flush(self):
+        """
+        Detach the current batch and send it upstream in the background
+        """
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        self._pending_tokens = 0
+        self._seen_candidates = set()
+        if batch:
+            asyncio.ensure_future(self._send(batch))
+
+    async def _send(self, batch):
+        """
+        Send one batch and resolve every waiting request with its share of the answer
+        """
+        try:
+            if len(batch) == 1:
+                only = batch[0]
+                prompt, packed = self.llm_service._create_recommendation_prompt(
+                    only.user_preferences, only.browsed_products, only.candidate_products
+                )
+            else:
+                prompt = self.llm_service.prompt_builder.build_batch(batch)
+            self.upstream_calls += 1
+            self.prompt_tokens += estimate_tokens(prompt)
+
+            content = await self.llm_service._acomplete(
+                self.llm_service._messages(prompt),
+                max_tokens=self.completion_tokens_per_user * len(batch) if len(batch) > 1 else None,
+            )
+            if len(batch) == 1:
+                batch[0].future.set_result((content, packed))
+                return
+
+            answers = self._split_response(content)
+            for request in batch:
+                if not request.future.done():
+                    request.future.set_result((json.dumps(answers.get(request.label, [])), request.candidate_products))
+        except Exception as e:
+            for request in batch:
+                if not request.future.done():
+                    request.future.set_exception(e)
+
+    @staticmethod
+    def _split_response(content):
+        """
+        Extract the {label: [recommendations]} object from a batched response
+
+        Decodes with raw_decode from the first '{' like the single-user
+        parser does, so text or code fences after the object and stray
+        braces in any prose before it are ignored.
+        """
+        start = content.find("{")
+        while start != -1:
+            try:
+                answers, _ = _DECODER.raw_decode(content, start)
+            except ValueError:
+                answers = None
+            if isinstance(answers, dict):
+                return answers
+            start = content.find("{", start + 1)
+        raise ValueError("Could not find JSON object in batched LLM response")
@@ -0,0 +1,482 @@
+"""
+Compiled binary catalog snapshot (".pcat")
+
+Layout: an 8-byte magic, a little-endian uint32 header length, a JSON header
+and then 64-byte aligned sections. Numeric fields are fixed-width columns,
+stored twice: as written (NaN / INT_MISSING where a value is absent, plus
+flags marking the integers in float columns so 4 does not come back as
+4.0), to materialize products exactly, and cleaned and typed the way
+CatalogColumns uses them, so the filter columns are the mapped pages
+themselves; every string (scalar fields, list items and a per-product JSON blob for any
+field outside the schema) lives once in a deduplicated string table that
+products refer to by index. The file is opened with np.memmap, so numeric
+columns are usable without reading the file and the OS shares the pages
+between worker processes that open the same snapshot. Products themselves
+are decoded one at a time when they are accessed, never all at load.
+
+The structures CatalogSnapshot would otherwise derive product by product in
+every process are stored as well: the rows in product id order (so id
+lookups are binary searches), the dictionary-encoded category, subcategory,
+brand and tag codes, and each product's prompt row with its token count.
+
+Convert a JSON or JSONL catalog with:
+
+    python -m services.binary_catalog backend/data/products.json backend/data/products.pcat
+"""
+import json
+import struct
+import sys
+from bisect import bisect_right
+from collections.abc import Mapping, Sequence
+
+import numpy as np
+
+MAGIC = b"PCATv002"
+ALIGNMENT = 64
+
+STRING_FIELDS = ("id", "name", "category", "subcategory", "brand", "description")
+LIST_FIELDS = ("features", "tags")
+NUMERIC_FIELDS = {"price": "<f8", "rating": "<f8", "inventory": "<i8"}
+# dtypes of the cleaned columns, as CatalogColumns holds them
+COLUMN_DTYPES = {"price": "<f8", "rating": "<f4", "inventory": "<i4"}
+# Output key order of materialized products, matching the JSON catalog
+FIELD_ORDER = ("id", "name", "category", "subcategory", "price", "brand",
+               "description", "features", "rating", "inventory", "tags")
+
+# String index markers for scalar and list fields
+ABSENT = -1
+NULL = -2
+# Inventory value marking "see the extra blob", since integers have no NaN
+INT_MISSING = np.iinfo(np.int64).min
+# Largest integer a float column holds exactly; larger ones go to the extra blob
+MAX_EXACT_INT = 2 ** 53
+
+
+def write_binary_catalog(products, path, similarity_matrix=None, payload=None):
+    """
+    Compile a product list into a binary snapshot at path
+
+    A similarity_matrix (float32, one row per product) is stored as an extra
+    section so SimilarityIndex can skip vectorizing the catalog on load. A
+    CatalogPayload for the same products stores the serialized and
+    compressed /api/products bodies, so readers serve them from the map.
+    The id order, facet codes and prompt rows are always derived and stored.
+    """
+    n = len(products)
+    strings = {}
+
+    def intern(value):
+        return strings.setdefault(value, len(strings))
+
+    string_columns = {f: np.full(n, ABSENT, dtype="<i4") for f in STRING_FIELDS}
+    list_offsets = {f: np.zeros(n + 1, dtype="<i8") for f in LIST_FIELDS}
+    list_items = {f: [] for f in LIST_FIELDS}
+    list_present = {f: np.zeros(n, dtype="u1") for f in LIST_FIELDS}
+    numeric_columns = {
+        f: np.full(n, INT_MISSING if f == "inventory" else np.nan, dtype=dtype) for f, dtype in NUMERIC_FIELDS.items()
+    }
+    integral = {f: np.zeros(n, dtype="u1") for f, dtype in NUMERIC_FIELDS.items() if dtype == "<f8"}
+    extras = np.full(n, ABSENT, dtype="<i4")
+
+    for row, product in enumerate(products):
+        extra = {}
+        for key, value in product.items():
+            if key in string_columns:
+                if value is None:
+                    string_columns[key][row] = NULL
+                elif isinstance(value, str):
+                    string_columns[key][row] = intern(value)
+                else:
+                    extra[key] = value
+            elif key in list_items:
+                if isinstance(value, (list, tuple)) and all(isinstance(v, str) for v in value):
+                    list_items[key].extend(intern(v) for v in value)
+                    list_present[key][row] = 1
+                else:
+                    extra[key] = value
+            elif key in numeric_columns and _fits_column(key, value):
+                numeric_columns[key][row] = value
+                if key in integral and isinstance(value, int):
+                    integral[key][row] = 1
+            else:
+                extra[key] = value
+        for key in LIST_FIELDS:
+            list_offsets[key][row + 1] = len(list_items[key])
+        if extra:
+            extras[row] = intern(json.dumps(extra, separators=(",", ":")))
+
+    derived, tokenizer = _derived_sections(products, intern)
+
+    encoded = [s.encode("utf-8") for s in strings]
+    string_offsets = np.zeros(len(encoded) + 1, dtype="<i8")
+    np.cumsum([len(b) for b in encoded], out=string_offsets[1:])
+
+    sections = {
+        "string_offsets": string_offsets,
+        "string_data": np.frombuffer(b"".join(encoded), dtype="u1"),
+        "extras": extras,
+    }
+    sections.update({f"str:{f}": column for f, column in string_columns.items()})
+    sections.update({f"num:{f}": column for f, column in numeric_columns.items()})
+    sections.update({f"col:{f}": _clean(f, column) for f, column in numeric_columns.items()})
+    sections.update({f"int:{f}": flags for f, flags in integral.items()})
+    for f in LIST_FIELDS:
+        sections[f"list_offsets:{f}"] = list_offsets[f]
+        sections[f"list_items:{f}"] = np.asarray(list_items[f], dtype="<i4")
+        sections[f"list_present:{f}"] = list_present[f]
+    sections.update(derived)
+    if similarity_matrix is not None:
+        sections["similarity"] = np.ascontiguousarray(similarity_matrix, dtype="<f4")
+    if payload is not None:
+        sections["payload:identity"] = np.frombuffer(payload.body, dtype="u1")
+        for coding, body in payload.encoded.items():
+            sections[f"payload:{coding}"] = np.frombuffer(body, dtype="u1")
+
+    # Lay the sections out after the header, each on an aligned offset
+    layout = {}
+    offset = 0
+    for name, array in sections.items():
+        layout[name] = {"dtype": array.dtype.str, "shape": list(array.shape), "offset": offset}
+        offset = _align(offset + array.nbytes)
+    header = {"count": n, "sections": layout, "prompt_tokenizer": tokenizer}
+    if payload is not None:
+        header["fingerprint"] = payload.fingerprint
+    header = json.dumps(header, separators=(",", ":")).encode("utf-8")
+    data_start = _align(len(MAGIC) + 4 + len(header))
+
+    with open(path, "wb") as file:
+        file.write(MAGIC + struct.pack("<I", len(header)) + header)
+        for name, array in sections.items():
+            file.seek(data_start + layout[name]["offset"])
+            file.write(array.tobytes())
+        file.truncate(data_start + offset)
+
+
+class BinaryCatalog:
+    """
+    Read-only, memory-mapped view of a binary catalog snapshot
+    """
+
+    def __init__(self, path):
+        """
+        Map the file and expose every section as a NumPy array view
+        """
+        self.path = path
+        self._map = np.memmap(path, dtype="u1", mode="r")
+        if self._map[:len(MAGIC)].tobytes() != MAGIC:
+            raise ValueError(f"{path} is not a binary catalog snapshot of this version; regenerate it")
+        (header_length,) = struct.unpack("<I", self._map[len(MAGIC):len(MAGIC) + 4].tobytes())
+        header = json.loads(self._map[len(MAGIC) + 4:len(MAGIC) + 4 + header_length].tobytes())
+        data_start = _align(len(MAGIC) + 4 + header_length)
+
+        self.size = header["count"]
+        self.fingerprint = header.get("fingerprint")
+        self.sections = {}
+        # Plain ndarray views of the map: indexing a np.memmap goes through Python-level hooks
+        data = self._map.view(np.ndarray)
+        for name, spec in header["sections"].items():
+            dtype = np.dtype(spec["dtype"])
+            count = int(np.prod(spec["shape"]))
+            start = data_start + spec["offset"]
+            self.sections[name] = data[start:start + count * dtype.itemsize].view(dtype).reshape(spec["shape"])
+
+        # Cleaned numeric columns: absent values are 0, inventory is clamped to >= 0
+        self.price = self.sections["col:price"]
+        self.rating = self.sections["col:rating"]
+        self.inventory = self.sections["col:inventory"]
+        self.similarity_matrix = self.sections.get("similarity")
+        # Rows in product id order; absent when some id is not a string
+        self.id_order = self.sections.get("id_order")
+        self.prompt_tokenizer = header.get("prompt_tokenizer")
+        self._string_offsets = self.sections["string_offsets"]
+        self._string_data = memoryview(self.sections["string_data"])
+
+    def payload_bodies(self):
+        """
+        {coding: memoryview} of the stored /api/products bodies ("identity" is uncompressed), or None
+        """
+        if self.fingerprint is None:
+            return None
+        return {
+            name.split(":", 1)[1]: memoryview(array)
+            for name, array in self.sections.items() if name.startswith("payload:")
+        }
+
+    def string(self, index):
+        """
+        Decode one entry of the string table
+        """
+        offsets = self._string_offsets
+        return bytes(self._string_data[offsets[index]:offsets[index + 1]]).decode("utf-8")
+
+    def product_id(self, row):
+        """
+        The id of the product at row (only valid when id_order is stored, i.e. every id is a string)
+        """
+        return self.string(self.sections["str:id"][row])
+
+    def ids(self):
+        """
+        Product ids in row order, decoded on access, or None when the id order is not stored
+        """
+        if self.id_order is None:
+            return None
+        return MappedSequence(self.size, self.product_id)
+
+    def sorted_ids(self):
+        """
+        Product ids in id order, decoded on access, or None when the id order is not stored
+        """
+        if self.id_order is None:
+            return None
+        return MappedSequence(self.size, lambda position: self.product_id(self.id_order[position]))
+
+    def row_index(self):
+        """
+        Read-only {product id: row} mapping that binary-searches the id order, or None when it is not stored
+        """
+        if self.id_order is None:
+            return None
+        return RowIndex(self.sorted_ids(), self.id_order)
+
+    def facet(self, field):
+        """
+        (vocab, int32 codes) of a categorical field as ColumnarCatalog encodes it, or None if not stored
+        """
+        vocab = self.sections.get(f"facet_vocab:{field}")
+        if vocab is None:
+            return None
+        return self._vocab(vocab), self.sections[f"facet_codes:{field}"]
+
+    def tag_facet(self):
+        """
+        (vocab, int32 codes, int64 offsets) of the tags as ColumnarCatalog encodes them, or None if not stored
+        """
+        facet = self.facet("tags")
+        if facet is None:
+            return None
+        return facet + (self.sections["facet_offsets:tags"],)
+
+    def prompt_rows(self):
+        """
+        Each product's prompt row after its short id column, decoded on access, or None if not stored
+        """
+        if "prompt_offsets" not in self.sections:
+            return None
+        offsets = self.sections["prompt_offsets"]
+        data = memoryview(self.sections["prompt_data"])
+        return MappedSequence(self.size, lambda row: bytes(data[offsets[row]:offsets[row + 1]]).decode("utf-8"))
+
+    def _vocab(self, indexes):
+        """
+        {value: code} from a section of string table indexes, NULL standing for None
+        """
+        return {None if index == NULL else self.string(index): code for code, index in enumerate(indexes.tolist())}
+
+    def product(self, row):
+        """
+        Decode the product at row into a dict, with keys in the JSON catalog's order
+        """
+        sections = self.sections
+        extra_index = sections["extras"][row]
+        extra = json.loads(self.string(extra_index)) if extra_index >= 0 else {}
+        product = {}
+        for field in FIELD_ORDER:
+            if field in extra:
+                product[field] = extra.pop(field)
+            elif field in STRING_FIELDS:
+                index = sections[f"str:{field}"][row]
+                if index != ABSENT:
+                    product[field] = self.string(index) if index >= 0 else None
+            elif field in LIST_FIELDS:
+                if sections[f"list_present:{field}"][row]:
+                    offsets = sections[f"list_offsets:{field}"]
+                    items = sections[f"list_items:{field}"][offsets[row]:offsets[row + 1]].tolist()
+                    product[field] = [self.string(i) for i in items]
+            elif field == "inventory":
+                value = int(sections["num:inventory"][row])
+                if value != INT_MISSING:
+                    product[field] = value
+            else:
+                value = float(sections[f"num:{field}"][row])
+                if value == value:  # not NaN
+                    product[field] = int(value) if sections[f"int:{field}"][row] else value
+        product.update(extra)
+        return product
+
+    def products(self, factory=dict):
+        """
+        The catalog as a lazy sequence of product(row) passed through factory, decoded on every access
+
+        Nothing is decoded up front, so this costs the same for any catalog
+        size and a worker only decodes the products its requests touch,
+        while the mapped pages stay shared between processes.
+        """
+        return MappedSequence(self.size, lambda row: factory(self.product(row)))
+
+    def close(self):
+        """
+        Release the memory map
+        """
+        self._map._mmap.close()
+
+
+class MappedSequence(Sequence):
+    """
+    Read-only sequence whose items are computed from a memory map when accessed
+    """
+
+    def __init__(self, size, item):
+        """
+        size items, item(i) computing the i-th
+        """
+        self._size = size
+        self._item = item
+
+    def __len__(self):
+        return self._size
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self._item(i) for i in range(*index.indices(self._size))]
+        if index < 0:
+            index += self._size
+        if not 0 <= index < self._size:
+            raise IndexError("index out of range")
+        return self._item(index)
+
+
+class RowIndex(Mapping):
+    """
+    {product id: row} over ids sorted in a snapshot, answered by binary search instead of a per-process dict
+
+    Like a dict built row by row, a repeated id maps to its last row.
+    """
+
+    def __init__(self, sorted_ids, id_order):
+        """
+        sorted_ids[k] is the id of row id_order[k]
+        """
+        self._sorted_ids = sorted_ids
+        self._id_order = id_order
+
+    def __getitem__(self, product_id):
+        if isinstance(product_id, str):
+            position = bisect_right(self._sorted_ids, product_id) - 1
+            if position >= 0 and self._sorted_ids[position] == product_id:
+                return int(self._id_order[position])
+        raise KeyError(product_id)
+
+    def __iter__(self):
+        return iter(self._sorted_ids)
+
+    def __len__(self):
+        return len(self._sorted_ids)
+
+
+def _derived_sections(products, intern):
+    """
+    ({name: array}, tokenizer) of the id order, facet codes and prompt rows CatalogSnapshot would derive
+
+    They are computed by the same code a snapshot uses, so a reader gets
+    identical structures. Vocabularies are stored as string table indexes;
+    a facet with a value that is not a string or None is left out, as are
+    the id order when some id is not a string and the prompt rows when a
+    product cannot be rendered, and readers derive those themselves.
+    """
+    from services.catalog_columns import ColumnarCatalog
+    from services.prompt_builder import TOKENIZER, PromptFragments
+
+    sections = {}
+    ids = [product['id'] for product in products]
+    if all(type(product_id) is str for product_id in ids):
+        sections["id_order"] = ColumnarCatalog.order_by_id(ids)
+    facets = {
+        field: ColumnarCatalog.encode(p.get(field) for p in products) for field in ("category", "subcategory", "brand")
+    }
+    tags = (p.get('tags') or [] for p in products)
+    tag_vocab, tag_codes, tag_offsets = ColumnarCatalog.encode_lists(tags, len(products))
+    facets["tags"] = (tag_vocab, tag_codes)
+    for field, (vocab, codes) in facets.items():
+        if all(value is None or type(value) is str for value in vocab):
+            indexes = [NULL if value is None else intern(value) for value in vocab]
+            sections[f"facet_vocab:{field}"] = np.asarray(indexes, dtype="<i4")
+            sections[f"facet_codes:{field}"] = codes.astype("<i4")
+    if "facet_vocab:tags" in sections:
+        sections["facet_offsets:tags"] = tag_offsets.astype("<i8")
+
+    # Rows are stored without their short id column, which depends on the previous snapshot
+    try:
+        fragments = PromptFragments(products)
+    except (TypeError, ValueError):  # off-schema values that have no prompt row; readers fail the same way
+        return sections, TOKENIZER
+    rows = [row.split("|", 1)[1].encode("utf-8") for row in fragments.rows]
+    offsets = np.zeros(len(rows) + 1, dtype="<i8")
+    np.cumsum([len(r) for r in rows], out=offsets[1:])
+    sections["prompt_offsets"] = offsets
+    sections["prompt_data"] = np.frombuffer(b"".join(rows), dtype="u1")
+    sections["prompt_tokens"] = fragments.tokens.astype("<i4")
+    return sections, TOKENIZER
+
+
+def _clean(field, column):
+    """
+    A numeric column as CatalogColumns uses it: absent values become 0 and inventory is never negative
+    """
+    if field == "inventory":
+        column = np.clip(column, 0, np.iinfo(np.int32).max)
+    else:
+        column = np.nan_to_num(column, nan=0.0)
+    return column.astype(COLUMN_DTYPES[field])
+
+
+def _fits_column(field, value):
+    """
+    True if value can be stored in the field's numeric column and read back unchanged
+    """
+    if not _is_number(value):
+        return False
+    if NUMERIC_FIELDS[field] == "<i8":
+        return isinstance(value, int) and INT_MISSING < value <= np.iinfo(np.int64).max
+    return not isinstance(value, int) or abs(value) <= MAX_EXACT_INT
+
+
+def _is_number(value):
+    """
+    True for ints and floats, but not bools
+    """
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def _align(offset):
+    """
+    Round an offset up to the section alignment
+    """
+    return (offset + ALIGNMENT - 1) // ALIGNMENT * ALIGNMENT
+
+
+def main(argv=None):
+    """
+    Convert a JSON / JSONL catalog into a binary snapshot, with the similarity matrix and the serialized payload
+    """
+    from config import config
+    from services.catalog_loader import load_catalog
+    from services.catalog_payload import CatalogPayload
+    from services.similarity_index import SimilarityIndex
+
+    args = sys.argv[1:] if argv is None else argv
+    if len(args) != 2:
+        print("usage: python -m services.binary_catalog <input.json|input.jsonl> <output.pcat>")
+        return 2
+    source, target = args
+    products, _ = load_catalog(source)
+    matrix = SimilarityIndex(products, mode="exact").matrix
+    payload = CatalogPayload(products)
+    write_binary_catalog(products, target, similarity_matrix=matrix, payload=payload)
+    print(f"Wrote {len(products)} products to {target} "
+          f"(fingerprint {payload.fingerprint}, similarity dim {config['SIMILARITY_DIM']})")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
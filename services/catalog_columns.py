@@ -0,0 +1,172 @@
+import numpy as np
+
+
+def parse_price_range(price_range):
+    """
+    Parse a price range string ("all", "50-150", "100+") into (low, high) bounds
+
+    Returns (None, None) for "all" and raises ValueError for malformed input.
+    """
+    value = (price_range or "all").strip().lower()
+    if value == "all":
+        return None, None
+    if value.endswith("+"):
+        return float(value[:-1]), None
+    low, high = map(float, value.split("-"))
+    if low > high:
+        low, high = high, low
+    return low, high
+
+
+class ColumnarCatalog:
+    """
+    Column-oriented view of the product catalog backed by NumPy arrays
+
+    Row i of every column describes products[i]. Categorical fields are
+    dictionary-encoded into int32 codes so facet filters become integer
+    comparisons, and the multi-valued tags are stored CSR-style: the tags
+    of row i are tag_codes[tag_offsets[i]:tag_offsets[i + 1]].
+    """
+
+    def __init__(self, products, binary=None):
+        """
+        Build the columns; numeric columns come straight from a binary catalog snapshot when given
+
+        The snapshot stores them cleaned and typed, so they are its mapped
+        arrays, not copies. The same goes for the id order and the facet
+        codes, when the snapshot has them.
+        """
+        n = len(products)
+        self.size = n
+        if binary is not None and binary.id_order is not None:
+            # Ids are decoded from the snapshot on access and looked up by binary search in its id order
+            self.ids = binary.ids()
+            self.row_by_id = binary.row_index()
+            self.id_order = binary.id_order
+            self.sorted_ids = binary.sorted_ids()
+        else:
+            self.ids = [p['id'] for p in products]
+            self.row_by_id = {pid: i for i, pid in enumerate(self.ids)}
+            # Rows in product ID order, the stable order used for cursor pagination
+            self.id_order = self.order_by_id(self.ids)
+            self.sorted_ids = [self.ids[i] for i in self.id_order]
+
+        if binary is not None:
+            self.price = binary.price
+            self.rating = binary.rating
+            self.inventory = binary.inventory
+        else:
+            self.price = np.fromiter((p.get('price') or 0.0 for p in products), dtype=np.float64, count=n)
+            self.rating = np.fromiter((p.get('rating') or 0.0 for p in products), dtype=np.float32, count=n)
+            self.inventory = np.fromiter((p.get('inventory') or 0 for p in products), dtype=np.int32, count=n)
+        self.log_price = np.log1p(self.price).astype(np.float32)
+
+        self.category_vocab, self.category_codes = self._facet(products, binary, 'category')
+        self.subcategory_vocab, self.subcategory_codes = self._facet(products, binary, 'subcategory')
+        self.brand_vocab, self.brand_codes = self._facet(products, binary, 'brand')
+
+        stored = binary.tag_facet() if binary is not None else None
+        if stored is not None:
+            self.tag_vocab, self.tag_codes, offsets = stored
+        else:
+            self.tag_vocab, self.tag_codes, offsets = self.encode_lists((p.get('tags') or [] for p in products), n)
+        self.tag_offsets = offsets
+        # Row id of every entry in tag_codes, used to scatter per-tag results back to rows
+        self.tag_rows = np.repeat(np.arange(n, dtype=np.int32), np.diff(offsets))
+        self.tag_counts = np.diff(offsets).astype(np.int32)
+
+    @classmethod
+    def _facet(cls, products, binary, field):
+        """
+        (vocab, int32 codes) of a categorical field, from the binary catalog snapshot when it stores them
+        """
+        stored = binary.facet(field) if binary is not None else None
+        return stored if stored is not None else cls.encode(p.get(field) for p in products)
+
+    @staticmethod
+    def order_by_id(ids):
+        """
+        int64 rows sorted by their id, ties in row order
+        """
+        return np.asarray(sorted(range(len(ids)), key=ids.__getitem__), dtype=np.int64)
+
+    @staticmethod
+    def encode(values):
+        """
+        Dictionary-encode a column of strings into (vocab, int32 codes)
+        """
+        vocab = {}
+        codes = [vocab.setdefault(v, len(vocab)) for v in values]
+        return vocab, np.asarray(codes, dtype=np.int32)
+
+    @staticmethod
+    def encode_lists(lists, n):
+        """
+        Dictionary-encode n rows of string lists into CSR form: (vocab, int32 codes, int64 offsets)
+        """
+        vocab = {}
+        offsets = np.zeros(n + 1, dtype=np.int64)
+        codes = []
+        for i, values in enumerate(lists):
+            for value in values:
+                codes.append(vocab.setdefault(value, len(vocab)))
+            offsets[i + 1] = len(codes)
+        return vocab, np.asarray(codes, dtype=np.int32), offsets
+
+    @staticmethod
+    def lookup_codes(vocab, values):
+        """
+        Translate string values into codes, silently dropping unknown values
+        """
+        return np.asarray([vocab[v] for v in values if v in vocab], dtype=np.int32)
+
+    @classmethod
+    def match_codes(cls, vocab, codes, values):
+        """
+        Boolean mask of rows whose code is one of the given values
+
+        Uses a per-vocabulary lookup table, which is a single gather over the
+        column and much cheaper than np.isin for large catalogs.
+        """
+        table = np.zeros(len(vocab) + 1, dtype=bool)
+        table[cls.lookup_codes(vocab, values)] = True
+        return table[codes]
+
+    def filter_mask(self, preferences):
+        """
+        Evaluate a UserPreferences dict as a single boolean mask over all rows
+
+        Supported keys: priceRange, categories, brands and inStock. Facets are
+        ANDed together; values within a facet are ORed. An unparseable
+        priceRange is ignored rather than rejecting the whole request.
+        """
+        mask = np.ones(self.size, dtype=bool)
+
+        try:
+            low, high = parse_price_range(preferences.get("priceRange", "all"))
+        except ValueError as e:
+            print(f"⚠️ Failed to parse price range '{preferences.get('priceRange')}':", e)
+            low, high = None, None
+        if low is not None:
+            mask &= self.price >= low
+        if high is not None:
+            mask &= self.price <= high
+
+        categories = preferences.get("categories") or []
+        if categories:
+            mask &= self.match_codes(self.category_vocab, self.category_codes, categories)
+
+        brands = preferences.get("brands") or []
+        if brands:
+            mask &= self.match_codes(self.brand_vocab, self.brand_codes, brands)
+
+        if preferences.get("inStock"):
+            mask &= self.inventory > 0
+
+        return mask
+
+    def filter_indices(self, preferences):
+        """
+        Return the row positions matching the preferences, in catalog order
+        """
+        return np.flatnonzero(self.filter_mask(preferences))
@@ -0,0 +1,123 @@
+import json
+import re
+
+from services.product_record import ProductRecord
+
+_WHITESPACE = re.compile(r"\s*")
+
+
+def iter_json_array(file, chunk_size=1 << 20, max_object_chars=64 << 20):
+    """
+    Yield the elements of a top-level JSON array read from a text file, one at a time
+
+    The file is read in chunks and each element is decoded with raw_decode
+    as soon as it is complete, so only the current chunk and the element
+    being decoded are held in memory rather than the whole document text.
+    The array is checked as strictly as json.load does: elements must be
+    separated by single commas, with none trailing, and only whitespace may
+    follow the closing bracket. Raises ValueError with the character offset
+    for malformed input.
+    """
+    decoder = json.JSONDecoder()
+    buffer = ""
+    pos = 0
+    consumed = 0  # characters dropped from the front of the buffer
+    eof = False
+    # What may come next: "open" the "[", "first" an element or "]", "element" an element
+    # (after a comma), "separator" a "," or "]", and "end" nothing but whitespace
+    expect = "open"
+
+    while True:
+        pos = _WHITESPACE.match(buffer, pos).end()
+        if pos == len(buffer):
+            if eof:
+                if expect == "end":
+                    return
+                raise ValueError(f"Unexpected end of file at character {consumed + pos}: the product array is not closed")
+            chunk = file.read(chunk_size)
+            consumed += pos
+            buffer, pos = buffer[pos:] + chunk, 0
+            eof = not chunk
+            continue
+
+        char = buffer[pos]
+        if expect == "open":
+            if char != "[":
+                raise ValueError(f"Expected a JSON array of products at character {consumed + pos}")
+            expect = "first"
+            pos += 1
+            continue
+        if expect == "end":
+            raise ValueError(f"Unexpected data after the product array at character {consumed + pos}")
+        if expect == "separator":
+            if char not in ",]":
+                raise ValueError(f"Expected ',' or ']' after a product at character {consumed + pos}")
+            expect = "element" if char == "," else "end"
+            pos += 1
+            continue
+        if char == "]" and expect == "first":
+            expect = "end"
+            pos += 1
+            continue
+        if char in ",]":
+            raise ValueError(f"Expected a product at character {consumed + pos}")
+
+        try:
+            item, end = decoder.raw_decode(buffer, pos)
+        except ValueError as e:
+            # Most likely the element continues in the next chunk; otherwise it is malformed
+            if eof or len(buffer) - pos > max_object_chars:
+                raise ValueError(f"Malformed product at character {consumed + pos}: {e}") from e
+            chunk = file.read(chunk_size)
+            consumed += pos
+            buffer, pos = buffer[pos:] + chunk, 0
+            eof = not chunk
+            continue
+        yield item
+        pos = end
+        expect = "separator"
+
+
+def iter_jsonl(file):
+    """
+    Yield one product per non-blank line of a JSON Lines file
+    """
+    for line_number, line in enumerate(file, 1):
+        if not line.strip():
+            continue
+        try:
+            yield json.loads(line)
+        except ValueError as e:
+            raise ValueError(f"Malformed product on line {line_number}: {e}") from e
+
+
+def load_catalog(path):
+    """
+    Load the catalog from path and return (products, binary_catalog)
+
+    The format follows the extension: ".pcat" is a compiled binary snapshot
+    (see services.binary_catalog), ".jsonl"/".ndjson" is JSON Lines, and
+    anything else is a JSON array streamed element by element. Each product
+    becomes a compact ProductRecord as soon as it is read, so the parsed
+    dicts never accumulate. Binary snapshots are not decoded up front: products
+    is a lazy sequence that decodes a ProductRecord from the map on each
+    access, and the second value is the open BinaryCatalog, whose
+    memory-mapped columns can be reused directly (None for the text
+    formats). Raises on any error.
+    """
+    if path.endswith(".pcat"):
+        from services.binary_catalog import BinaryCatalog
+        catalog = BinaryCatalog(path)
+        return catalog.products(ProductRecord.from_dict), catalog
+
+    counter = iter(range(1 << 62))
+
+    def to_record(item):
+        i = next(counter)
+        if not isinstance(item, dict) or "id" not in item:
+            raise ValueError(f"Product #{i} in {path} is not an object with an id")
+        return ProductRecord.from_dict(item)
+
+    with open(path, "r", encoding="utf-8") as file:
+        items = iter_jsonl(file) if path.endswith((".jsonl", ".ndjson")) else iter_json_array(file)
+        return [to_record(item) for item in items], None
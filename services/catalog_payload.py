@@ -0,0 +1,128 @@
+import gzip
+import hashlib
+import json
+
+from services.product_record import json_default
+
+try:
+    import brotli
+except ImportError:  # brotli is optional; gzip and identity are always available
+    brotli = None
+
+
+class CatalogPayload:
+    """
+    Pre-serialized /api/products response body for one catalog version
+
+    The catalog is encoded to JSON once, together with gzip (and brotli,
+    when installed) compressed copies, so a catalog request only picks the
+    bytes matching the client's Accept-Encoding. The strong ETag is derived
+    from the body's content hash, with the coding appended for compressed
+    representations, so it stays stable across restarts for the same data.
+    """
+
+    def __init__(self, products):
+        """
+        Serialize and compress the products (a list, or any sequence such as a lazily decoded catalog)
+        """
+        self.body = json.dumps(
+            list(products), ensure_ascii=False, separators=(",", ":"), default=json_default
+        ).encode("utf-8")
+        self.fingerprint = hashlib.sha256(self.body).hexdigest()[:32]
+
+        # mtime=0 keeps the gzip bytes, and so the ETag, identical across rebuilds
+        self.encoded = {"gzip": gzip.compress(self.body, compresslevel=6, mtime=0)}
+        if brotli is not None:
+            self.encoded["br"] = brotli.compress(self.body, quality=9)
+        self._set_etags()
+
+    @classmethod
+    def from_binary(cls, binary):
+        """
+        Payload served straight from a binary catalog's stored bodies, or None if it has none
+
+        The bodies stay memoryviews into the map, so worker processes that
+        open the same snapshot share one copy of them.
+        """
+        bodies = binary.payload_bodies()
+        if bodies is None or "identity" not in bodies:
+            return None
+        payload = cls.__new__(cls)
+        payload.body = bodies.pop("identity")
+        payload.fingerprint = binary.fingerprint
+        payload.encoded = bodies
+        payload._set_etags()
+        return payload
+
+    def _set_etags(self):
+        """
+        One strong ETag per representation, derived from the content fingerprint
+        """
+        self.etags = {None: f'"{self.fingerprint}"'}
+        self.etags.update({coding: f'"{self.fingerprint}-{coding}"' for coding in self.encoded})
+
+    def select(self, accept_encoding):
+        """
+        Return (content_coding, body, etag) for an Accept-Encoding header; the coding is None for identity
+        """
+        accepted, refused = _parse_accept_encoding(accept_encoding)
+        for coding in ("br", "gzip"):
+            if coding in self.encoded and (coding in accepted or ("*" in accepted and coding not in refused)):
+                return coding, self.encoded[coding], self.etags[coding]
+        return None, self.body, self.etags[None]
+
+    def matches(self, if_none_match):
+        """
+        True if an If-None-Match header names any representation of this payload
+        """
+        return etag_matches(if_none_match, self.etags.values())
+
+    def stats(self):
+        """
+        Sizes of every stored representation, in bytes
+        """
+        return {"identity": len(self.body), **{coding: len(body) for coding, body in self.encoded.items()}}
+
+
+def page_etag(fingerprint, query_items):
+    """
+    Strong ETag of one /api/products page: pages are a pure function of the catalog content and the query
+    """
+    query = json.dumps(sorted(query_items), separators=(",", ":"))
+    return '"' + hashlib.sha256(f"{fingerprint}?{query}".encode("utf-8")).hexdigest()[:32] + '"'
+
+
+def etag_matches(if_none_match, etags):
+    """
+    True if an If-None-Match header names any of the given ETags
+    """
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    # If-None-Match uses the weak comparison, so a W/ prefix is ignored
+    tags = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+    return any(etag in tags for etag in etags)
+
+
+def _parse_accept_encoding(header):
+    """
+    Split an Accept-Encoding header into (accepted, refused) sets of content codings; q=0 refuses
+    """
+    accepted = set()
+    refused = set()
+    for part in (header or "").split(","):
+        coding, _, params = part.strip().partition(";")
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        q = 1.0
+        for param in params.split(";"):
+            name, _, value = param.strip().partition("=")
+            if name.strip().lower() == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        (accepted if q > 0 else refused).add(coding)
+    return accepted, refused
@@ -0,0 +1,184 @@
+"""
+Catalog segments shared by several uvicorn worker processes
+
+A parent process loads DATA_PATH once, computes everything that is
+expensive to derive (the similarity matrix, the serialized, compressed
+/api/products bodies, the id order, facet codes and prompt rows) and writes
+it all into a binary catalog snapshot, a "segment", in CATALOG_SEGMENT_DIR. A pointer file in that directory names
+the current segment. Workers started with CATALOG_SEGMENT_DIR set load the
+segment the pointer names instead of DATA_PATH; the file is memory-mapped
+read-only, so those structures, the numeric columns and the string table
+are page-cache pages shared by every worker rather than per-worker copies.
+
+A reload publishes a new segment and then atomically replaces the pointer.
+Workers watch the pointer (CATALOG_WATCH_INTERVAL_SECONDS) and swap onto
+the new segment through their usual snapshot reload. Old segments are
+unlinked after a few generations; a worker still mapping one keeps valid
+pages until it lets go of it.
+
+Run the parent and its workers with:
+
+    python -m services.catalog_segments --workers 4 --port 5001
+"""
+import argparse
+import os
+import tempfile
+
+from config import config
+from services.binary_catalog import write_binary_catalog
+from services.catalog_loader import load_catalog
+from services.catalog_payload import CatalogPayload
+from services.similarity_index import SimilarityIndex
+
+POINTER_NAME = "CURRENT"
+SEGMENT_PREFIX = "catalog-"
+SEGMENT_SUFFIX = ".pcat"
+
+
+def pointer_path(directory):
+    """
+    Path of the file naming the current segment
+    """
+    return os.path.join(directory, POINTER_NAME)
+
+
+def current_segment(directory):
+    """
+    Path of the segment the pointer names; raises OSError when nothing has been published
+    """
+    with open(pointer_path(directory), encoding="utf-8") as file:
+        name = file.read().strip()
+    if not name:
+        raise FileNotFoundError(f"No catalog segment published in {directory}")
+    return os.path.join(directory, name)
+
+
+def publish_segment(products, directory, similarity_matrix=None, keep=3):
+    """
+    Write products as a new segment, point the directory at it and return (path, fingerprint)
+
+    The segment is written under a temporary name and renamed, then the
+    pointer is replaced with os.replace, so a reader sees either the
+    previous complete segment or the new one. Only the newest `keep`
+    segments are kept.
+    """
+    os.makedirs(directory, exist_ok=True)
+    payload = CatalogPayload(products)
+    name = f"{SEGMENT_PREFIX}{payload.fingerprint}{SEGMENT_SUFFIX}"
+    path = os.path.join(directory, name)
+    if not os.path.exists(path):
+        fd, temporary = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        os.close(fd)
+        try:
+            write_binary_catalog(products, temporary, similarity_matrix=similarity_matrix, payload=payload)
+            os.chmod(temporary, 0o644)
+            os.replace(temporary, path)
+        except BaseException:
+            os.unlink(temporary)
+            raise
+
+    fd, temporary = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    with os.fdopen(fd, "w", encoding="utf-8") as file:
+        file.write(name)
+    os.chmod(temporary, 0o644)
+    os.replace(temporary, pointer_path(directory))
+    # Bump the segment's mtime so pruning orders it as the newest even when it was republished
+    os.utime(path)
+    _prune(directory, keep, current=name)
+    return path, payload.fingerprint
+
+
+def _prune(directory, keep, current):
+    """
+    Unlink all but the newest `keep` segments, never the current one
+    """
+    segments = sorted(
+        (entry for entry in os.scandir(directory)
+         if entry.name.startswith(SEGMENT_PREFIX) and entry.name.endswith(SEGMENT_SUFFIX)),
+        key=lambda entry: entry.stat().st_mtime_ns,
+        reverse=True,
+    )
+    for entry in segments[keep:]:
+        if entry.name == current:
+            continue
+        try:
+            os.unlink(entry.path)
+        except OSError:  # still open on platforms that do not allow unlinking mapped files
+            pass
+
+
+class SegmentPublisher:
+    """
+    Parent-side builder that turns the data file into published segments
+
+    Has the source_path / version / reload() surface of ProductService, so a
+    CatalogWatcher can drive it to republish whenever DATA_PATH changes.
+    """
+
+    def __init__(self, data_path, directory):
+        """
+        Initialize the publisher; nothing is built until publish()
+        """
+        self.data_path = data_path
+        self.source_path = data_path
+        self.directory = directory
+        self.version = 0
+        self.fingerprint = None
+
+    def publish(self):
+        """
+        Load the data file and publish it as a segment; returns True if the content changed
+        """
+        products, _ = load_catalog(self.data_path)
+        matrix = SimilarityIndex(products, mode="exact").matrix
+        path, fingerprint = publish_segment(products, self.directory, similarity_matrix=matrix)
+        if fingerprint == self.fingerprint:
+            return False
+        self.fingerprint = fingerprint
+        self.version += 1
+        print(f"Published catalog segment {path} ({len(products)} products)")
+        return True
+
+    def reload(self):
+        """
+        CatalogWatcher hook: republish and return (self, changed)
+        """
+        return self, self.publish()
+
+
+def main(argv=None):
+    """
+    Publish the catalog and serve the API from several workers attached to it
+    """
+    import uvicorn
+    from services.catalog_watcher import CatalogWatcher
+
+    parser = argparse.ArgumentParser(description="Serve the API from worker processes sharing one catalog segment")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=5001)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--segment-dir", default=config['CATALOG_SEGMENT_DIR'] or None,
+                        help="directory for segments (default: a fresh temporary directory)")
+    parser.add_argument("--watch-interval", type=float, default=config['CATALOG_WATCH_INTERVAL_SECONDS'] or 1.0,
+                        help="seconds between checks of DATA_PATH for changes (0 disables)")
+    args = parser.parse_args(argv)
+
+    directory = args.segment_dir or tempfile.mkdtemp(prefix="catalog-segments-")
+    publisher = SegmentPublisher(config['DATA_PATH'], directory)
+    publisher.publish()
+    watcher = CatalogWatcher(publisher, args.watch_interval)
+    if args.watch_interval > 0:
+        watcher.start()
+
+    # Workers are spawned after this and read their configuration from the environment
+    os.environ["CATALOG_SEGMENT_DIR"] = directory
+    if args.watch_interval > 0:
+        os.environ["CATALOG_WATCH_INTERVAL_SECONDS"] = str(args.watch_interval)
+    try:
+        uvicorn.run("app:app", host=args.host, port=args.port, workers=args.workers)
+    finally:
+        watcher.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,146 @@
+import time
+from collections.abc import Mapping
+
+import numpy as np
+
+from services.catalog_columns import ColumnarCatalog
+from services.catalog_payload import CatalogPayload
+from services.prompt_builder import PromptFragments
+from services.similarity_index import SimilarityIndex
+
+
+class CatalogSnapshot:
+    """
+    Immutable bundle of one catalog version and every structure derived from it
+
+    A snapshot is fully built before it is published and never modified
+    afterwards, so a request that picked up a snapshot keeps a consistent
+    view even if a reload swaps in a newer one halfway through.
+
+    Prompt short ids are stable across snapshots: a product keeps the code
+    it had in the previous snapshot and new products get fresh codes, so an
+    LLM answer for a prompt built before a reload still resolves to the
+    products it was shown.
+    """
+
+    def __init__(self, products, version, previous=None, binary=None):
+        """
+        Build the indexes, columns, similarity index, prompt fragments and payload for the products
+
+        binary is the BinaryCatalog the products were read from, if any; its
+        id order, facet codes, numeric columns, prompt rows and precomputed
+        similarity matrix are reused.
+        """
+        self.products = products
+        self.version = version
+        self.loaded_at = time.time()
+
+        # NumPy columns for vectorized filtering and scoring
+        self.columns = ColumnarCatalog(products, binary)
+        columns = self.columns
+
+        # Short codes: reuse the previous snapshot's codes, append new products after them
+        if previous is None:
+            self.short_codes = list(range(len(products)))
+            self.next_code = len(products)
+        else:
+            previous_codes = dict(zip(previous.columns.ids, previous.short_codes))
+            next_code = previous.next_code
+            codes = []
+            for product_id in columns.ids:
+                code = previous_codes.get(product_id)
+                if code is None:
+                    code, next_code = next_code, next_code + 1
+                codes.append(code)
+            self.short_codes = codes
+            self.next_code = next_code
+
+        if binary is not None and binary.id_order is not None:
+            # Products are decoded on access, so look them up through the snapshot's id index
+            self.products_by_id = ProductsById(products, columns.row_by_id)
+        else:
+            self.products_by_id = {product['id']: product for product in products}
+
+        # Inverted indexes over the dictionary-encoded columns: value -> its rows, in catalog order
+        self.category_index = _inverted_index(columns.category_vocab, columns.category_codes)
+        self.subcategory_index = _inverted_index(columns.subcategory_vocab, columns.subcategory_codes)
+        self.brand_index = _inverted_index(columns.brand_vocab, columns.brand_codes)
+        self.tag_index = _inverted_index(columns.tag_vocab, columns.tag_codes, columns.tag_rows)
+
+        # Rows sorted by price, with the sorted prices, so range queries are two binary searches
+        self.price_order = np.argsort(columns.price, kind="stable")
+        self.sorted_prices = columns.price[self.price_order]
+
+        # Hashed TF-IDF vectors over description, features and tags
+        self.similarity_index = SimilarityIndex(
+            products, matrix=binary.similarity_matrix if binary is not None else None
+        )
+
+        # Encoded prompt rows, so requests never re-render product text
+        stored = PromptFragments.from_binary(binary, self.short_codes) if binary is not None else None
+        self.prompt_fragments = stored or PromptFragments(products, self.short_codes)
+
+        # Serialized and compressed /api/products body with its ETag
+        self.catalog_payload = (CatalogPayload.from_binary(binary) if binary is not None else None) \
+            or CatalogPayload(products)
+        self.fingerprint = self.catalog_payload.fingerprint
+
+    def info(self):
+        """
+        Summary of the snapshot, for monitoring
+        """
+        return {
+            "version": self.version,
+            "products": len(self.products),
+            "fingerprint": self.fingerprint,
+            "loaded_at": self.loaded_at,
+        }
+
+
+class ProductsById(Mapping):
+    """
+    Read-only {product id: product} over a products sequence and an id -> row mapping
+    """
+
+    def __init__(self, products, row_by_id):
+        """
+        products[row_by_id[pid]] is the product with id pid
+        """
+        self._products = products
+        self._row_by_id = row_by_id
+
+    def __getitem__(self, product_id):
+        return self._products[self._row_by_id[product_id]]
+
+    def __contains__(self, product_id):
+        return product_id in self._row_by_id
+
+    def __iter__(self):
+        return iter(self._row_by_id)
+
+    def __len__(self):
+        return len(self._row_by_id)
+
+
+def _inverted_index(vocab, codes, rows=None):
+    """
+    {value: int64 array of the rows that have it}, each a slice of one array sorted by code
+
+    rows gives the row of every code for multi-valued columns (CSR entries);
+    a row is listed once per value even if the value repeats within it.
+    Built with plain sorts; np.unique is an order of magnitude slower on
+    catalog-sized columns.
+    """
+    if rows is None:
+        # A stable sort keeps each value's rows in catalog order
+        rows = np.argsort(codes, kind="stable")
+        codes = codes[rows]
+    elif len(codes):
+        # Sort by (code, row) and drop repeated pairs
+        keys = np.sort(codes.astype(np.int64) * len(codes) + rows)
+        keys = keys[np.concatenate(([True], keys[1:] != keys[:-1]))]
+        codes, rows = keys // len(codes), keys % len(codes)
+    else:
+        rows = rows.astype(np.int64)
+    bounds = np.searchsorted(codes, np.arange(len(vocab) + 1))
+    return {value: rows[bounds[code]:bounds[code + 1]] for value, code in vocab.items()}
@@ -0,0 +1,68 @@
+import os
+import threading
+
+
+class CatalogWatcher:
+    """
+    Background thread that reloads the catalog when DATA_PATH changes on disk
+
+    Polls the file's modification time and size rather than relying on
+    platform file-notification APIs, which keeps it dependency-free and
+    works on network filesystems. A failed reload is reported and retried
+    on the next change; the current catalog keeps serving meanwhile.
+    """
+
+    def __init__(self, product_service, interval):
+        """
+        Initialize the watcher; nothing runs until start()
+        """
+        self.product_service = product_service
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = None
+        self._signature = None
+
+    def start(self):
+        """
+        Start polling in a daemon thread
+        """
+        if self._thread is not None:
+            return
+        self._signature = self._stat()
+        self._thread = threading.Thread(target=self._run, name="catalog-watcher", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """
+        Stop polling and wait for the thread to exit
+        """
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.interval + 1)
+            self._thread = None
+
+    def _stat(self):
+        """
+        (mtime, size) of the data file, or None if it is missing
+        """
+        try:
+            stat = os.stat(self.product_service.source_path)
+        except OSError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def _run(self):
+        """
+        Poll loop: reload once per observed change
+        """
+        while not self._stop.wait(self.interval):
+            signature = self._stat()
+            if signature is None or signature == self._signature:
+                continue
+            self._signature = signature
+            try:
+                snapshot, changed = self.product_service.reload()
+                if changed:
+                    print(f"Catalog reloaded from {self.product_service.source_path}: version {snapshot.version}")
+            except Exception as e:
+                print(f"Catalog reload failed, keeping version {self.product_service.version}: {str(e)}")
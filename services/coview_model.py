@@ -0,0 +1,164 @@
+import hashlib
+import heapq
+import math
+import threading
+import time
+from collections import OrderedDict
+
+from config import config
+
+
+class CoViewModel:
+    """
+    Item-to-item "viewed together" model learned from browsing histories
+
+    Each request's browsing history contributes co-view pairs between its
+    newest item and the items viewed just before it (within WINDOW), so a
+    history that grows by one product per request adds only the new pairs.
+    Only product pairs are kept, never who viewed them, and exact repeats of
+    a recently seen history tail are ignored so a client resending the same
+    list does not inflate counts.
+
+    Counts decay exponentially with a half-life of COVIEW_HALF_LIFE_SECONDS,
+    lazily: instead of touching every entry, new increments are scaled up
+    by 2**(t / half_life) and reads divide by 2**(now / half_life). Stored
+    weights are renormalized in one pass only when that scale grows very
+    large.
+
+    Memory is bounded by top-k pruning: each product keeps at most
+    2 * COVIEW_NEIGHBOURS weighted neighbours (trimmed back to the strongest
+    COVIEW_NEIGHBOURS when exceeded), and at most COVIEW_MAX_ITEMS products
+    are tracked, least recently updated first out. A product's sorted
+    neighbour list is recomputed only after it changes, so neighbours() is
+    a dictionary lookup on the hot path.
+    """
+
+    WINDOW = 5
+    # Renormalize weights when the lazy-decay scale exceeds this
+    MAX_SCALE = 1e12
+
+    def __init__(self, max_items=None, neighbours=None, half_life=None, clock=time.monotonic):
+        """
+        Initialize an empty model with bounds from config unless given explicitly
+        """
+        self.max_items = max_items or config['COVIEW_MAX_ITEMS']
+        self.neighbours_kept = neighbours or config['COVIEW_NEIGHBOURS']
+        self.half_life = half_life or config['COVIEW_HALF_LIFE_SECONDS']
+        self._clock = clock
+        self._origin = clock()
+        self._scale_log2 = 0.0  # stored weights are relative to 2**_scale_log2 half-lives after origin
+
+        self._edges = OrderedDict()  # product id -> {neighbour id: scaled weight}, oldest update first
+        self._top = {}  # product id -> [(neighbour id, scaled weight)] best first, until the next update
+        self._recent = OrderedDict()  # digests of recently recorded history tails
+        self._lock = threading.Lock()
+        self.recorded = 0
+        self.duplicates = 0
+        self.pairs = 0
+
+    def record(self, browsing_history):
+        """
+        Learn from one request's browsing history (oldest first)
+        """
+        tail = list(dict.fromkeys(reversed(browsing_history)))[:self.WINDOW + 1]
+        if len(tail) < 2:
+            return
+        digest = hashlib.blake2b("\x1f".join(tail).encode("utf-8"), digest_size=8).digest()
+
+        with self._lock:
+            if digest in self._recent:
+                self._recent.move_to_end(digest)
+                self.duplicates += 1
+                return
+            self._recent[digest] = None
+            if len(self._recent) > self.max_items:
+                self._recent.popitem(last=False)
+
+            increment = self._increment()
+            newest = tail[0]
+            for position, other in enumerate(tail[1:], start=1):
+                # Items viewed right before the newest one count more
+                weight = increment / position
+                self._add(newest, other, weight)
+                self._add(other, newest, weight)
+                self.pairs += 1
+            self.recorded += 1
+
+    def neighbours(self, product_id, n=None):
+        """
+        Up to n (product_id, weight) of the products most viewed together with product_id, strongest first
+        """
+        n = n or self.neighbours_kept
+        with self._lock:
+            top = self._top.get(product_id)
+            if top is None:
+                edges = self._edges.get(product_id)
+                if not edges:
+                    return []
+                top = self._top[product_id] = heapq.nlargest(self.neighbours_kept, edges.items(), key=lambda e: e[1])
+            decay = 2.0 ** (self._scale_log2 - self._half_lives())
+        return [(other, weight * decay) for other, weight in top[:n]]
+
+    def scores(self, product_ids, n=None):
+        """
+        {product_id: summed co-view weight} of the neighbours of several products, excluding those products
+        """
+        seen = set(product_ids)
+        totals = {}
+        for product_id in seen:
+            for other, weight in self.neighbours(product_id, n):
+                if other not in seen:
+                    totals[other] = totals.get(other, 0.0) + weight
+        return totals
+
+    def stats(self):
+        """
+        Size and counters, for monitoring
+        """
+        with self._lock:
+            return {
+                "items": len(self._edges),
+                "edges": sum(len(edges) for edges in self._edges.values()),
+                "recorded_histories": self.recorded,
+                "ignored_duplicates": self.duplicates,
+                "pairs": self.pairs,
+            }
+
+    def _increment(self):
+        """
+        Scaled weight of one co-view now; renormalizes stored weights when the scale gets large (caller holds the lock)
+        """
+        exponent = self._half_lives()
+        if exponent - self._scale_log2 > math.log2(self.MAX_SCALE):
+            factor = 2.0 ** (self._scale_log2 - exponent)
+            for edges in self._edges.values():
+                for other in edges:
+                    edges[other] *= factor
+            self._top.clear()
+            self._scale_log2 = exponent
+        return 2.0 ** (exponent - self._scale_log2)
+
+    def _half_lives(self):
+        """
+        Half-lives elapsed since the model was created
+        """
+        return (self._clock() - self._origin) / self.half_life
+
+    def _add(self, product_id, other, weight):
+        """
+        Add weight to one directed edge, keeping the per-item and item-count bounds (caller holds the lock)
+        """
+        edges = self._edges.get(product_id)
+        if edges is None:
+            edges = self._edges[product_id] = {}
+            if len(self._edges) > self.max_items:
+                evicted, _ = self._edges.popitem(last=False)
+                self._top.pop(evicted, None)
+        else:
+            self._edges.move_to_end(product_id)
+        edges[other] = edges.get(other, 0.0) + weight
+        if len(edges) > 2 * self.neighbours_kept:
+            keep = heapq.nlargest(self.neighbours_kept, edges.items(), key=lambda e: e[1])
+            edges.clear()
+            edges.update(keep)
+        self._top.pop(product_id, None)
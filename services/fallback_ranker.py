@@ -0,0 +1,95 @@
+class FallbackRanker:
+    """
+    Local recommendation ranker used when the LLM is too slow or unavailable
+
+    Reuses the retrieval stage's scores to pick the top products and writes
+    a templated explanation from the signals that actually matched, so the
+    response has the same shape as an LLM answer without any upstream call.
+    """
+
+    def __init__(self, product_service, retrieval_service):
+        """
+        Initialize the ranker over the shared catalog and retrieval stage
+        """
+        self.product_service = product_service
+        self.retrieval_service = retrieval_service
+
+    def recommend(self, user_preferences, browsing_history, count=5, history=None):
+        """
+        Return the top products as a recommendation response dict, reusing a session's
+        SessionHistory when one is given
+
+        The result is never empty for a non-empty catalog: retrieval already
+        widens past the filters, and a history that covers every product
+        falls back to ranking the whole catalog.
+        """
+        catalog = self.product_service.snapshot
+        rows, scores = self.retrieval_service.rank(user_preferences, browsing_history, count, catalog, history)
+        if rows.size == 0:
+            # The history covers the whole catalog; the fallback must still answer, so rank everything
+            rows, scores = self.retrieval_service.rank({}, [], count, catalog)
+        products = catalog.products
+        if history is not None and history.catalog_version == catalog.version:
+            browsed_products = history.products
+        else:
+            browsed_products = self.product_service.get_products_by_ids(browsing_history)
+        max_score = sum(self.retrieval_service.WEIGHTS.values())
+        also_viewed = self._also_viewed(browsed_products)
+
+        recommendations = []
+        for row, score in zip(rows, scores):
+            product = products[row]
+            recommendations.append({
+                "product": product,
+                "explanation": self._explain(product, user_preferences, browsed_products, also_viewed),
+                "confidence_score": max(1, min(10, int(round(1 + 9 * float(score) / max_score))))
+            })
+
+        return {
+            "recommendations": recommendations,
+            "count": len(recommendations)
+        }
+
+    def _also_viewed(self, browsed_products):
+        """
+        Map each product shoppers viewed together with the history to the browsed product's name
+        """
+        coview = self.retrieval_service.coview
+        also_viewed = {}
+        if coview is not None:
+            for browsed in browsed_products:
+                for product_id, _ in coview.neighbours(browsed["id"]):
+                    also_viewed.setdefault(product_id, browsed["name"])
+        return also_viewed
+
+    @staticmethod
+    def _explain(product, user_preferences, browsed_products, also_viewed=None):
+        """
+        Build a short explanation from the preference and history signals the product matches
+        """
+        reasons = []
+        if also_viewed and product.get("id") in also_viewed:
+            reasons.append(f"shoppers who viewed {also_viewed[product['id']]} also viewed it")
+        if product.get("category") in (user_preferences.get("categories") or []):
+            reasons.append(f"it is in your preferred {product['category']} category")
+        if product.get("brand") in (user_preferences.get("brands") or []):
+            reasons.append(f"it is from {product['brand']}, one of your preferred brands")
+
+        if browsed_products:
+            same_category = [p for p in browsed_products if p.get("category") == product.get("category")]
+            same_brand = [p for p in browsed_products if p.get("brand") == product.get("brand")]
+            browsed_tags = {tag for p in browsed_products for tag in p.get("tags") or []}
+            shared_tags = [tag for tag in product.get("tags") or [] if tag in browsed_tags]
+            if same_category and product.get("category") not in (user_preferences.get("categories") or []):
+                reasons.append(f"you recently viewed {same_category[0]['name']} in {product['category']}")
+            if same_brand and product.get("brand") not in (user_preferences.get("brands") or []):
+                reasons.append(f"you have shown interest in {product['brand']}")
+            if shared_tags:
+                reasons.append("it shares features you browsed (" + ", ".join(shared_tags[:3]) + ")")
+
+        if not reasons and product.get("rating"):
+            reasons.append(f"it is highly rated ({product['rating']}/5) within your preferences")
+        if not reasons:
+            reasons.append("it matches your preferences")
+
+        return "Recommended because " + "; ".join(reasons) + "."
@@ -0,0 +1,91 @@
+import heapq
+import threading
+
+
+class SpaceSaving:
+    """
+    Bounded heavy-hitters sketch (Space-Saving, Metwally et al.)
+
+    Tracks at most `capacity` keys. A key that is not tracked replaces the
+    tracked key with the smallest count and inherits that count as its
+    error bound, so any key seen more than total/capacity times is
+    guaranteed to be tracked and counts overestimate by at most `error`.
+    The minimum is found through a min-heap with lazy deletion, making an
+    update O(log capacity).
+
+    Each tracked key can carry a payload (the latest one offered), which
+    lets callers act on the heavy hitters without a second lookup table.
+    decay() halves every count, so popularity follows recent traffic.
+    """
+
+    def __init__(self, capacity):
+        """
+        Initialize an empty sketch tracking up to capacity keys
+        """
+        self.capacity = capacity
+        self._counts = {}  # key -> [count, error, payload]
+        self._heap = []  # (count, key), possibly stale
+        self._lock = threading.Lock()
+        self.total = 0
+
+    def offer(self, key, payload=None, weight=1):
+        """
+        Count one occurrence of key
+        """
+        with self._lock:
+            self.total += weight
+            entry = self._counts.get(key)
+            if entry is not None:
+                entry[0] += weight
+                entry[2] = payload
+            elif len(self._counts) < self.capacity:
+                entry = self._counts[key] = [weight, 0, payload]
+            else:
+                floor = self._pop_min()
+                entry = self._counts[key] = [floor + weight, floor, payload]
+            heapq.heappush(self._heap, (entry[0], key))
+            if len(self._heap) > 4 * self.capacity:
+                self._rebuild_heap()
+
+    def top(self, n, min_count=1):
+        """
+        Up to n (key, count, error, payload) tuples, highest count first
+        """
+        with self._lock:
+            items = [(key, e[0], e[1], e[2]) for key, e in self._counts.items() if e[0] >= min_count]
+        return heapq.nlargest(n, items, key=lambda item: item[1])
+
+    def decay(self, factor=0.5):
+        """
+        Scale every count and error down, dropping keys that fall below one
+        """
+        with self._lock:
+            for key in list(self._counts):
+                entry = self._counts[key]
+                entry[0] = int(entry[0] * factor)
+                entry[1] = int(entry[1] * factor)
+                if entry[0] < 1:
+                    del self._counts[key]
+            self.total = int(self.total * factor)
+            self._rebuild_heap()
+
+    def __len__(self):
+        return len(self._counts)
+
+    def _pop_min(self):
+        """
+        Evict the tracked key with the smallest count and return that count (caller holds the lock)
+        """
+        while True:
+            count, key = heapq.heappop(self._heap)
+            entry = self._counts.get(key)
+            if entry is not None and entry[0] == count:
+                del self._counts[key]
+                return count
+
+    def _rebuild_heap(self):
+        """
+        Drop stale heap entries (caller holds the lock)
+        """
+        self._heap = [(entry[0], key) for key, entry in self._counts.items()]
+        heapq.heapify(self._heap)
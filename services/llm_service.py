@@ -1,143 +1,434 @@
-import openai
+import asyncio
+import httpx
 from config import config
 import json
+from services import metrics
+from services.batch_scheduler import BatchScheduler
+from services.persistent_cache import compact_recommendations, expand_recommendations
+from services.prompt_builder import PromptBuilder, estimate_tokens, short_id
+from services.recommendation_cache import canonical_request_key
+from services.request_coalescer import RequestCoalescer
+from services.response_parser import RecommendationParser
+from services.stream_parser import IncrementalJSONArrayParser
+
+SYSTEM_MESSAGE = "You are a helpful eCommerce product recommendation assistant."
+
+
+def _upstream_error_kind(error):
+    """
+    Short label for a failed upstream call, for the error counter
+    """
+    if isinstance(error, httpx.TimeoutException):
+        return "timeout"
+    if isinstance(error, httpx.HTTPStatusError):
+        return f"http_{error.response.status_code}"
+    if isinstance(error, httpx.TransportError):
+        return "transport"
+    return "other"
+
+
+def _count_usage(usage, messages, content):
+    """
+    Add one call's prompt and completion tokens to the counters, estimating
+    them from the text when the upstream did not report usage
+    """
+    usage = usage or {}
+    prompt_tokens = usage.get("prompt_tokens")
+    if prompt_tokens is None:
+        prompt_tokens = sum(estimate_tokens(m["content"]) for m in messages)
+    completion_tokens = usage.get("completion_tokens")
+    if completion_tokens is None:
+        completion_tokens = estimate_tokens(content)
+    metrics.PROMPT_TOKENS.inc(prompt_tokens)
+    metrics.COMPLETION_TOKENS.inc(completion_tokens)
+    metrics.annotate(prompt_tokens=prompt_tokens, completion_tokens=completion_tokens)
+
 
 class LLMService:
     """
     Service to handle interactions with the LLM API
     """
     
-    def __init__(self):
+    def __init__(self, product_service, retrieval_service, cache=None, fallback_ranker=None, store=None):
         """
-        Initialize the LLM service with configuration
+        Initialize the LLM service with configuration, the indexed product catalog,
+        the candidate retrieval stage, an optional recommendation cache, an
+        optional local ranker used when the LLM misses its latency budget and an
+        optional persistent store backing the cache across restarts
         """
-        openai.api_key = config['OPENAI_API_KEY']
+        self.product_service = product_service
+        self.retrieval_service = retrieval_service
+        self.cache = cache
+        self.store = store
+        # Optional PrecomputeScheduler that counts request profiles; set by the app
+        self.precomputer = None
+        self.fallback_ranker = fallback_ranker
+        self.deadline_seconds = config['RECOMMENDATION_DEADLINE_SECONDS']
+        self.coalescer = RequestCoalescer()
         self.model_name = config['MODEL_NAME']
         self.max_tokens = config['MAX_TOKENS']
         self.temperature = config['TEMPERATURE']
+        # Persisted results are only valid for the model settings that produced them
+        self._store_scope = f"{self.model_name}@{self.temperature!r}"
+        self.prompt_builder = PromptBuilder(product_service)
+        self.response_parser = RecommendationParser(product_service.get_product_by_id)
+
+        # Async client state is created lazily inside the running event loop
+        self._async_client = None
+        self._upstream_slots = None
+
+        # Optional micro-batching of concurrent requests into shared upstream calls
+        self.batcher = BatchScheduler(self) if config['BATCHING_ENABLED'] else None
     
-    def generate_recommendations(self, user_preferences, browsing_history, all_products):
+    async def arecommend(self, user_preferences, browsing_history, history=None):
         """
-        Generate personalized product recommendations based on user preferences and browsing history
+        Recommendations within a latency budget, tagged with the path that served them
+
+        Returns the cached result ("cache"), the LLM result if it arrives within
+        RECOMMENDATION_DEADLINE_SECONDS ("llm"), or otherwise the local fallback
+        ranker's result ("fallback", with the reason). An LLM call that misses
+        the deadline keeps running in the background and still fills the cache.
+        Upstream calls go through a pooled keep-alive HTTP client, are capped
+        at LLM_MAX_CONCURRENCY in flight, time out after LLM_TIMEOUT_SECONDS
+        and are shared by concurrent identical requests.
+        history is the session's SessionHistory when browsing_history came from
+        the session store; its resolved products and prompt rows are reused.
         """
-        # Match products from browsing history
-        browsed_products = []
-        for product_id in browsing_history:
-            for product in all_products:
-                if product["id"] == product_id:
-                    browsed_products.append(product)
-                    break
-        
-        # Filter products based on user price range
-        filtered_products = self._filter_by_price_range(all_products, user_preferences.get("priceRange", "all"))
+        cache_key, catalog_version, cached = await self._lookup_cache(user_preferences, browsing_history)
+        if cached is not None:
+            metrics.RECOMMENDATIONS.inc(source="cache")
+            metrics.annotate(source="cache")
+            return {**cached, "source": "cache"}
 
-        # Create a prompt for the LLM using only filtered products
-        prompt = self._create_recommendation_prompt(user_preferences, browsed_products, filtered_products)
+        task = asyncio.ensure_future(self.coalescer.run(
+            (cache_key, catalog_version),
+            lambda: self._agenerate_uncached(user_preferences, browsing_history, cache_key, catalog_version, history)
+        ))
+        try:
+            result = await asyncio.wait_for(asyncio.shield(task), timeout=self.deadline_seconds)
+            if result.get("recommendations") or self.fallback_ranker is None:
+                metrics.RECOMMENDATIONS.inc(source="llm")
+                metrics.annotate(source="llm")
+                return {**result, "source": "llm"}
+            reason = "empty_llm_response"
+        except asyncio.TimeoutError:
+            if self.fallback_ranker is None:
+                raise Exception("Failed to generate recommendations: LLM deadline exceeded")
+            # Let the late answer land in the cache; just make sure its outcome is observed
+            task.add_done_callback(lambda t: t.cancelled() or t.exception())
+            reason = "deadline_exceeded"
+        except Exception:
+            if self.fallback_ranker is None:
+                raise
+            reason = "llm_error"
+
+        with metrics.stage_timer("fallback"):
+            fallback = self.fallback_ranker.recommend(user_preferences, browsing_history, history=history)
+        metrics.RECOMMENDATIONS.inc(source="fallback")
+        metrics.annotate(source="fallback", fallback_reason=reason)
+        return {**fallback, "source": "fallback", "fallback_reason": reason}
+    
+    async def _agenerate_uncached(self, user_preferences, browsing_history, cache_key, catalog_version, history=None):
+        """
+        Build the prompt, call the LLM and cache the parsed result
+        """
+        history = self._current_history(history)
+        browsed_products, candidate_products = self._prepare_context(user_preferences, browsing_history, history)
+        if not candidate_products:
+            # The history covers the whole catalog: there is nothing to ask the LLM about
+            return {"recommendations": [], "count": 0, "error": "No candidate products to recommend"}
 
-        # Call the LLM API
         try:
-            response = openai.ChatCompletion.create(
-                model=self.model_name,
-                messages=[
-                    {"role": "system", "content": "You are a helpful eCommerce product recommendation assistant."},
-                    {"role": "user", "content": prompt}
-                ],
-                max_tokens=self.max_tokens,
-                temperature=self.temperature
-            )
-            
-            # Parse the LLM response to extract recommendations
-            recommendations = self._parse_recommendation_response(response.choices[0].message.content, all_products)
+            if self.batcher is not None:
+                with metrics.stage_timer("llm"):
+                    content, offered = await self.batcher.submit(user_preferences, browsed_products, candidate_products)
+            else:
+                prompt, offered = self._create_recommendation_prompt(user_preferences, browsed_products, candidate_products, history)
+                with metrics.stage_timer("llm"):
+                    content = await self._acomplete(self._messages(prompt))
+            recommendations = self._parse_recommendation_response(content, self._candidate_resolver(offered))
+            self._store_cache(cache_key, catalog_version, recommendations)
             return recommendations
-            
+
         except Exception as e:
-            print(f"Error calling LLM API: {str(e)}")
-            raise Exception(f"Failed to generate recommendations: {str(e)}")
+            print(f"Error calling LLM API: {str(e) or type(e).__name__}")
+            raise Exception(f"Failed to generate recommendations: {str(e) or type(e).__name__}")
     
-    def _filter_by_price_range(self, products, price_range):
+    async def precompute(self, user_preferences, browsing_history, cache_key, catalog_version):
         """
-        Filters products by a given price range string (e.g. "50-150")
+        Compute and cache a result ahead of demand, sharing the call with any identical live request
+        """
+        return await self.coalescer.run(
+            (cache_key, catalog_version),
+            lambda: self._agenerate_uncached(user_preferences, browsing_history, cache_key, catalog_version)
+        )
+    
+    async def astream_recommendations(self, user_preferences, browsing_history, history=None):
         """
-        if price_range == "all":
-            return products
+        Yield enriched recommendations one by one as the LLM streams them
+
+        Uses the upstream streaming mode and an incremental JSON-array parser,
+        so the first recommendation is available as soon as its object closes
+        instead of after the whole completion. The complete result is cached
+        like a non-streamed one, and a cache hit is replayed immediately.
+        """
+        cache_key, catalog_version, cached = await self._lookup_cache(user_preferences, browsing_history)
+        if cached is not None:
+            for recommendation in cached["recommendations"]:
+                yield recommendation
+            return
+
+        history = self._current_history(history)
+        browsed_products, candidate_products = self._prepare_context(user_preferences, browsing_history, history)
+        if not candidate_products:
+            return
+        prompt, packed = self._create_recommendation_prompt(user_preferences, browsed_products, candidate_products, history)
+        resolve_product = self._candidate_resolver(packed)
+
+        parser = IncrementalJSONArrayParser()
+        recommendations = []
+        seen = set()
         try:
-            low, high = map(float, price_range.split("-"))
-            return [p for p in products if low <= p.get("price", 0) <= high]
+            async for delta in self._astream_complete(self._messages(prompt)):
+                for item in parser.feed(delta):
+                    recommendation = self.response_parser.enrich(item, resolve_product)
+                    if recommendation is not None and recommendation["product"]["id"] not in seen:
+                        seen.add(recommendation["product"]["id"])
+                        recommendations.append(recommendation)
+                        yield recommendation
+                if parser.finished:
+                    break
         except Exception as e:
-            print(f"⚠️ Failed to parse price range '{price_range}':", e)
-            return products  # Fallback to unfiltered if invalid
-
-    def _create_recommendation_prompt(self, user_preferences, browsed_products, filtered_products):
-        candidate_products = filtered_products[:20]  # Limit for token usage
+            print(f"Error streaming from LLM API: {str(e) or type(e).__name__}")
+            raise Exception(f"Failed to generate recommendations: {str(e) or type(e).__name__}")
 
-        prompt = """
-You are an intelligent eCommerce recommendation engine.
+        if not recommendations:
+            metrics.PARSE_FAILURES.inc()
+        self._store_cache(cache_key, catalog_version, {
+            "recommendations": recommendations,
+            "count": len(recommendations)
+        })
+    
+    async def _astream_complete(self, messages):
+        """
+        Send a streaming chat completion request and yield the content deltas
 
-Given the user's preferences and their browsing history, your job is to recommend exactly 5 products from the candidate list below.
+        The "llm" stage is the wall time until the last delta, which includes
+        the time the consumer spends between deltas.
+        """
+        client = self._get_async_client()
+        metrics.UPSTREAM_CALLS.inc(mode="stream")
+        deltas = []
+        try:
+            with metrics.stage_timer("llm"):
+                async with self._upstream_slots:
+                    async with client.stream("POST", "/chat/completions", json={
+                        "model": self.model_name,
+                        "messages": messages,
+                        "max_tokens": self.max_tokens,
+                        "temperature": self.temperature,
+                        "stream": True,
+                    }) as response:
+                        response.raise_for_status()
+                        async for line in response.aiter_lines():
+                            if not line.startswith("data:"):
+                                continue
+                            data = line[5:].strip()
+                            if data == "[DONE]":
+                                break
+                            choices = json.loads(data).get("choices") or [{}]
+                            content = (choices[0].get("delta") or {}).get("content")
+                            if content:
+                                deltas.append(content)
+                                yield content
+        except Exception as e:
+            metrics.UPSTREAM_ERRORS.inc(kind=_upstream_error_kind(e))
+            raise
+        _count_usage(None, messages, "".join(deltas))
+    
+    async def aclose(self):
+        """
+        Close the pooled async HTTP client
+        """
+        if self._async_client is not None:
+            await self._async_client.aclose()
+            self._async_client = None
+    
+    def _get_async_client(self):
+        """
+        Return the shared async HTTP client, creating it on first use
+        """
+        if self._async_client is None:
+            self._async_client = httpx.AsyncClient(
+                base_url=config['OPENAI_API_BASE'],
+                headers={"Authorization": f"Bearer {config['OPENAI_API_KEY']}"},
+                limits=httpx.Limits(
+                    max_connections=config['LLM_MAX_CONCURRENCY'],
+                    max_keepalive_connections=config['LLM_MAX_CONCURRENCY'],
+                ),
+                timeout=httpx.Timeout(config['LLM_TIMEOUT_SECONDS'], connect=5.0),
+            )
+            self._upstream_slots = asyncio.Semaphore(config['LLM_MAX_CONCURRENCY'])
+        return self._async_client
+    
+    async def _acomplete(self, messages, max_tokens=None):
+        """
+        Send one chat completion request and return the message content
+        """
+        client = self._get_async_client()
+        metrics.UPSTREAM_CALLS.inc(mode="async")
+        try:
+            async with self._upstream_slots:
+                response = await client.post("/chat/completions", json={
+                    "model": self.model_name,
+                    "messages": messages,
+                    "max_tokens": max_tokens or self.max_tokens,
+                    "temperature": self.temperature,
+                })
+            response.raise_for_status()
+        except Exception as e:
+            metrics.UPSTREAM_ERRORS.inc(kind=_upstream_error_kind(e))
+            raise
+        body = response.json()
+        content = body["choices"][0]["message"]["content"]
+        _count_usage(body.get("usage"), messages, content)
+        return content
+    
+    def warm_cache(self, limit):
+        """
+        Load up to limit of the most hit persisted results for the current catalog into the
+        in-memory cache; returns how many were loaded
+        """
+        if self.cache is None or self.store is None:
+            return 0
+        catalog = self.product_service.snapshot
+        loaded = 0
+        for cache_key, items in self.store.warm(self._store_fingerprint(catalog), limit):
+            recommendations = expand_recommendations(items, catalog.products_by_id)
+            if recommendations is not None:
+                self.cache.put(cache_key, catalog.version, recommendations)
+                loaded += 1
+        return loaded
+    
+    def _store_fingerprint(self, catalog):
+        """
+        Persistent store fingerprint: the catalog content hash scoped to the model settings
+        """
+        return f"{catalog.fingerprint}:{self._store_scope}"
+    
+    async def _lookup_cache(self, user_preferences, browsing_history):
+        """
+        Return (cache_key, catalog_version, cached_value); cached_value is None on a miss
+        or when caching is off
 
-Respond ONLY in a valid JSON array. Each recommendation must include:
-- "product_id": string
-- "explanation": string
-- "score": number (confidence score from 1 to 10)
+        A miss in memory falls through to the persistent store, whose entries
+        are keyed by catalog fingerprint and model settings and so survive
+        restarts; its SQLite read runs in the default executor, off the event
+        loop. A stored hit is promoted into memory.
+        """
+        cache_key = canonical_request_key(user_preferences, browsing_history)
+        catalog = self.product_service.snapshot
+        catalog_version = catalog.version
+        if self.precomputer is not None:
+            self.precomputer.record(cache_key, user_preferences, browsing_history)
+        if self.cache is None:
+            return cache_key, catalog_version, None
+        with metrics.stage_timer("cache"):
+            cached = self.cache.get(cache_key, catalog_version)
+            result = "hit"
+            if cached is not None and self.store is not None:
+                self.store.touch(cache_key, self._store_fingerprint(catalog))
+            elif cached is None and self.store is not None:
+                items = await asyncio.get_running_loop().run_in_executor(
+                    None, self.store.get, cache_key, self._store_fingerprint(catalog)
+                )
+                cached = expand_recommendations(items, catalog.products_by_id) if items is not None else None
+                if cached is not None:
+                    self.cache.put(cache_key, catalog_version, cached)
+                    result = "store_hit"
+        metrics.CACHE_LOOKUPS.inc(result="miss" if cached is None else result)
+        return cache_key, catalog_version, cached
+    
+    def _store_cache(self, cache_key, catalog_version, recommendations):
+        """
+        Cache a non-empty recommendation result, and queue it for the persistent store
+        """
+        if self.cache is not None and recommendations.get("recommendations"):
+            self.cache.put(cache_key, catalog_version, recommendations)
+            catalog = self.product_service.snapshot
+            # The fingerprint must belong to the catalog the result was computed on
+            if self.store is not None and catalog.version == catalog_version:
+                self.store.put(cache_key, self._store_fingerprint(catalog), compact_recommendations(recommendations))
+    
+    def _current_history(self, history):
+        """
+        A session's SessionHistory if it was built for the catalog being served, else None
+        """
+        if history is not None and history.catalog_version != self.product_service.version:
+            return None
+        return history
 
-DO NOT include any extra text before or after the JSON.
+    def _prepare_context(self, user_preferences, browsing_history, history=None):
+        """
+        Resolve the browsing history and retrieve the candidate products for the prompt
+        """
+        # Match products from browsing history through the id index, unless the session already has them
+        with metrics.stage_timer("history"):
+            if history is not None:
+                browsed_products = list(history.products)
+            else:
+                browsed_products = self.product_service.get_products_by_ids(browsing_history)
+        
+        # Score the filtered catalog against the user and keep only the top-K candidates
+        with metrics.stage_timer("retrieval"):
+            candidate_products = self.retrieval_service.retrieve(user_preferences, browsing_history, history=history)
+        return browsed_products, candidate_products
 
-User Preferences:
-""" + json.dumps(user_preferences, indent=2)
+    @staticmethod
+    def _messages(prompt):
+        """
+        Wrap a prompt in the chat message list sent upstream
+        """
+        return [
+            {"role": "system", "content": SYSTEM_MESSAGE},
+            {"role": "user", "content": prompt}
+        ]
 
-        prompt += "\n\nBrowsing History:\n"
-        for p in browsed_products:
-            prompt += f"- {p['name']} ({p['category']}, ${p['price']}, Brand: {p['brand']})\n"
+    def _create_recommendation_prompt(self, user_preferences, browsed_products, candidate_products, history=None):
+        """
+        Build the compact, token-budgeted prompt from precomputed product fragments and
+        return (prompt, packed_candidates)
+        """
+        history_rows = history.prompt_rows if history is not None else None
+        with metrics.stage_timer("prompt"):
+            prompt, packed = self.prompt_builder.build(user_preferences, browsed_products, candidate_products, history_rows)
+        metrics.annotate(prompt_chars=len(prompt), prompt_candidates=len(packed))
+        return prompt, packed
 
-        prompt += "\nCandidate Products:\n"
-        for p in candidate_products:
-            prompt += f"- ID: {p['id']}, Name: {p['name']}, Category: {p['category']}, Price: ${p['price']}, Brand: {p['brand']}\n"
+    def _candidate_resolver(self, candidate_products):
+        """
+        Product resolver for the answer to one prompt
 
-        prompt += "\nREMEMBER: Choose only from the above product list and follow the JSON format exactly.\n"
+        Exact product ids are tried first; a short id is accepted only if it
+        belongs to one of the candidates that prompt listed, so an id that
+        happens to parse as base-36 never resolves to an unrelated product.
+        """
+        catalog = self.product_service.snapshot
+        codes = catalog.prompt_fragments.codes
+        products = catalog.products
+        by_short_id = {short_id(codes[row]): products[row] for row in self.prompt_builder.rows_for(candidate_products, catalog)}
+        products_by_id = catalog.products_by_id
 
-        return prompt
+        def resolve(product_id):
+            return products_by_id.get(product_id) or by_short_id.get(product_id)
+        return resolve
 
-    def _parse_recommendation_response(self, llm_response, all_products):
+    def _parse_recommendation_response(self, llm_response, resolve_product=None):
         """
         Parse the LLM response to extract product recommendations
         """
-        try:
-            print("\n== RAW LLM RESPONSE ==\n", llm_response)  # Debugging output
-
-            # Try to extract JSON block
-            start_idx = llm_response.find('[')
-            end_idx = llm_response.rfind(']') + 1
-
-            if start_idx == -1 or end_idx == 0:
-                return {
-                    "recommendations": [],
-                    "error": "Could not find JSON array in LLM response"
-                }
-
-            json_str = llm_response[start_idx:end_idx]
-            rec_data = json.loads(json_str)
-
-            # Enrich product info
-            recommendations = []
-            for rec in rec_data:
-                product_id = rec.get('product_id')
-                product_details = next((p for p in all_products if p['id'] == product_id), None)
-
-                if product_details:
-                    recommendations.append({
-                        "product": product_details,
-                        "explanation": rec.get('explanation', ''),
-                        "confidence_score": rec.get('score', 5)
-                    })
-
-            return {
-                "recommendations": recommendations,
-                "count": len(recommendations)
-            }
-
-        except Exception as e:
-            print("Parsing failed:", str(e))
-            return {
-                "recommendations": [],
-                "error": str(e)
-            }
+        with metrics.stage_timer("parse"):
+            recommendations = self.response_parser.parse(llm_response, resolve_product)
+        if not recommendations["recommendations"]:
+            metrics.PARSE_FAILURES.inc()
+        return recommendations
@@ -0,0 +1,339 @@
+import threading
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+
+# Latency buckets in seconds, from sub-millisecond local stages to slow LLM calls
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# Per-request {stage: seconds}, set by the HTTP layer so stage timers can report into it
+request_stages = ContextVar("request_stages", default=None)
+# Per-request annotations such as prompt size and token counts, for the slow-request log
+request_details = ContextVar("request_details", default=None)
+
+
+def _escape(value):
+    """
+    Escape a label value for the Prometheus text format
+    """
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names, values, extra=()):
+    """
+    Render {name="value",...} for a sample line, or "" without labels
+    """
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)] + list(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value):
+    """
+    Render a sample value the way Prometheus expects
+    """
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    """
+    Common parts of a metric family: name, help text, label names and children per label values
+    """
+
+    kind = "untyped"
+
+    def __init__(self, name, help, labelnames=(), registry=None):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._children = {}
+        self._lock = threading.Lock()
+        (registry if registry is not None else REGISTRY).register(self)
+
+    def labels(self, *values, **labels):
+        """
+        The child for the given label values; cache it on hot paths to skip the lookup
+        """
+        key = values or tuple(map(labels.__getitem__, self.labelnames))
+        child = self._children.get(key)
+        if child is None:
+            with self._lock:
+                child = self._children.setdefault(key, self._new_child())
+        return child
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def render(self):
+        """
+        Prometheus text exposition lines for this family
+        """
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        for values, child in sorted(self._children.items()):
+            lines.extend(child.samples(self.name, self.labelnames, values))
+        return lines
+
+
+class _CounterChild:
+    __slots__ = ("value", "_lock")
+
+    def __init__(self):
+        self.value = 0
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1):
+        with self._lock:
+            self.value += amount
+
+    def samples(self, name, labelnames, values):
+        return [f"{name}_total{_format_labels(labelnames, values)} {_format_value(self.value)}"]
+
+
+class Counter(_Metric):
+    """
+    Monotonically increasing count; exposed with the conventional _total suffix
+    """
+
+    kind = "counter"
+
+    def _new_child(self):
+        return _CounterChild()
+
+    def inc(self, amount=1, **labels):
+        """
+        Increment the child for the given labels
+        """
+        self.labels(**labels).inc(amount)
+
+
+class _GaugeChild:
+    __slots__ = ("value", "function")
+
+    def __init__(self):
+        self.value = 0
+        self.function = None
+
+    def set(self, value):
+        self.value = value
+
+    def set_function(self, function):
+        self.function = function
+
+    def samples(self, name, labelnames, values):
+        value = self.function() if self.function is not None else self.value
+        return [f"{name}{_format_labels(labelnames, values)} {_format_value(value)}"]
+
+
+class Gauge(_Metric):
+    """
+    Value that can go up and down, either set directly or read from a callback at scrape time
+    """
+
+    kind = "gauge"
+
+    def _new_child(self):
+        return _GaugeChild()
+
+    def set(self, value, **labels):
+        """
+        Set the child for the given labels
+        """
+        self.labels(**labels).set(value)
+
+    def set_function(self, function, **labels):
+        """
+        Read the value from function() whenever metrics are rendered
+        """
+        self.labels(**labels).set_function(function)
+
+
+class _HistogramChild:
+    __slots__ = ("buckets", "counts", "sum", "count", "_lock")
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += value
+            self.count += 1
+
+    def time(self):
+        return StageTimer(self)
+
+    def samples(self, name, labelnames, values):
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets + (float("inf"),), self.counts):
+            cumulative += count
+            le = _format_labels(labelnames, values, (f'le="{_format_value(float(bound))}"',))
+            lines.append(f"{name}_bucket{le} {cumulative}")
+        labels = _format_labels(labelnames, values)
+        lines.append(f"{name}_sum{labels} {_format_value(self.sum)}")
+        lines.append(f"{name}_count{labels} {self.count}")
+        return lines
+
+
+class Histogram(_Metric):
+    """
+    Distribution of observed values over fixed cumulative buckets
+    """
+
+    kind = "histogram"
+
+    def __init__(self, name, help, labelnames=(), buckets=DEFAULT_BUCKETS, registry=None):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, help, labelnames, registry)
+
+    def _new_child(self):
+        return _HistogramChild(self.buckets)
+
+    def observe(self, value, **labels):
+        """
+        Record one value for the given labels
+        """
+        self.labels(**labels).observe(value)
+
+
+class StageTimer:
+    """
+    Context manager timing a block into a histogram child
+
+    When a stage name is given the elapsed time is also added to the
+    current request's stage breakdown (see request_stages), which feeds the
+    Server-Timing header and the slow-request log.
+    """
+
+    __slots__ = ("child", "stage", "start")
+
+    def __init__(self, child, stage=None):
+        self.child = child
+        self.stage = stage
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        elapsed = time.perf_counter() - self.start
+        self.child.observe(elapsed)
+        if self.stage is not None:
+            stages = request_stages.get()
+            if stages is not None:
+                stages[self.stage] = stages.get(self.stage, 0.0) + elapsed
+        return False
+
+
+class Registry:
+    """
+    Collection of metric families rendered together for /metrics
+    """
+
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric):
+        """
+        Add a metric family
+        """
+        self._metrics.append(metric)
+
+    def render(self):
+        """
+        The whole registry in the Prometheus text exposition format (version 0.0.4)
+        """
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+# Recommendation pipeline metrics
+STAGE_SECONDS = Histogram(
+    "recommendation_stage_seconds",
+    "Time spent in each stage of a recommendation request",
+    ["stage"],
+)
+RECOMMENDATIONS = Counter(
+    "recommendation_responses",
+    "Recommendation responses by the path that served them",
+    ["source"],
+)
+CACHE_LOOKUPS = Counter(
+    "recommendation_cache_lookups",
+    "Recommendation cache lookups by result (hit, store_hit from the persistent store, miss)",
+    ["result"],
+)
+PROMPT_TOKENS = Counter(
+    "llm_prompt_tokens",
+    "Prompt tokens sent upstream (reported by the API, estimated when it does not report usage)",
+)
+COMPLETION_TOKENS = Counter(
+    "llm_completion_tokens",
+    "Completion tokens received from upstream (reported by the API, estimated when it does not report usage)",
+)
+UPSTREAM_CALLS = Counter(
+    "llm_upstream_calls",
+    "Chat completion calls sent upstream by mode",
+    ["mode"],
+)
+UPSTREAM_ERRORS = Counter(
+    "llm_upstream_errors",
+    "Failed upstream calls by kind (timeout, transport, http_<status>, other)",
+    ["kind"],
+)
+PARSE_FAILURES = Counter(
+    "llm_parse_failures",
+    "LLM responses that yielded no usable recommendation",
+)
+PRECOMPUTES = Counter(
+    "recommendation_precomputes",
+    "Background recomputations of popular profiles by result",
+    ["result"],
+)
+CATALOG_VERSION = Gauge(
+    "catalog_version",
+    "Version of the catalog snapshot being served",
+)
+CACHE_ENTRIES = Gauge(
+    "recommendation_cache_entries",
+    "Entries held by the recommendation cache",
+)
+CACHE_BYTES = Gauge(
+    "recommendation_cache_bytes",
+    "Estimated size of the recommendation cache",
+)
+SESSIONS = Gauge(
+    "browsing_sessions",
+    "Browsing history sessions held by the session store",
+)
+HTTP_REQUEST_SECONDS = Histogram(
+    "http_request_duration_seconds",
+    "HTTP request latency by route, method and status",
+    ["route", "method", "status"],
+)
+
+
+def annotate(**values):
+    """
+    Attach values to the current request's details, if the HTTP layer is collecting them
+    """
+    details = request_details.get()
+    if details is not None:
+        details.update(values)
+
+
+def stage_timer(stage):
+    """
+    Time a recommendation stage: with stage_timer("retrieval"): ...
+    """
+    return StageTimer(STAGE_SECONDS.labels(stage), stage)
@@ -0,0 +1,324 @@
+import json
+import os
+import queue
+import sqlite3
+import threading
+import time
+
+from config import config
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS recommendations (
+    key TEXT NOT NULL,
+    fingerprint TEXT NOT NULL,
+    value TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    created_at REAL NOT NULL,
+    last_hit REAL NOT NULL,
+    hits INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (key, fingerprint)
+) WITHOUT ROWID;
+DROP INDEX IF EXISTS recommendations_last_hit;
+CREATE INDEX IF NOT EXISTS recommendations_last_hit_size ON recommendations (last_hit, size);
+"""
+
+# Sentinel telling the writer thread to flush and exit
+_STOP = object()
+# Seconds between passes that delete expired entries
+_EXPIRY_INTERVAL = 60.0
+
+
+def compact_recommendations(recommendations):
+    """
+    Storable form of a recommendation result: product ids with explanation and score
+
+    Products are not stored; they are looked up again in the catalog with
+    the same fingerprint when the entry is read.
+    """
+    return [
+        [r["product"]["id"], r["explanation"], r["confidence_score"]]
+        for r in recommendations["recommendations"]
+    ]
+
+
+def expand_recommendations(items, products_by_id):
+    """
+    Rebuild a recommendation result from its stored form, or None if a product is missing
+    """
+    recommendations = []
+    for product_id, explanation, score in items:
+        product = products_by_id.get(product_id)
+        if product is None:
+            return None
+        recommendations.append({"product": product, "explanation": explanation, "confidence_score": score})
+    return {"recommendations": recommendations, "count": len(recommendations)}
+
+
+class PersistentRecommendationStore:
+    """
+    SQLite second-tier recommendation cache that survives restarts
+
+    Entries are keyed by canonical request hash and a fingerprint naming
+    the catalog content (unlike the in-process version number, the same
+    catalog after a restart) and the model settings. Reads are primary-key
+    lookups on a dedicated connection; the database runs in WAL mode so
+    they never wait for the writer. Writes and hit bookkeeping are queued to
+    a background thread that commits them in batches, so request handlers
+    never block on disk writes; hits are tallied in memory and written as
+    one update per entry per batch rather than one per hit. The writer
+    expires entries older than the TTL once a minute. After each batch of
+    puts it sums the stored value bytes inside the same transaction, so
+    several workers sharing the file see each other's writes, and while
+    that exceeds max_bytes it evicts the least recently hit entries and
+    returns the freed pages to the filesystem. The (last_hit, size) index
+    covers both the sum and the eviction scan. The file itself is somewhat
+    larger than the total because of keys, indexes and page overhead.
+
+    warm() returns the most frequently hit entries for a fingerprint, for
+    loading into the in-memory cache at boot.
+    """
+
+    def __init__(self, path=None, max_bytes=None, ttl_seconds=None, flush_interval=None, batch_size=None):
+        """
+        Open (or create) the database and start the writer thread
+        """
+        self.path = path or config['PERSISTENT_CACHE_PATH']
+        self.max_bytes = max_bytes or config['PERSISTENT_CACHE_MAX_BYTES']
+        self.ttl_seconds = ttl_seconds or config['PERSISTENT_CACHE_TTL_SECONDS']
+        self.flush_interval = (flush_interval or config['PERSISTENT_CACHE_FLUSH_MS']) / 1000.0
+        self.batch_size = batch_size or config['PERSISTENT_CACHE_BATCH_SIZE']
+
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        writer = self._connect()
+        # auto_vacuum only takes effect on a new database, before the first table exists
+        writer.execute("PRAGMA auto_vacuum=INCREMENTAL")
+        writer.execute("PRAGMA journal_mode=WAL")
+        writer.executescript(_SCHEMA)
+        writer.commit()
+
+        self._reader = self._connect()
+        self._reader_lock = threading.Lock()
+        self._queue = queue.Queue()
+        # (key, fingerprint) -> (hit count, last hit time) not yet handed to the writer
+        self._pending_hits = {}
+        self._hits_lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.writes = 0
+        self.commits = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.write_errors = 0
+        self._last_expiry = 0.0
+        self._thread = threading.Thread(target=self._run, args=(writer,), name="recommendation-store", daemon=True)
+        self._thread.start()
+
+    def _connect(self):
+        """
+        A connection usable from any thread, waiting on locks held by other processes
+        """
+        connection = sqlite3.connect(self.path, timeout=5.0, check_same_thread=False, isolation_level=None)
+        connection.execute("PRAGMA synchronous=NORMAL")
+        return connection
+
+    def get(self, key, fingerprint):
+        """
+        The stored value for key under the catalog fingerprint, or None
+        """
+        with self._reader_lock:
+            row = self._reader.execute(
+                "SELECT value, created_at FROM recommendations WHERE key = ? AND fingerprint = ?",
+                (key, fingerprint),
+            ).fetchone()
+        if row is None or row[1] + self.ttl_seconds <= time.time():
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.touch(key, fingerprint)
+        return json.loads(row[0])
+
+    def touch(self, key, fingerprint):
+        """
+        Count a hit for an entry served from a faster tier, so warm() and eviction see its popularity
+
+        Hits are tallied here and the writer takes the whole tally with its
+        next batch; only the first hit after that queues a marker for it.
+        """
+        entry = (key, fingerprint)
+        with self._hits_lock:
+            first = not self._pending_hits
+            count, _ = self._pending_hits.get(entry, (0, 0.0))
+            self._pending_hits[entry] = (count + 1, time.time())
+        if first:
+            self._queue.put(("hits",))
+
+    def put(self, key, fingerprint, value):
+        """
+        Queue a value for storage; returns immediately
+        """
+        self._queue.put(("put", key, fingerprint, json.dumps(value, separators=(",", ":"))))
+
+    def warm(self, fingerprint, limit):
+        """
+        Up to limit (key, value) pairs for the fingerprint, most hit and most recent first
+        """
+        with self._reader_lock:
+            rows = self._reader.execute(
+                "SELECT key, value FROM recommendations WHERE fingerprint = ? AND created_at > ?"
+                " ORDER BY hits DESC, last_hit DESC LIMIT ?",
+                (fingerprint, time.time() - self.ttl_seconds, limit),
+            ).fetchall()
+        return [(key, json.loads(value)) for key, value in rows]
+
+    def flush(self, timeout=None):
+        """
+        Block until everything queued so far is committed
+        """
+        done = threading.Event()
+        self._queue.put(("flush", done))
+        return done.wait(timeout)
+
+    def close(self):
+        """
+        Commit pending writes and stop the writer thread
+        """
+        if self._thread is not None:
+            self._queue.put(_STOP)
+            self._thread.join()
+            self._thread = None
+            self._reader.close()
+
+    def stats(self):
+        """
+        Counters and on-disk occupancy, for monitoring
+        """
+        with self._reader_lock:
+            entries, stored = self._reader.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM recommendations"
+            ).fetchone()
+        lookups = self.hits + self.misses
+        return {
+            "path": self.path,
+            "entries": entries,
+            "bytes": stored,
+            "file_bytes": sum(os.path.getsize(p) for p in (self.path, self.path + "-wal") if os.path.exists(p)),
+            "pending_writes": self._queue.qsize(),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "writes": self.writes,
+            "commits": self.commits,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "write_errors": self.write_errors,
+        }
+
+    def _run(self, connection):
+        """
+        Writer loop: collect operations for up to flush_interval, then commit them together
+        """
+        stopping = False
+        while not stopping:
+            operation = self._queue.get()
+            batch = [operation]
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+
+            stopping = any(op is _STOP for op in batch)
+            waiters = [op[1] for op in batch if op is not _STOP and op[0] == "flush"]
+            try:
+                self._apply(connection, [op for op in batch if op is not _STOP and op[0] != "flush"])
+            except Exception as e:
+                # Anything escaping here would kill the writer and leave flush() callers waiting
+                self.write_errors += 1
+                print(f"Recommendation store write failed: {str(e)}")
+            for waiter in waiters:
+                waiter.set()
+        connection.close()
+
+    def _apply(self, connection, batch):
+        """
+        Write one batch in a single transaction, then enforce the TTL and size bound
+        """
+        if not batch:
+            return
+        now = time.time()
+        puts = [(op[1], op[2], op[3], len(op[3]), now, now) for op in batch if op[0] == "put"]
+        with self._hits_lock:
+            pending, self._pending_hits = self._pending_hits, {}
+        hits = [(count, at, key, fingerprint) for (key, fingerprint), (count, at) in pending.items()]
+
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            connection.executemany(
+                "INSERT INTO recommendations (key, fingerprint, value, size, created_at, last_hit, hits)"
+                " VALUES (?, ?, ?, ?, ?, ?, 0)"
+                " ON CONFLICT (key, fingerprint) DO UPDATE SET"
+                " value = excluded.value, size = excluded.size, created_at = excluded.created_at,"
+                " last_hit = excluded.last_hit",
+                puts,
+            )
+            connection.executemany(
+                "UPDATE recommendations SET hits = hits + ?, last_hit = ? WHERE key = ? AND fingerprint = ?",
+                hits,
+            )
+            freed = self._expire(connection, now)
+            if puts:
+                # Only puts grow the table, so batches of hits alone skip the size check
+                freed += self._evict(connection)
+            connection.execute("COMMIT")
+        except BaseException:
+            connection.execute("ROLLBACK")
+            raise
+        self.writes += len(puts)
+        self.commits += 1
+        if freed:
+            connection.execute("PRAGMA incremental_vacuum")
+
+    def _expire(self, connection, now):
+        """
+        Delete entries older than the TTL, at most once per expiry interval; returns the rows deleted
+        """
+        if now - self._last_expiry < _EXPIRY_INTERVAL:
+            return 0
+        self._last_expiry = now
+        cutoff = now - self.ttl_seconds
+        expired = connection.execute("DELETE FROM recommendations WHERE created_at <= ?", (cutoff,)).rowcount
+        self.expirations += expired
+        return expired
+
+    def _evict(self, connection):
+        """
+        Delete the least recently hit entries while the stored value bytes exceed max_bytes; returns the rows deleted
+
+        The total is read inside the caller's write transaction, so it
+        includes every other process's writes and cannot change before the
+        deletes commit.
+        """
+        (stored,) = connection.execute("SELECT COALESCE(SUM(size), 0) FROM recommendations").fetchone()
+        if stored <= self.max_bytes:
+            return 0
+
+        # Evict down to 90% so the next few writes do not trigger another pass
+        excess = stored - int(self.max_bytes * 0.9)
+        victims = []
+        for key, fingerprint, size in connection.execute(
+            "SELECT key, fingerprint, size FROM recommendations ORDER BY last_hit"
+        ):
+            victims.append((key, fingerprint))
+            excess -= size
+            if excess <= 0:
+                break
+        connection.executemany("DELETE FROM recommendations WHERE key = ? AND fingerprint = ?", victims)
+        self.evictions += len(victims)
+        return len(victims)
+
@@ -0,0 +1,172 @@
+import asyncio
+import time
+
+from config import config
+from services import metrics
+from services.heavy_hitters import SpaceSaving
+
+
+class PrecomputeScheduler:
+    """
+    Background refresh of the most requested recommendation profiles
+
+    Every request key is counted in a bounded Space-Saving sketch together
+    with the preferences and history that produced it. Every
+    PRECOMPUTE_INTERVAL_SECONDS the scheduler takes the top profiles and
+    recomputes those that are not in the cache for the current catalog
+    version (new, expired, or invalidated by a reload) or that expire within
+    PRECOMPUTE_REFRESH_MARGIN_SECONDS, so popular requests keep hitting the
+    in-memory cache instead of waiting on the LLM.
+
+    Upstream spend is capped by a token bucket of
+    PRECOMPUTE_CALLS_PER_MINUTE calls and PRECOMPUTE_CONCURRENCY calls in
+    flight; missing entries go before ones that are merely about to expire,
+    and more popular profiles before less popular ones. Counts are halved
+    every PRECOMPUTE_DECAY_SECONDS so the ranking follows current traffic.
+    """
+
+    def __init__(self, llm_service, tracked_keys=None, top_n=None, min_count=None, interval=None,
+                 refresh_margin=None, calls_per_minute=None, concurrency=None, decay_seconds=None):
+        """
+        Initialize the scheduler with limits from config unless given explicitly; nothing runs until start()
+        """
+        self.llm_service = llm_service
+        self.sketch = SpaceSaving(tracked_keys or config['PRECOMPUTE_TRACKED_KEYS'])
+        self.top_n = top_n or config['PRECOMPUTE_TOP_N']
+        self.min_count = min_count or config['PRECOMPUTE_MIN_COUNT']
+        self.interval = interval or config['PRECOMPUTE_INTERVAL_SECONDS']
+        self.refresh_margin = refresh_margin or config['PRECOMPUTE_REFRESH_MARGIN_SECONDS']
+        self.calls_per_minute = calls_per_minute or config['PRECOMPUTE_CALLS_PER_MINUTE']
+        self.concurrency = concurrency or config['PRECOMPUTE_CONCURRENCY']
+        self.decay_seconds = decay_seconds or config['PRECOMPUTE_DECAY_SECONDS']
+
+        self._budget = float(self.calls_per_minute)
+        self._budget_at = time.monotonic()
+        self._decayed_at = time.monotonic()
+        self._task = None
+        self.cycles = 0
+        self.refreshed = 0
+        self.failed = 0
+        self.deferred = 0
+
+    def record(self, cache_key, user_preferences, browsing_history):
+        """
+        Count one request for a profile
+        """
+        self.sketch.offer(cache_key, (user_preferences, browsing_history))
+
+    def start(self):
+        """
+        Start the refresh loop on the running event loop
+        """
+        if self._task is None:
+            self._task = asyncio.ensure_future(self._run())
+
+    async def stop(self):
+        """
+        Cancel the refresh loop
+        """
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def refresh(self):
+        """
+        Run one refresh cycle; returns the number of profiles recomputed
+        """
+        now = time.monotonic()
+        if now - self._decayed_at >= self.decay_seconds:
+            self.sketch.decay()
+            self._decayed_at = now
+        self._budget = min(
+            float(self.calls_per_minute),
+            self._budget + (now - self._budget_at) * self.calls_per_minute / 60.0,
+        )
+        self._budget_at = now
+        self.cycles += 1
+
+        due = self._due()
+        allowed = min(len(due), int(self._budget))
+        self.deferred += len(due) - allowed
+        if not allowed:
+            return 0
+        self._budget -= allowed
+
+        slots = asyncio.Semaphore(self.concurrency)
+
+        async def recompute(cache_key, user_preferences, browsing_history, catalog_version):
+            async with slots:
+                try:
+                    await self.llm_service.precompute(user_preferences, browsing_history, cache_key, catalog_version)
+                    self.refreshed += 1
+                    metrics.PRECOMPUTES.inc(result="refreshed")
+                except Exception:
+                    self.failed += 1
+                    metrics.PRECOMPUTES.inc(result="failed")
+
+        catalog_version = self.llm_service.product_service.version
+        await asyncio.gather(*(
+            recompute(cache_key, preferences, history, catalog_version)
+            for cache_key, preferences, history in due[:allowed]
+        ))
+        return allowed
+
+    def stats(self, top=20):
+        """
+        Counters, the remaining budget and the current top profiles, for monitoring
+        """
+        cache = self.llm_service.cache
+        version = self.llm_service.product_service.version
+        return {
+            "tracked_keys": len(self.sketch),
+            "observed_requests": self.sketch.total,
+            "cycles": self.cycles,
+            "refreshed": self.refreshed,
+            "failed": self.failed,
+            "deferred": self.deferred,
+            "budget_remaining": int(self._budget),
+            "top": [
+                {
+                    "key": key[:16],
+                    "count": count,
+                    "error": error,
+                    "preferences": payload[0],
+                    "history_length": len(payload[1]),
+                    "cache_ttl_seconds": cache.ttl_remaining(key, version) if cache is not None else None,
+                }
+                for key, count, error, payload in self.sketch.top(top)
+            ],
+        }
+
+    def _due(self):
+        """
+        (cache_key, preferences, history) of top profiles needing a refresh, most urgent first
+        """
+        cache = self.llm_service.cache
+        if cache is None:
+            return []
+        version = self.llm_service.product_service.version
+        missing = []
+        expiring = []
+        for key, _, _, (preferences, history) in self.sketch.top(self.top_n, self.min_count):
+            ttl = cache.ttl_remaining(key, version)
+            if ttl is None:
+                missing.append((key, preferences, history))
+            elif ttl < self.refresh_margin:
+                expiring.append((key, preferences, history))
+        return missing + expiring
+
+    async def _run(self):
+        """
+        Refresh loop
+        """
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.refresh()
+            except Exception as e:
+                print(f"Precompute cycle failed: {str(e)}")
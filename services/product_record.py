@@ -0,0 +1,113 @@
+import sys
+from collections.abc import Mapping
+
+# Schema fields, in the key order of the JSON catalog and the Product model
+FIELDS = ("id", "name", "category", "subcategory", "price", "brand",
+          "description", "features", "rating", "inventory", "tags")
+_FIELD_SET = frozenset(FIELDS)
+# Low-cardinality strings shared by many products
+_INTERNED_FIELDS = frozenset(("category", "subcategory", "brand"))
+_LIST_FIELDS = frozenset(("features", "tags"))
+
+
+def _intern(value):
+    """
+    Intern a string so every product holding it shares one object
+    """
+    return sys.intern(value) if type(value) is str else value
+
+
+class ProductRecord(Mapping):
+    """
+    Memory-compact, read-only product
+
+    Schema fields live in __slots__ instead of a per-product hash table,
+    categories, brands, features and tags are interned so repeated values
+    share one string, and list fields are stored as tuples. A field that was
+    absent from the source stays unset and costs nothing. Any key outside
+    the schema is kept in a small side dict.
+
+    Records behave like the product dicts they replace (product["id"],
+    product.get("tags") or [], in, iteration), and pydantic validates them
+    like dicts. to_dict() gives the exact JSON shape for direct json.dumps.
+    """
+
+    __slots__ = FIELDS + ("_extra",)
+
+    @classmethod
+    def from_dict(cls, data):
+        """
+        Build a record from a product dict
+        """
+        record = cls.__new__(cls)
+        extra = None
+        for key, value in data.items():
+            if key in _FIELD_SET:
+                if key in _INTERNED_FIELDS:
+                    value = _intern(value)
+                elif key in _LIST_FIELDS and isinstance(value, list):
+                    value = tuple(_intern(v) for v in value)
+                setattr(record, key, value)
+            else:
+                if extra is None:
+                    extra = {}
+                extra[key] = value
+        record._extra = extra
+        return record
+
+    def __getitem__(self, key):
+        if key in _FIELD_SET:
+            try:
+                return getattr(self, key)
+            except AttributeError:
+                raise KeyError(key) from None
+        if self._extra is not None and key in self._extra:
+            return self._extra[key]
+        raise KeyError(key)
+
+    def get(self, key, default=None):
+        if key in _FIELD_SET:
+            return getattr(self, key, default)
+        return self._extra.get(key, default) if self._extra is not None else default
+
+    def __contains__(self, key):
+        if key in _FIELD_SET:
+            return hasattr(self, key)
+        return self._extra is not None and key in self._extra
+
+    def __iter__(self):
+        for key in FIELDS:
+            if hasattr(self, key):
+                yield key
+        if self._extra is not None:
+            yield from self._extra
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+    def __repr__(self):
+        return f"ProductRecord({self.to_dict()!r})"
+
+    def to_dict(self):
+        """
+        Plain dict in the catalog's JSON shape, with list fields as lists
+        """
+        out = {}
+        for key in FIELDS:
+            try:
+                value = getattr(self, key)
+            except AttributeError:
+                continue
+            out[key] = list(value) if type(value) is tuple else value
+        if self._extra is not None:
+            out.update(self._extra)
+        return out
+
+
+def json_default(value):
+    """
+    json.dumps default hook that serializes product records as plain JSON objects
+    """
+    if isinstance(value, ProductRecord):
+        return value.to_dict()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
@@ -1,46 +1,272 @@
-import json
+import base64
+import threading
+from bisect import bisect_right
+import numpy as np
 from config import config
+from services.catalog_loader import load_catalog
+from services.catalog_segments import current_segment, pointer_path
+from services.catalog_snapshot import CatalogSnapshot
+
+
+def encode_cursor(product_id):
+    """
+    Opaque pagination cursor pointing just after the given product ID
+    """
+    return base64.urlsafe_b64encode(product_id.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor):
+    """
+    Product ID carried by a pagination cursor; raises ValueError if it is malformed
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        return base64.b64decode(padded, altchars=b"-_", validate=True).decode("utf-8")
+    except (ValueError, UnicodeDecodeError) as e:
+        raise ValueError(f"Invalid cursor '{cursor}'") from e
+
 
 class ProductService:
     """
     Service to handle product data operations
+
+    All data lives in an immutable CatalogSnapshot. reload() builds the next
+    snapshot off to the side and publishes it with a single attribute
+    assignment, so readers always see either the old or the new catalog in
+    full and never block on a reload.
     """
     
     def __init__(self):
         """
         Initialize the product service with data path from config
+
+        With CATALOG_SEGMENT_DIR set the catalog comes from the shared segment
+        published there (see services.catalog_segments) instead of DATA_PATH.
         """
         self.data_path = config['DATA_PATH']
-        self.products = self._load_products()
+        self.segment_dir = config['CATALOG_SEGMENT_DIR'] or None
+        self._reload_lock = threading.Lock()
+        self.reloads = 0
+        self.last_reload_error = None
+        products, binary = self._load_products()
+        self.snapshot = CatalogSnapshot(products, version=1, binary=binary)
+
+    @property
+    def version(self):
+        """
+        Monotonically increasing version of the current catalog snapshot
+        """
+        return self.snapshot.version
+
+    @property
+    def products(self):
+        """
+        Products of the current snapshot
+        """
+        return self.snapshot.products
+
+    @property
+    def columns(self):
+        """
+        NumPy columns of the current snapshot
+        """
+        return self.snapshot.columns
+
+    @property
+    def similarity_index(self):
+        """
+        Text similarity index of the current snapshot
+        """
+        return self.snapshot.similarity_index
+
+    @property
+    def prompt_fragments(self):
+        """
+        Encoded prompt rows of the current snapshot
+        """
+        return self.snapshot.prompt_fragments
+
+    @property
+    def catalog_payload(self):
+        """
+        Pre-serialized /api/products body of the current snapshot
+        """
+        return self.snapshot.catalog_payload
+    
+    @property
+    def source_path(self):
+        """
+        File whose changes should trigger a reload: the segment pointer or DATA_PATH
+        """
+        return pointer_path(self.segment_dir) if self.segment_dir else self.data_path
     
     def _load_products(self):
         """
-        Load products from the JSON data file
+        Load products from the data file and return (products, binary_catalog)
+
+        JSON and JSONL files are streamed product by product and ".pcat" binary
+        snapshots are memory-mapped (see services.catalog_loader). A catalog
+        that cannot be loaded is an error rather than an empty catalog.
         """
+        path = self.data_path
         try:
-            with open(self.data_path, 'r') as file:
-                return json.load(file)
-        except Exception as e:
-            print(f"Error loading product data: {str(e)}")
-            return []
+            if self.segment_dir:
+                path = current_segment(self.segment_dir)
+            return load_catalog(path)
+        except (OSError, ValueError) as e:
+            raise RuntimeError(f"Error loading product data from {path}: {str(e)}") from e
+    
+    def reload(self):
+        """
+        Rebuild the catalog from DATA_PATH (or the current segment) and publish it as a new snapshot
+
+        Returns (snapshot, changed). A file whose content is identical to the
+        current catalog keeps the current snapshot and version, so caches are
+        not invalidated for nothing. Raises if the file cannot be loaded, in
+        which case the current snapshot stays in place.
+        """
+        with self._reload_lock:
+            try:
+                current = self.snapshot
+                products, binary = self._load_products()
+                snapshot = CatalogSnapshot(products, current.version + 1, previous=current, binary=binary)
+            except Exception as e:
+                self.last_reload_error = str(e)
+                raise
+            self.last_reload_error = None
+            if snapshot.fingerprint == current.fingerprint:
+                return current, False
+            self.snapshot = snapshot
+            self.reloads += 1
+            return snapshot, True
+    
+    def stats(self):
+        """
+        Current snapshot and reload counters, for monitoring
+        """
+        return {
+            **self.snapshot.info(),
+            "data_path": self.data_path,
+            "segment_dir": self.segment_dir,
+            "reloads": self.reloads,
+            "last_reload_error": self.last_reload_error,
+        }
     
     def get_all_products(self):
         """
         Return all products
         """
-        return self.products
+        return self.snapshot.products
     
     def get_product_by_id(self, product_id):
         """
         Get a specific product by ID
         """
-        for product in self.products:
-            if product['id'] == product_id:
-                return product
-        return None
+        return self.snapshot.products_by_id.get(product_id)
+    
+    def get_products_by_ids(self, product_ids):
+        """
+        Get products for a list of IDs, preserving order and skipping unknown IDs
+        """
+        lookup = self.snapshot.products_by_id
+        return [lookup[pid] for pid in product_ids if pid in lookup]
     
     def get_products_by_category(self, category):
         """
         Get products filtered by category
         """
-        return [p for p in self.products if p['category'] == category]
\ No newline at end of file
+        catalog = self.snapshot
+        return self._products_at(catalog, catalog.category_index.get(category, ()))
+    
+    def get_products_by_subcategory(self, subcategory):
+        """
+        Get products filtered by subcategory
+        """
+        catalog = self.snapshot
+        return self._products_at(catalog, catalog.subcategory_index.get(subcategory, ()))
+    
+    def get_products_by_brand(self, brand):
+        """
+        Get products filtered by brand
+        """
+        catalog = self.snapshot
+        return self._products_at(catalog, catalog.brand_index.get(brand, ()))
+    
+    def get_products_by_tag(self, tag):
+        """
+        Get products carrying the given tag
+        """
+        catalog = self.snapshot
+        return self._products_at(catalog, catalog.tag_index.get(tag, ()))
+    
+    def get_products_in_price_range(self, low=None, high=None):
+        """
+        Get products whose price lies within [low, high], ordered by price
+        """
+        catalog = self.snapshot
+        start = 0 if low is None else np.searchsorted(catalog.sorted_prices, low, side="left")
+        end = len(catalog.sorted_prices) if high is None else np.searchsorted(catalog.sorted_prices, high, side="right")
+        return self._products_at(catalog, catalog.price_order[start:end])
+    
+    @staticmethod
+    def _products_at(catalog, rows):
+        """
+        Products of a snapshot at the given rows of one of its indexes
+        """
+        products = catalog.products
+        return [products[i] for i in np.asarray(rows).tolist()]
+    
+    def filter_products(self, preferences):
+        """
+        Get products matching a UserPreferences dict (priceRange, categories, brands, inStock)
+        """
+        catalog = self.snapshot
+        return [catalog.products[i] for i in catalog.columns.filter_indices(preferences)]
+    
+    def get_similar_products(self, product_id, limit=5):
+        """
+        Get the products whose text is most similar to the given product, or None if it is unknown
+        """
+        catalog = self.snapshot
+        row = catalog.columns.row_by_id.get(product_id)
+        if row is None:
+            return None
+        rows, _ = catalog.similarity_index.similar_to_rows([row], limit)
+        return [catalog.products[i] for i in rows]
+    
+    def page_products(self, limit, cursor=None, fields=None, categories=None, brands=None,
+                      min_price=None, max_price=None, in_stock=False, catalog=None):
+        """
+        One page of products in product ID order, filtered and optionally projected
+
+        The cursor names the last product ID already returned rather than an
+        offset, so pages stay stable while the catalog is reloaded underneath
+        a client. Returns {"products", "next_cursor", "total"}, where total is
+        the number of products matching the filters and next_cursor is None
+        on the last page. Raises ValueError for a malformed cursor. The page
+        is read from the given catalog snapshot (the current one by default).
+        """
+        catalog = catalog or self.snapshot
+        columns = catalog.columns
+        mask = columns.filter_mask({"categories": categories, "brands": brands, "inStock": in_stock})
+        if min_price is not None:
+            mask &= columns.price >= min_price
+        if max_price is not None:
+            mask &= columns.price <= max_price
+
+        start = 0 if cursor is None else bisect_right(columns.sorted_ids, decode_cursor(cursor))
+        ordered = columns.id_order[start:]
+        rows = ordered[mask[ordered]][:limit + 1]
+
+        products = [catalog.products[i] for i in rows[:limit]]
+        next_cursor = encode_cursor(products[-1]['id']) if len(rows) > limit else None
+        if fields:
+            products = [{f: p.get(f) for f in fields} for p in products]
+        else:
+            products = [p.to_dict() for p in products]
+
+        return {
+            "products": products,
+            "next_cursor": next_cursor,
+            "total": int(mask.sum())
+        }
@@ -0,0 +1,248 @@
+import json
+
+import numpy as np
+from config import config
+
+try:
+    import tiktoken
+    _ENCODING = tiktoken.get_encoding("cl100k_base")
+except Exception:  # tiktoken is optional; fall back to the character heuristic
+    _ENCODING = None
+
+
+# Names the counting estimate_tokens does, so stored counts are only reused when they match
+TOKENIZER = "cl100k_base" if _ENCODING is not None else "chars/4"
+
+
+def estimate_tokens(text):
+    """
+    Token count of a piece of prompt text
+
+    Uses the local tiktoken encoding when it is installed, otherwise a
+    ~4 characters per token estimate that is close for English catalog text.
+    """
+    if _ENCODING is not None:
+        return len(_ENCODING.encode(text))
+    return len(text) // 4 + 1
+
+
+CANDIDATE_HEADER = "id|name|category|brand|price|rating"
+# Browsed products are context only, so their rows drop the id column
+HISTORY_HEADER = CANDIDATE_HEADER.split("|", 1)[1]
+
+
+def short_id(code):
+    """
+    Compact base-36 identifier for a product's short code, used in place of the product ID in prompts
+    """
+    digits = "0123456789abcdefghijklmnopqrstuvwxyz"
+    if code == 0:
+        return "0"
+    out = []
+    while code:
+        code, rem = divmod(code, 36)
+        out.append(digits[rem])
+    return "".join(reversed(out))
+
+
+class PromptFragments:
+    """
+    Pre-encoded prompt row and token count for every catalog product
+
+    Built once per catalog load so requests only concatenate ready-made
+    strings. Rows use the compact CANDIDATE_HEADER layout with a base-36
+    short id instead of repeating field labels on every line. Short codes
+    default to the row position; catalog snapshots pass codes that stay
+    stable across reloads.
+    """
+
+    def __init__(self, products, codes=None):
+        """
+        Encode every product's row and count its tokens
+        """
+        self.codes = list(range(len(products))) if codes is None else codes
+        self.rows = [self.encode(code, p) for code, p in zip(self.codes, products)]
+        self.tokens = np.fromiter((estimate_tokens(r) for r in self.rows), dtype=np.int32, count=len(self.rows))
+
+    @classmethod
+    def from_binary(cls, binary, codes):
+        """
+        Fragments over the rows stored in a binary catalog snapshot, or None if it has none for this tokenizer
+
+        Rows are decoded and prefixed with their short id on access. The
+        stored token counts are for rows whose short code is their position,
+        which every snapshot without a previous one uses; only rows whose
+        code differs are counted again.
+        """
+        tails = binary.prompt_rows()
+        if tails is None or binary.prompt_tokenizer != TOKENIZER:
+            return None
+        from services.binary_catalog import MappedSequence
+
+        fragments = cls.__new__(cls)
+        fragments.codes = codes
+        fragments.rows = MappedSequence(len(codes), lambda row: short_id(codes[row]) + "|" + tails[row])
+        tokens = binary.sections["prompt_tokens"]
+        moved = [row for row, code in enumerate(codes) if code != row]
+        if moved:
+            tokens = tokens.copy()
+            tokens[moved] = [estimate_tokens(fragments.rows[row]) for row in moved]
+        fragments.tokens = tokens
+        return fragments
+
+    @staticmethod
+    def encode(code, product):
+        """
+        One delimited candidate row for a product
+        """
+        def cell(value):
+            return str(value if value is not None else "").replace("|", "/").replace("\n", " ")
+
+        return "|".join((
+            short_id(code),
+            cell(product.get("name")),
+            cell(product.get("category")),
+            cell(product.get("brand")),
+            f"{product.get('price') or 0:.2f}".rstrip("0").rstrip("."),
+            cell(product.get("rating")),
+        )) + "\n"
+
+
+class PromptBuilder:
+    """
+    Token-budgeted prompt construction from precomputed product fragments
+
+    Candidates arrive best-first from the retrieval stage and are packed
+    greedily until the prompt would exceed the budget: the model context
+    window minus the completion tokens (MAX_TOKENS) and a safety margin.
+    """
+
+    INSTRUCTIONS = (
+        "You are an intelligent eCommerce recommendation engine.\n"
+        "Recommend exactly 5 products from the candidate table for the user below, "
+        "using their preferences and browsing history.\n"
+        "Respond ONLY with a JSON array of objects with keys "
+        "\"product_id\" (the candidate's id column), \"explanation\" (string) and "
+        "\"score\" (confidence from 1 to 10). No text before or after the JSON.\n"
+    )
+
+    BATCH_INSTRUCTIONS = (
+        "You are an intelligent eCommerce recommendation engine serving several users at once.\n"
+        "For EACH user below, recommend exactly 5 products from that user's shortlist of the shared candidate table.\n"
+        "Respond ONLY with a JSON object whose keys are the user labels ({labels}); each value is a JSON array "
+        "of objects with keys \"product_id\" (the candidate's id column), \"explanation\" (string) and "
+        "\"score\" (confidence from 1 to 10). No text before or after the JSON.\n"
+    )
+
+    def __init__(self, product_service, context_window=None, max_completion_tokens=None, margin=None):
+        """
+        Initialize the builder and derive the prompt token budget from config
+        """
+        self.product_service = product_service
+        self.context_window = context_window or config['MODEL_CONTEXT_WINDOW']
+        self.max_completion_tokens = max_completion_tokens or config['MAX_TOKENS']
+        self.margin = config['PROMPT_TOKEN_MARGIN'] if margin is None else margin
+        self.budget = self.context_window - self.max_completion_tokens - self.margin
+
+    def rows_for(self, products, catalog=None):
+        """
+        Catalog rows of the given products, skipping any the catalog no longer has
+
+        Each public method reads one catalog snapshot and passes it down, so a
+        prompt is never assembled from two catalog versions.
+        """
+        catalog = catalog or self.product_service.snapshot
+        row_by_id = catalog.columns.row_by_id
+        return [row_by_id[p["id"]] for p in products if p["id"] in row_by_id]
+
+    def candidate_rows(self, products, catalog=None):
+        """
+        The encoded table rows for the given products
+        """
+        catalog = catalog or self.product_service.snapshot
+        fragments = catalog.prompt_fragments
+        return "".join(fragments.rows[row] for row in self.rows_for(products, catalog))
+
+    def history_rows(self, products, catalog=None):
+        """
+        The encoded table rows for browsed products, without the id column
+        """
+        catalog = catalog or self.product_service.snapshot
+        fragments = catalog.prompt_fragments
+        return "".join(fragments.rows[row].split("|", 1)[1] for row in self.rows_for(products, catalog))
+
+    def build(self, user_preferences, browsed_products, candidate_products, history_rows=None):
+        """
+        Build a single-user prompt and return (prompt, packed_candidates)
+
+        history_rows, when given, is the browsing history already rendered
+        as history_rows() would (a session keeps it up to date).
+        """
+        catalog = self.product_service.snapshot
+        fragments = catalog.prompt_fragments
+        if history_rows is None:
+            history_rows = self.history_rows(browsed_products, catalog)
+        head = (
+            self.INSTRUCTIONS
+            + "\nUser Preferences: " + json.dumps(user_preferences, separators=(",", ":"))
+            + "\nBrowsing History (" + HISTORY_HEADER + "):\n" + (history_rows or "none\n")
+            + "\nCandidates (" + CANDIDATE_HEADER + "):\n"
+        )
+        tail = "\nREMEMBER: choose only ids from the candidate table and follow the JSON format exactly.\n"
+
+        remaining = self.budget - estimate_tokens(head) - estimate_tokens(tail)
+        row_by_id = catalog.columns.row_by_id
+        rows = []
+        packed = []
+        for product in candidate_products:
+            row = row_by_id.get(product["id"])
+            if row is None:
+                continue
+            cost = int(fragments.tokens[row])
+            if cost > remaining:
+                break
+            remaining -= cost
+            rows.append(row)
+            packed.append(product)
+
+        prompt = head + "".join(fragments.rows[row] for row in rows) + tail
+        return prompt, packed
+
+    def batch_user_section(self, label, user_preferences, browsed_products, candidate_products, catalog=None):
+        """
+        One user's block in a batched prompt: preferences, history and shortlist of short ids
+        """
+        catalog = catalog or self.product_service.snapshot
+        codes = catalog.prompt_fragments.codes
+        rows = self.rows_for(candidate_products, catalog)
+        history = "; ".join(
+            f"{p['name']} ({p['category']}, {p['brand']}, ${p['price']})" for p in browsed_products
+        ) or "none"
+        return (
+            f"\nUser {label}:\nPreferences: " + json.dumps(user_preferences, separators=(",", ":"))
+            + "\nBrowsing History: " + history
+            + "\nShortlist: " + ", ".join(short_id(codes[row]) for row in rows) + "\n"
+        )
+
+    def build_batch(self, batch):
+        """
+        Build one prompt for several users sharing a single candidate table
+        """
+        catalog = self.product_service.snapshot
+        fragments = catalog.prompt_fragments
+        parts = [
+            self.BATCH_INSTRUCTIONS.format(labels=", ".join(r.label for r in batch)),
+            "\nCandidates (" + CANDIDATE_HEADER + "):\n",
+        ]
+        seen = set()
+        for request in batch:
+            for row in self.rows_for(request.candidate_products, catalog):
+                if row not in seen:
+                    seen.add(row)
+                    parts.append(fragments.rows[row])
+        for request in batch:
+            parts.append(self.batch_user_section(
+                request.label, request.user_preferences, request.browsed_products, request.candidate_products, catalog
+            ))
+        parts.append("\nREMEMBER: answer for every user, choose only ids from each user's shortlist and follow the JSON format exactly.\n")
+        return "".join(parts)
@@ -0,0 +1,183 @@
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+
+from config import config
+from services.catalog_columns import parse_price_range
+from services.product_record import ProductRecord
+
+
+def normalize_preferences(preferences):
+    """
+    Reduce a UserPreferences dict to a canonical form so equivalent requests compare equal
+    """
+    price_range = (preferences.get("priceRange") or "all").strip().lower()
+    try:
+        low, high = parse_price_range(price_range)
+        if low is not None:
+            price_range = f"{low:g}-{high:g}" if high is not None else f"{low:g}+"
+    except ValueError:
+        pass  # Keep the raw string; the filter ignores it the same way for every request
+    return {
+        "priceRange": price_range,
+        "categories": sorted(set(preferences.get("categories") or [])),
+        "brands": sorted(set(preferences.get("brands") or [])),
+        "inStock": bool(preferences.get("inStock")),
+    }
+
+
+def canonical_request_key(preferences, browsing_history):
+    """
+    Stable hash of the normalized preferences plus the ordered browsing history
+    """
+    payload = json.dumps(
+        [normalize_preferences(preferences), list(browsing_history)],
+        sort_keys=True,
+        separators=(",", ":"),
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def _size_default(value):
+    """
+    json.dumps fallback for size accounting: product records as objects, anything else as text
+    """
+    return value.to_dict() if isinstance(value, ProductRecord) else str(value)
+
+
+class RecommendationCache:
+    """
+    In-memory LRU cache of recommendation responses
+
+    Bounded by entry count and total payload bytes, with a per-entry TTL.
+    Entries belong to one catalog version: the first lookup or store with a
+    newer version drops everything, so a catalog change can never serve
+    recommendations for products that no longer exist. Versions only move
+    forward, so a late store from a request that started on an older
+    catalog is discarded instead of wiping the newer entries.
+    """
+
+    def __init__(self, max_entries=None, max_bytes=None, ttl_seconds=None, clock=time.monotonic):
+        """
+        Initialize the cache with limits from config unless given explicitly
+        """
+        self.max_entries = max_entries or config['CACHE_MAX_ENTRIES']
+        self.max_bytes = max_bytes or config['CACHE_MAX_BYTES']
+        self.ttl_seconds = ttl_seconds or config['CACHE_TTL_SECONDS']
+        self._clock = clock
+        self._entries = OrderedDict()  # key -> (value, size, expires_at)
+        self._bytes = 0
+        self._version = None
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    def get(self, key, version):
+        """
+        Return the cached value for key under the given catalog version, or None
+        """
+        with self._lock:
+            if not self._check_version(version):
+                self.misses += 1
+                return None
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            value, size, expires_at = entry
+            if expires_at <= self._clock():
+                self._remove(key)
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, version, value, size=None):
+        """
+        Store a value, evicting least recently used entries to stay within bounds
+        """
+        if size is None:
+            size = len(json.dumps(value, separators=(",", ":"), default=_size_default))
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if not self._check_version(version):
+                return
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (value, size, self._clock() + self.ttl_seconds)
+            self._bytes += size
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self.evictions += 1
+
+    def ttl_remaining(self, key, version):
+        """
+        Seconds until the entry for key expires, or None if it is not (or no longer) cached for this version
+
+        Unlike get() this is not a lookup: it neither counts nor refreshes recency.
+        """
+        with self._lock:
+            if version != self._version:
+                return None
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            remaining = entry[2] - self._clock()
+            return remaining if remaining > 0 else None
+
+    def clear(self):
+        """
+        Drop every entry
+        """
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self):
+        """
+        Counters and current occupancy, for monitoring
+        """
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "catalog_version": self._version,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "invalidations": self.invalidations,
+            }
+
+    def _check_version(self, version):
+        """
+        Invalidate everything when the catalog version moves forward; False for an
+        older version, whose results must not be served or stored (caller holds the lock)
+        """
+        if self._version is not None and version < self._version:
+            return False
+        if version != self._version:
+            if self._entries:
+                self.invalidations += 1
+            self._entries.clear()
+            self._bytes = 0
+            self._version = version
+        return True
+
+    def _remove(self, key):
+        """
+        Remove one entry and account for its size (caller holds the lock)
+        """
+        _, size, _ = self._entries.pop(key)
+        self._bytes -= size
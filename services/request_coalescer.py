@@ -0,0 +1,50 @@
+import asyncio
+
+
+class RequestCoalescer:
+    """
+    Single-flight execution of identical concurrent async work
+
+    The first caller for a key starts the work; callers arriving with the
+    same key while it is still running await that same task instead of
+    starting their own. Nothing is kept once the task finishes, so unlike a
+    cache this never serves a stale result.
+    """
+
+    def __init__(self):
+        """
+        Initialize an empty in-flight table and the counters
+        """
+        self._inflight = {}
+        self.leaders = 0
+        self.coalesced = 0
+
+    async def run(self, key, factory):
+        """
+        Return the result of factory() for key, sharing one in-flight call per key
+
+        The shared call runs as its own task, so a caller that is cancelled
+        (for example because its client disconnected) does not cancel the
+        call for everyone else waiting on it.
+        """
+        task = self._inflight.get(key)
+        if task is not None:
+            self.coalesced += 1
+        else:
+            self.leaders += 1
+            task = asyncio.ensure_future(factory())
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        return await asyncio.shield(task)
+
+    def stats(self):
+        """
+        Counters for monitoring
+        """
+        total = self.leaders + self.coalesced
+        return {
+            "inflight": len(self._inflight),
+            "upstream_calls": self.leaders,
+            "coalesced": self.coalesced,
+            "coalesced_ratio": self.coalesced / total if total else 0.0,
+        }
@@ -0,0 +1,169 @@
+import cProfile
+import heapq
+import io
+import itertools
+import marshal
+import pstats
+import random
+import threading
+import time
+from collections import OrderedDict
+
+from config import config
+
+
+class RequestProfiler:
+    """
+    Opt-in cProfile capture of single requests and a log of the slowest requests
+
+    A request is profiled when it is picked by PROFILE_SAMPLE_RATE or sends
+    an X-Profile header equal to PROFILE_TOKEN (the header trigger is off
+    while no token is configured). Profiles are kept in pstats format, the
+    file cProfile.dump_stats writes, so snakeviz, tuna, gprof2dot or
+    pstats itself can open a downloaded .prof file.
+
+    cProfile hooks the whole thread, and every request shares the event
+    loop thread, so only one request is profiled at a time and its profile
+    also contains whatever other requests ran on the loop meanwhile. Work
+    moved to worker threads is not captured.
+
+    Independently of profiling, every request is offered to a bounded log
+    of the slowest requests seen, with their stage breakdown and prompt
+    sizes; keeping it is a heap push only when a request beats the fastest
+    entry.
+    """
+
+    def __init__(self, sample_rate=None, token=None, slow_log_size=None, max_profiles=None):
+        """
+        Initialize from config unless overridden
+        """
+        self.sample_rate = config['PROFILE_SAMPLE_RATE'] if sample_rate is None else sample_rate
+        self.token = config['PROFILE_TOKEN'] if token is None else token
+        self.slow_log_size = config['SLOW_REQUEST_LOG_SIZE'] if slow_log_size is None else slow_log_size
+        self.max_profiles = config['PROFILE_MAX_STORED'] if max_profiles is None else max_profiles
+
+        self._lock = threading.Lock()
+        self._active = False
+        self._profiles = OrderedDict()
+        self._ids = itertools.count(1)
+        self._slowest = []
+        self._sequence = itertools.count()
+        self.requests = 0
+        self.profiled = 0
+        self.skipped_busy = 0
+
+    def start(self, headers):
+        """
+        A running cProfile.Profile if this request should be profiled, otherwise None
+        """
+        wanted = bool(self.token) and headers.get("x-profile") == self.token
+        if not wanted and not (self.sample_rate > 0 and random.random() < self.sample_rate):
+            return None
+        with self._lock:
+            if self._active:
+                self.skipped_busy += 1
+                return None
+            self._active = True
+        profile = cProfile.Profile()
+        profile.enable()
+        return profile
+
+    def finish(self, profile, summary):
+        """
+        Stop a profile started by start() and store it; returns its id
+        """
+        profile.disable()
+        profile.create_stats()
+        data = marshal.dumps(profile.stats)
+        profile_id = f"{int(time.time())}-{next(self._ids)}"
+        with self._lock:
+            self._active = False
+            self.profiled += 1
+            self._profiles[profile_id] = ({**summary, "profile_id": profile_id, "bytes": len(data)}, data)
+            while len(self._profiles) > self.max_profiles:
+                self._profiles.popitem(last=False)
+        return profile_id
+
+    def record(self, summary):
+        """
+        Offer a finished request to the slow-request log
+
+        summary is a dict with at least "duration_ms"; the stages and details
+        dicts it references are owned by the log from here on.
+        """
+        entry = (summary["duration_ms"], next(self._sequence), summary)
+        with self._lock:
+            self.requests += 1
+            if len(self._slowest) < self.slow_log_size:
+                heapq.heappush(self._slowest, entry)
+            elif self._slowest and entry[0] > self._slowest[0][0]:
+                heapq.heapreplace(self._slowest, entry)
+
+    def slowest(self):
+        """
+        Logged requests, slowest first
+        """
+        with self._lock:
+            entries = sorted(self._slowest, reverse=True)
+        return [summary for _, _, summary in entries]
+
+    def clear_slowest(self):
+        """
+        Empty the slow-request log, e.g. after a deploy
+        """
+        with self._lock:
+            self._slowest = []
+
+    def profiles(self):
+        """
+        Summaries of the stored profiles, newest first
+        """
+        with self._lock:
+            return [summary for summary, _ in reversed(self._profiles.values())]
+
+    def profile_data(self, profile_id):
+        """
+        The pstats file contents of a stored profile, or None
+        """
+        with self._lock:
+            stored = self._profiles.get(profile_id)
+        return stored[1] if stored is not None else None
+
+    def profile_text(self, profile_id, sort="cumulative", limit=40):
+        """
+        A pstats text report of a stored profile, or None
+        """
+        data = self.profile_data(profile_id)
+        if data is None:
+            return None
+        out = io.StringIO()
+        stats = pstats.Stats(_LoadedProfile(data), stream=out)
+        stats.sort_stats(sort).print_stats(limit)
+        return out.getvalue()
+
+    def stats(self):
+        """
+        Settings and counters, for monitoring
+        """
+        with self._lock:
+            return {
+                "sample_rate": self.sample_rate,
+                "header_trigger": bool(self.token),
+                "requests": self.requests,
+                "profiled": self.profiled,
+                "skipped_busy": self.skipped_busy,
+                "stored_profiles": len(self._profiles),
+                "slow_log_entries": len(self._slowest),
+            }
+
+
+class _LoadedProfile:
+    """
+    Adapter that lets pstats.Stats read stats from memory instead of a file
+    """
+
+    def __init__(self, data):
+        self.stats = marshal.loads(data)
+
+    def create_stats(self):
+        pass
@@ -0,0 +1,108 @@
+import json
+
+from services.stream_parser import IncrementalJSONArrayParser
+
+_DECODER = json.JSONDecoder()
+
+
+def normalize_item(item):
+    """
+    Validate one parsed recommendation item and return (product_id, explanation, score), or None
+
+    A plain shape check instead of a pydantic model: the item must be an
+    object with a non-empty product_id (numbers are accepted and turned into
+    strings), the explanation is coerced to a string and the score to an
+    integer clamped to 1-10, defaulting to 5 when missing or not numeric.
+    """
+    if not isinstance(item, dict):
+        return None
+    product_id = item.get("product_id")
+    if isinstance(product_id, (int, float)) and not isinstance(product_id, bool):
+        product_id = str(product_id)
+    if not isinstance(product_id, str) or not product_id.strip():
+        return None
+
+    explanation = item.get("explanation")
+    if not isinstance(explanation, str):
+        explanation = "" if explanation is None else str(explanation)
+
+    score = item.get("score", 5)
+    try:
+        score = int(round(float(score)))
+    except (TypeError, ValueError, OverflowError):
+        score = 5
+
+    return product_id.strip(), explanation, max(1, min(10, score))
+
+
+class RecommendationParser:
+    """
+    Single-pass parser from raw LLM output to enriched recommendations
+
+    Well-formed output (bare, fenced or wrapped in prose) is decoded in C by
+    raw_decode from the first '['. Anything else is scanned once by
+    IncrementalJSONArrayParser, so stray brackets in the prose, trailing
+    commas and truncated completions are tolerated and a malformed item
+    only drops that item. Items are shape-checked with normalize_item,
+    duplicate product ids are dropped and products are resolved through
+    the catalog indexes, or through a per-prompt resolver that also knows
+    the short ids of the candidates that prompt listed.
+    """
+
+    def __init__(self, resolve_product):
+        """
+        Initialize the parser with the default callable mapping a product id to a product or None
+        """
+        self.resolve_product = resolve_product
+
+    def parse(self, text, resolve_product=None):
+        """
+        Parse a complete response into the recommendation response dict
+        """
+        if not isinstance(text, str):
+            return {"recommendations": [], "count": 0, "error": "LLM response is not text"}
+
+        recommendations = []
+        seen = set()
+        for item in self._items(text):
+            recommendation = self.enrich(item, resolve_product)
+            if recommendation is not None and recommendation["product"]["id"] not in seen:
+                seen.add(recommendation["product"]["id"])
+                recommendations.append(recommendation)
+
+        result = {"recommendations": recommendations, "count": len(recommendations)}
+        if not recommendations:
+            result["error"] = "Could not find any valid recommendations in LLM response"
+        return result
+
+    @staticmethod
+    def _items(text):
+        """
+        The parsed items of the first recommendation array in the text
+        """
+        start = text.find("[")
+        if start != -1:
+            try:
+                items, _ = _DECODER.raw_decode(text, start)
+            except ValueError:
+                items = None
+            if isinstance(items, list) and items and all(isinstance(item, dict) for item in items):
+                return items
+        return IncrementalJSONArrayParser().feed(text)
+
+    def enrich(self, item, resolve_product=None):
+        """
+        Attach the full catalog product to one parsed item, or None if it is malformed or unknown
+        """
+        normalized = normalize_item(item)
+        if normalized is None:
+            return None
+        product_id, explanation, score = normalized
+        product = (resolve_product or self.resolve_product)(product_id)
+        if not product:
+            return None
+        return {
+            "product": product,
+            "explanation": explanation,
+            "confidence_score": score
+        }
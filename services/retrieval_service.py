@@ -0,0 +1,179 @@
+import numpy as np
+from config import config
+
+
+class RetrievalService:
+    """
+    Deterministic candidate retrieval ahead of the LLM
+
+    Scores every product that passes the preference filter against the
+    user's browsing history with batched NumPy math and keeps only the
+    top-K, so the prompt size stays constant as the catalog grows. With a
+    co-view model, products other shoppers viewed together with the
+    history get an extra boost. A server-side SessionHistory supplies the
+    history's rows and category/brand counts ready-made.
+    """
+
+    # Relative weight of each signal in the final score
+    WEIGHTS = {
+        "category": 3.0,
+        "brand": 2.0,
+        "tags": 2.0,
+        "similarity": 2.0,
+        "coview": 2.0,
+        "price": 1.0,
+        "rating": 0.5,
+    }
+
+    # Width of the price band around the browsed products, in log-price units
+    PRICE_BAND_SIGMA = 0.5
+
+    # How many text neighbours of the history receive a similarity boost
+    SIMILAR_NEIGHBOURS = 200
+
+    def __init__(self, product_service, top_k=None, coview=None):
+        """
+        Initialize the retrieval stage over the product service's columnar catalog,
+        with an optional CoViewModel
+        """
+        self.product_service = product_service
+        self.top_k = top_k or config['RETRIEVAL_TOP_K']
+        self.coview = coview
+
+    def retrieve(self, user_preferences, browsing_history, k=None, history=None):
+        """
+        Return the top-K candidate products for the user, best first
+        """
+        catalog = self.product_service.snapshot
+        rows, _ = self.rank(user_preferences, browsing_history, k, catalog, history)
+        products = catalog.products
+        return [products[i] for i in rows]
+
+    def rank(self, user_preferences, browsing_history, k=None, catalog=None, history=None):
+        """
+        Score eligible products and return (rows, scores) of the top-K, best first
+
+        Rows refer to the given catalog snapshot (the current one by default).
+        Browsed products are never candidates; when they are all the filter
+        matched, the rest of the catalog is ranked instead, so the result is
+        empty only if the history covers the whole catalog. Ties are broken
+        by catalog position so identical inputs always give identical
+        candidate lists. history, a SessionHistory of the same browsing
+        history, is used only if it was built for that snapshot.
+        """
+        catalog = catalog or self.product_service.snapshot
+        if history is not None and history.catalog_version != catalog.version:
+            history = None
+        columns = catalog.columns
+        k = k or self.top_k
+        if columns.size == 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+
+        browsed_rows = history.rows if history is not None else self._browsed_rows(columns, browsing_history)
+        eligible = columns.filter_mask(user_preferences)
+        eligible[browsed_rows] = False
+        if not eligible.any():
+            # Nothing matched that the user has not already seen; rank the rest of the catalog
+            eligible = np.ones(columns.size, dtype=bool)
+            eligible[browsed_rows] = False
+        candidates = np.flatnonzero(eligible)
+        if candidates.size == 0:
+            return candidates, np.empty(0, dtype=np.float32)
+
+        scores = self.score(columns, browsed_rows, candidates, history)
+        if browsed_rows.size:
+            scores += self.WEIGHTS["similarity"] * self._similarity(catalog, browsed_rows, candidates)
+            if self.coview is not None:
+                scores += self.WEIGHTS["coview"] * self._coview(catalog, browsing_history, candidates)
+
+        if candidates.size > k:
+            top = np.argpartition(-scores, k - 1)[:k]
+            candidates, scores = candidates[top], scores[top]
+        order = np.lexsort((candidates, -scores))
+        return candidates[order], scores[order]
+
+    def score(self, columns, browsed_rows, rows, history=None):
+        """
+        Compute the relevance score of the given catalog rows against the browsed rows
+        """
+        weights = self.WEIGHTS
+        scores = weights["rating"] / 5.0 * columns.rating[rows]
+
+        if browsed_rows.size == 0:
+            return scores
+
+        # Category and brand affinity: share of the history in the row's category/brand
+        if history is not None:
+            scores += weights["category"] * self._counted_affinity(history.category_counts, columns.category_codes, browsed_rows, rows, len(columns.category_vocab))
+            scores += weights["brand"] * self._counted_affinity(history.brand_counts, columns.brand_codes, browsed_rows, rows, len(columns.brand_vocab))
+        else:
+            scores += weights["category"] * self._affinity(columns.category_codes, browsed_rows, rows, len(columns.category_vocab))
+            scores += weights["brand"] * self._affinity(columns.brand_codes, browsed_rows, rows, len(columns.brand_vocab))
+
+        # Tag overlap: fraction of each row's tags that also appear in the history
+        browsed_tags = np.zeros(len(columns.tag_vocab) + 1, dtype=bool)
+        for row in browsed_rows:
+            browsed_tags[columns.tag_codes[columns.tag_offsets[row]:columns.tag_offsets[row + 1]]] = True
+        hit_entries = np.flatnonzero(browsed_tags[columns.tag_codes])
+        hits = np.bincount(columns.tag_rows[hit_entries], minlength=columns.size)[rows]
+        scores += weights["tags"] * (hits / np.maximum(columns.tag_counts[rows], 1))
+
+        # Price band: Gaussian proximity to the history's median log price
+        center = np.median(columns.log_price[browsed_rows])
+        z = (columns.log_price[rows] - center) / self.PRICE_BAND_SIGMA
+        scores += weights["price"] * np.exp(-0.5 * z * z)
+
+        return scores.astype(np.float32)
+
+    def _similarity(self, catalog, browsed_rows, rows):
+        """
+        Text similarity of each row to the browsing history, zero outside the nearest neighbours
+        """
+        similar_rows, similar_scores = catalog.similarity_index.similar_to_rows(
+            browsed_rows, self.SIMILAR_NEIGHBOURS
+        )
+        similarity = np.zeros(catalog.columns.size, dtype=np.float32)
+        similarity[similar_rows] = np.maximum(similar_scores, 0)
+        return similarity[rows]
+
+    def _coview(self, catalog, browsing_history, rows):
+        """
+        Co-view weight of each row with the browsing history, scaled so the strongest neighbour scores 1
+        """
+        coview = np.zeros(catalog.columns.size, dtype=np.float32)
+        totals = self.coview.scores(browsing_history)
+        if totals:
+            row_by_id = catalog.columns.row_by_id
+            top = max(totals.values())
+            for product_id, weight in totals.items():
+                row = row_by_id.get(product_id)
+                if row is not None:
+                    coview[row] = weight / top
+        return coview[rows]
+
+    @staticmethod
+    def _affinity(codes, browsed_rows, rows, vocab_size):
+        """
+        Map each row to the fraction of browsed rows that share its code
+        """
+        table = np.bincount(codes[browsed_rows], minlength=vocab_size) / browsed_rows.size
+        return table[codes[rows]]
+
+    @staticmethod
+    def _counted_affinity(counts, codes, browsed_rows, rows, vocab_size):
+        """
+        _affinity from per-code counts the session already maintains
+        """
+        table = np.zeros(vocab_size, dtype=np.float64)
+        if counts:
+            table[np.fromiter(counts.keys(), dtype=np.int64, count=len(counts))] = list(counts.values())
+        return table[codes[rows]] / browsed_rows.size
+
+    @staticmethod
+    def _browsed_rows(columns, browsing_history):
+        """
+        Resolve browsed product IDs to unique catalog rows, ignoring unknown IDs
+        """
+        row_by_id = columns.row_by_id
+        rows = {row_by_id[pid] for pid in browsing_history if pid in row_by_id}
+        return np.fromiter(sorted(rows), dtype=np.int64, count=len(rows))
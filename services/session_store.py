@@ -0,0 +1,339 @@
+import base64
+import hashlib
+import hmac
+import json
+import re
+import threading
+import time
+from collections import OrderedDict, deque
+
+import numpy as np
+from config import config
+
+# Client-generated session ids: long enough that they cannot be guessed
+SESSION_ID_PATTERN = re.compile(r"[A-Za-z0-9_-]{16,128}")
+
+
+def _b64decode(segment):
+    """
+    Decode one unpadded base64url JWT segment
+    """
+    return base64.urlsafe_b64decode(segment + "=" * (-len(segment) % 4))
+
+
+def bearer_subject(authorization, secret):
+    """
+    User id (the "sub" claim) of a valid HS256 bearer token, or None if it is missing, invalid or expired
+    """
+    if not secret or not authorization or not authorization.lower().startswith("bearer "):
+        return None
+    try:
+        header, payload, signature = authorization[7:].strip().split(".")
+        expected = hmac.new(secret.encode("utf-8"), f"{header}.{payload}".encode("ascii"), hashlib.sha256).digest()
+        if not hmac.compare_digest(expected, _b64decode(signature)):
+            return None
+        if json.loads(_b64decode(header)).get("alg") != "HS256":
+            return None
+        claims = json.loads(_b64decode(payload))
+    except (ValueError, UnicodeError, AttributeError):
+        return None
+    if not isinstance(claims, dict) or claims.get("sub") is None:
+        return None
+    expires = claims.get("exp")
+    if isinstance(expires, (int, float)) and expires < time.time():
+        return None
+    return str(claims["sub"])
+
+
+def session_key(authorization, session_id, secret=None):
+    """
+    Store key for a request: the signed-in user when the bearer token verifies, else the X-Session-Id
+
+    Without SESSION_JWT_SECRET tokens cannot be verified, so they are not
+    trusted and only the session id header identifies the session.
+    """
+    subject = bearer_subject(authorization, config['SESSION_JWT_SECRET'] if secret is None else secret)
+    if subject is not None:
+        return "user:" + subject
+    if session_id and SESSION_ID_PATTERN.fullmatch(session_id):
+        return "sid:" + session_id
+    return None
+
+
+class SequenceGap(Exception):
+    """
+    A history delta starts after the last item the server received, so some items were lost
+    """
+
+    def __init__(self, received):
+        super().__init__(f"History delta skips items; the server has received {received}")
+        self.received = received
+
+
+class SessionHistory:
+    """
+    Read-only view of one session's history and its derived features for one catalog version
+
+    rows are the unique catalog rows of the history, sorted, as the
+    retrieval stage expects; category_counts and brand_counts map column
+    codes to the number of those rows that have them.
+    """
+
+    __slots__ = ("ids", "received", "catalog_version", "products", "rows",
+                 "category_counts", "brand_counts", "prompt_rows")
+
+    def __init__(self, session):
+        self.ids = tuple(session.ids)
+        self.received = session.received
+        self.catalog_version = session.catalog_version
+        self.products = tuple(entry[0] for entry in session.entries if entry[0] is not None)
+        rows = sorted(entry[1] for entry in session.entries if entry[1] is not None)
+        self.rows = np.asarray(rows, dtype=np.int64)
+        self.category_counts = dict(session.categories)
+        self.brand_counts = dict(session.brands)
+        self.prompt_rows = session.prompt_rows
+
+    def affinity(self):
+        """
+        Share of the history in each category and brand, by name
+        """
+        total = len(self.products) or 1
+        shares = {"categories": {}, "brands": {}}
+        for product in self.products:
+            for field, counts in (("category", shares["categories"]), ("brand", shares["brands"])):
+                value = product.get(field)
+                if value is not None:
+                    counts[value] = counts.get(value, 0) + 1
+        return {
+            kind: {name: round(count / total, 4) for name, count in sorted(counts.items(), key=lambda c: -c[1])}
+            for kind, counts in shares.items()
+        }
+
+
+class _Session:
+    """
+    One session's ring buffer of product ids and its incrementally maintained features
+    """
+
+    __slots__ = ("ids", "members", "received", "touched", "catalog_version",
+                 "entries", "categories", "brands", "prompt_rows", "view")
+
+    def __init__(self, size, now):
+        self.ids = deque(maxlen=size)
+        self.members = set()
+        self.received = 0  # delta items received since the last reset, duplicates included
+        self.touched = now
+        self.catalog_version = None
+        self.entries = deque()  # (product, row, prompt row) for each id, in history order
+        self.categories = {}
+        self.brands = {}
+        self.prompt_rows = ""
+        self.view = None
+
+
+class SessionStore:
+    """
+    Server-side browsing history per user or browser session
+
+    Clients send append-only deltas (the products viewed since their last
+    sync) instead of the whole history with every recommendation request.
+    Each session keeps its last SESSION_HISTORY_SIZE distinct products in a
+    ring buffer and, alongside it, the features a recommendation needs:
+    the resolved products, their catalog rows, category and brand counts
+    and the rendered "Browsing History" prompt rows. Appending or evicting
+    an item updates those in O(1), so a request costs O(new items) rather
+    than re-resolving and re-rendering the full history; only a catalog
+    reload makes a session rebuild its features, once, on next use.
+    Viewing a product that is already in the history moves it to the most
+    recent position, which re-joins the bounded prompt rows.
+
+    Deltas carry seq, the number of items the client had sent before them:
+    overlapping items from a retried delta are skipped, and a delta that
+    starts past what the server received raises SequenceGap so the client
+    can replay. At most SESSION_MAX_SESSIONS sessions are kept, least
+    recently used first out, and sessions idle for SESSION_TTL_SECONDS
+    expire.
+    """
+
+    def __init__(self, product_service, max_sessions=None, history_size=None, ttl_seconds=None, clock=time.monotonic):
+        """
+        Initialize an empty store with limits from config unless given explicitly
+        """
+        self.product_service = product_service
+        self.max_sessions = max_sessions or config['SESSION_MAX_SESSIONS']
+        self.history_size = history_size or config['SESSION_HISTORY_SIZE']
+        self.ttl_seconds = ttl_seconds or config['SESSION_TTL_SECONDS']
+        self._clock = clock
+        self._sessions = OrderedDict()  # key -> _Session, least recently used first
+        self._lock = threading.Lock()
+        self.appended = 0
+        self.rebuilds = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def append(self, key, product_ids, seq=None, reset=False):
+        """
+        Apply one delta and return the session's counters; reset first empties the history
+        """
+        catalog = self.product_service.snapshot
+        with self._lock:
+            session = self._session(key, create=True)
+            if reset:
+                self._reset(session)
+                seq = 0
+            if seq is not None:
+                if seq < 0:
+                    raise ValueError("seq must not be negative")
+                if seq > session.received:
+                    raise SequenceGap(session.received)
+                product_ids = product_ids[session.received - seq:]
+            self._sync(session, catalog)
+            for product_id in product_ids:
+                self._push(session, product_id, catalog)
+            session.received += len(product_ids)
+            self.appended += len(product_ids)
+            return {"received": session.received, "length": len(session.ids)}
+
+    def history(self, key):
+        """
+        The session's history view for the current catalog, or None if there is no such session
+        """
+        catalog = self.product_service.snapshot
+        with self._lock:
+            session = self._session(key)
+            if session is None:
+                return None
+            self._sync(session, catalog)
+            if session.view is None:
+                session.view = SessionHistory(session)
+            return session.view
+
+    def stats(self):
+        """
+        Size and counters, for monitoring
+        """
+        with self._lock:
+            return {
+                "sessions": len(self._sessions),
+                "history_size": self.history_size,
+                "appended_items": self.appended,
+                "feature_rebuilds": self.rebuilds,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+            }
+
+    def __len__(self):
+        return len(self._sessions)
+
+    def _session(self, key, create=False):
+        """
+        Look up (or create) a live session and mark it used, expiring idle ones first (caller holds the lock)
+        """
+        now = self._clock()
+        while self._sessions:
+            oldest_key, oldest = next(iter(self._sessions.items()))
+            if now - oldest.touched < self.ttl_seconds:
+                break
+            del self._sessions[oldest_key]
+            self.expirations += 1
+
+        session = self._sessions.get(key)
+        if session is not None:
+            self._sessions.move_to_end(key)
+        elif create:
+            session = self._sessions[key] = _Session(self.history_size, now)
+            if len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+                self.evictions += 1
+        if session is not None:
+            session.touched = now
+        return session
+
+    def _sync(self, session, catalog):
+        """
+        Rebuild a session's features if they belong to an older catalog version (caller holds the lock)
+        """
+        if session.catalog_version == catalog.version:
+            return
+        ids = list(session.ids)
+        session.entries.clear()
+        session.categories.clear()
+        session.brands.clear()
+        session.prompt_rows = ""
+        session.catalog_version = catalog.version
+        for product_id in ids:
+            self._add_features(session, product_id, catalog)
+        session.view = None
+        if ids:
+            self.rebuilds += 1
+
+    def _reset(self, session):
+        """
+        Empty a session's history and features (caller holds the lock)
+        """
+        session.ids.clear()
+        session.members.clear()
+        session.entries.clear()
+        session.categories.clear()
+        session.brands.clear()
+        session.prompt_rows = ""
+        session.received = 0
+        session.view = None
+
+    def _push(self, session, product_id, catalog):
+        """
+        Append one product, evicting the oldest when the ring is full (caller holds the lock)
+
+        A product already in the history is moved to the newest position instead.
+        """
+        if product_id in session.members:
+            if session.ids[-1] != product_id:
+                index = session.ids.index(product_id)
+                del session.ids[index]
+                session.ids.append(product_id)
+                entry = session.entries[index]
+                del session.entries[index]
+                session.entries.append(entry)
+                session.prompt_rows = "".join(prompt_row for _, _, prompt_row in session.entries)
+                session.view = None
+            return
+        if len(session.ids) == session.ids.maxlen:
+            session.members.discard(session.ids.popleft())
+            product, row, prompt_row = session.entries.popleft()
+            if row is not None:
+                columns = catalog.columns
+                self._count(session.categories, int(columns.category_codes[row]), -1)
+                self._count(session.brands, int(columns.brand_codes[row]), -1)
+                session.prompt_rows = session.prompt_rows[len(prompt_row):]
+        session.ids.append(product_id)
+        session.members.add(product_id)
+        self._add_features(session, product_id, catalog)
+        session.view = None
+
+    @staticmethod
+    def _add_features(session, product_id, catalog):
+        """
+        Resolve one product and fold it into the session's features (caller holds the lock)
+        """
+        columns = catalog.columns
+        row = columns.row_by_id.get(product_id)
+        if row is None:
+            session.entries.append((None, None, ""))
+            return
+        # Same text as PromptBuilder.history_rows: the candidate row without its id column
+        prompt_row = catalog.prompt_fragments.rows[row].split("|", 1)[1]
+        session.entries.append((catalog.products[row], row, prompt_row))
+        SessionStore._count(session.categories, int(columns.category_codes[row]), 1)
+        SessionStore._count(session.brands, int(columns.brand_codes[row]), 1)
+        session.prompt_rows += prompt_row
+
+    @staticmethod
+    def _count(counts, code, delta):
+        """
+        Adjust one code's count, dropping it at zero
+        """
+        value = counts.get(code, 0) + delta
+        if value > 0:
+            counts[code] = value
+        else:
+            counts.pop(code, None)
@@ -0,0 +1,184 @@
+import re
+import zlib
+from collections import Counter
+
+import numpy as np
+from config import config
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+
+
+def tokenize(text):
+    """
+    Lowercase a piece of product text and split it into alphanumeric tokens
+    """
+    return TOKEN_PATTERN.findall(text.lower()) if text else []
+
+
+class SimilarityIndex:
+    """
+    Offline semantic similarity index over product text
+
+    Every product's description, features and tags are turned into a hashed
+    TF-IDF vector (the hashing trick, so no vocabulary has to be stored),
+    L2-normalised and stored as one contiguous float32 matrix. Queries are
+    batched cosine similarity: a single matrix-vector product in exact mode,
+    or a random-projection LSH candidate lookup followed by an exact re-rank
+    in approximate mode for large catalogs. Nothing leaves the process.
+
+    Low-diversity text piles many products into a few LSH buckets, so each
+    bucket contributes at most max_bucket rows, drawn from a per-table
+    random order. That keeps the re-rank cost bounded when buckets are
+    skewed, trading some recall inside oversized buckets.
+    """
+
+    # Tags are curated keywords, so they count more than free text
+    FIELD_WEIGHTS = {"description": 1.0, "features": 1.0, "tags": 2.0}
+
+    def __init__(self, products, dim=None, mode=None, exact_limit=None, n_tables=4, n_planes=12, seed=13,
+                 matrix=None, max_bucket=512):
+        """
+        Build the vector matrix and, when needed, the LSH tables
+
+        A precomputed matrix (for example memory-mapped from a binary catalog
+        snapshot) is used as-is when its shape matches the catalog and dim.
+        """
+        self.dim = dim or config['SIMILARITY_DIM']
+        self.size = len(products)
+        if matrix is not None and matrix.shape == (self.size, self.dim):
+            self.matrix = matrix
+        else:
+            self.matrix = self._vectorize(products)
+
+        mode = mode or config['SIMILARITY_MODE']
+        exact_limit = exact_limit or config['SIMILARITY_EXACT_LIMIT']
+        self.approximate = mode == "approximate" or (mode == "auto" and self.size > exact_limit)
+
+        if self.approximate:
+            rng = np.random.default_rng(seed)
+            self.max_bucket = max_bucket
+            self.planes = rng.standard_normal((n_tables, self.dim, n_planes)).astype(np.float32)
+            self.bit_weights = (1 << np.arange(n_planes)).astype(np.int64)
+            self.tables = [self._build_table(self.planes[t], rng) for t in range(n_tables)]
+
+    @classmethod
+    def _product_terms(cls, product):
+        """
+        Collect weighted term counts from a product's text fields
+        """
+        terms = Counter()
+        weights = cls.FIELD_WEIGHTS
+        for token in tokenize(product.get("description")):
+            terms[token] += weights["description"]
+        for feature in product.get("features") or []:
+            for token in tokenize(feature):
+                terms[token] += weights["features"]
+        for tag in product.get("tags") or []:
+            for token in tokenize(tag):
+                terms[token] += weights["tags"]
+        return terms
+
+    def _vectorize(self, products):
+        """
+        Hash every product's terms into a dense, L2-normalised float32 matrix
+        """
+        dim = self.dim
+        rows, cols, values = [], [], []
+        for i, product in enumerate(products):
+            for term, count in self._product_terms(product).items():
+                h = zlib.crc32(term.encode("utf-8"))
+                rows.append(i)
+                cols.append(h % dim)
+                # The sign bit spreads hash collisions around zero instead of piling them up
+                values.append((1.0 + np.log(count)) * (1.0 if h & 0x80000000 else -1.0))
+
+        matrix = np.zeros((self.size, dim), dtype=np.float32)
+        if not rows:
+            return matrix
+        rows = np.asarray(rows, dtype=np.int64)
+        cols = np.asarray(cols, dtype=np.int64)
+        np.add.at(matrix, (rows, cols), np.asarray(values, dtype=np.float32))
+
+        # Inverse document frequency per hashed dimension
+        df = np.count_nonzero(matrix, axis=0)
+        idf = np.log((1.0 + self.size) / (1.0 + df)) + 1.0
+        matrix *= idf.astype(np.float32)
+
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        matrix /= np.maximum(norms, 1e-12)
+        return np.ascontiguousarray(matrix)
+
+    def _hash_codes(self, vectors, planes):
+        """
+        Random-projection signature of each vector as an integer bucket code
+        """
+        return ((vectors @ planes) > 0).astype(np.int64) @ self.bit_weights
+
+    def _build_table(self, planes, rng):
+        """
+        Sort rows by bucket code so each bucket is one contiguous slice, in random order within the bucket
+        """
+        codes = self._hash_codes(self.matrix, planes)
+        order = np.lexsort((rng.permutation(self.size), codes))
+        return codes[order], order
+
+    def _lsh_candidates(self, query, min_candidates):
+        """
+        Gather rows sharing a bucket with the query, probing one-bit neighbours if too few
+
+        Each bucket slice is cut to max_bucket rows.
+        """
+        cap = self.max_bucket
+        codes = ((np.einsum("d,tdp->tp", query, self.planes) > 0).astype(np.int64) @ self.bit_weights).tolist()
+        found = []
+        total = 0
+        for (sorted_codes, order), code in zip(self.tables, codes):
+            lo, hi = np.searchsorted(sorted_codes, [code, code + 1])
+            found.append(order[lo:min(hi, lo + cap)])
+            total += found[-1].size
+        if total < min_candidates:
+            for (sorted_codes, order), code in zip(self.tables, codes):
+                for bit in self.bit_weights:
+                    probe = code ^ int(bit)
+                    lo, hi = np.searchsorted(sorted_codes, [probe, probe + 1])
+                    found.append(order[lo:min(hi, lo + cap)])
+        return np.unique(np.concatenate(found)) if found else np.empty(0, dtype=np.int64)
+
+    def query_vector(self, rows):
+        """
+        Centroid of the given rows' vectors, normalised, or None if there is nothing to query
+        """
+        rows = np.asarray(rows, dtype=np.int64)
+        if rows.size == 0 or self.size == 0:
+            return None
+        query = self.matrix[rows].sum(axis=0)
+        norm = np.linalg.norm(query)
+        if norm == 0:
+            return None
+        return query / norm
+
+    def similar_to_rows(self, rows, k=10):
+        """
+        Return (rows, scores) of the k products most similar to the given rows, best first
+
+        The query rows themselves are excluded from the result.
+        """
+        rows = np.asarray(rows, dtype=np.int64)
+        query = self.query_vector(rows)
+        if query is None:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+
+        if self.approximate:
+            candidates = self._lsh_candidates(query, min_candidates=4 * (k + rows.size))
+            scores = self.matrix[candidates] @ query
+        else:
+            candidates = np.arange(self.size)
+            scores = self.matrix @ query
+
+        keep = ~np.isin(candidates, rows)
+        candidates, scores = candidates[keep], scores[keep]
+        if candidates.size > k:
+            top = np.argpartition(-scores, k - 1)[:k]
+            candidates, scores = candidates[top], scores[top]
+        order = np.lexsort((candidates, -scores))
+        return candidates[order], scores[order]
@@ -0,0 +1,150 @@
+import json
+import re
+
+_STRUCTURAL = re.compile(r'[\[\]{}"\\]')
+
+
+class IncrementalJSONArrayParser:
+    """
+    Incremental parser that yields the objects of a JSON array as soon as each one closes
+
+    Text is fed in arbitrary chunks (for example streamed LLM deltas). Any
+    prose or code fence before the opening '[' is skipped (as are bracket
+    pairs in that prose that contain no decodable object), string literals
+    and escapes are tracked so brackets inside explanations do not confuse
+    the depth count, and only the text of the object currently being read is
+    buffered. Objects that fail to decode are skipped rather than aborting
+    the stream.
+    """
+
+    def __init__(self):
+        """
+        Start in the state of waiting for the opening bracket
+        """
+        self._buffer = []
+        self._started = False
+        self._objects_seen = 0
+        self._finished = False
+        self._depth = 0
+        self._in_string = False
+        self._escaped = False
+        self.skipped = 0
+
+    @property
+    def finished(self):
+        """
+        True once the closing bracket of the top-level array has been seen
+        """
+        return self._finished
+
+    def feed(self, chunk):
+        """
+        Consume a chunk of text and return the list of objects completed by it
+
+        Only structural characters are visited (via a regex scan), and object
+        text is sliced out of the chunk rather than copied character by
+        character, so the cost is one pass over the text at C speed plus a
+        little Python work per bracket and quote.
+        """
+        completed = []
+        if self._finished:
+            return completed
+
+        # An escape at the very end of the previous chunk applies to this chunk's first character
+        skip_until = 1 if self._escaped else 0
+        self._escaped = False
+        start = 0 if self._depth else None
+
+        for match in _STRUCTURAL.finditer(chunk):
+            index = match.start()
+            if index < skip_until:
+                continue
+            char = match.group()
+
+            if not self._started:
+                if char == "[":
+                    self._started = True
+                continue
+
+            if self._depth == 0:
+                # Between array elements: only an object start or the array end matter
+                if char == "{":
+                    self._depth = 1
+                    self._buffer = []
+                    start = index
+                elif char == "]":
+                    if self._objects_seen == 0:
+                        # A bracket pair in prose such as "[5]" or "[see {x}]"; keep looking for the real array
+                        self._started = False
+                        continue
+                    self._finished = True
+                    break
+                continue
+
+            if self._in_string:
+                if char == "\\":
+                    skip_until = index + 2
+                    if skip_until > len(chunk):
+                        self._escaped = True
+                elif char == '"':
+                    self._in_string = False
+            elif char == '"':
+                self._in_string = True
+            elif char in "{[":
+                self._depth += 1
+            elif char in "}]":
+                self._depth -= 1
+                if self._depth == 0:
+                    self._buffer.append(chunk[start:index + 1])
+                    obj = self._decode("".join(self._buffer))
+                    self._buffer = []
+                    start = None
+                    if obj is not None:
+                        self._objects_seen += 1
+                        completed.append(obj)
+
+        if self._depth and start is not None:
+            self._buffer.append(chunk[start:])
+
+        return completed
+
+    def _decode(self, text):
+        """
+        Decode one complete object, tolerating a trailing comma before its closing brace
+        """
+        try:
+            return json.loads(text)
+        except ValueError:
+            pass
+        try:
+            return json.loads(_strip_trailing_commas(text))
+        except ValueError:
+            self.skipped += 1
+            return None
+
+
+def _strip_trailing_commas(text):
+    """
+    Remove commas that directly precede a closing brace or bracket outside of strings
+    """
+    out = []
+    in_string = escaped = False
+    for char in text:
+        if in_string:
+            if escaped:
+                escaped = False
+            elif char == "\\":
+                escaped = True
+            elif char == '"':
+                in_string = False
+        elif char == '"':
+            in_string = True
+        elif char in "}]":
+            # Drop the pending comma, and any whitespace after it, before this closer
+            i = len(out) - 1
+            while i >= 0 and out[i].isspace():
+                i -= 1
+            if i >= 0 and out[i] == ",":
+                del out[i]
+        out.append(char)
+    return "".join(out)
@@ -0,0 +1,49 @@
+import json
+import os
+import sys
+
+import pytest
+
+# The app and its services are imported from the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import config  # noqa: E402
+
+CATEGORIES = ("Electronics", "Home", "Sports", "Books")
+BRANDS = ("Acme", "Globex", "Initech")
+
+
+def make_product(number, **fields):
+    """
+    A catalog product with deterministic field values, overridden by fields
+    """
+    product = {
+        "id": f"prod{number:03d}",
+        "name": f"Product {number}",
+        "category": CATEGORIES[number % len(CATEGORIES)],
+        "subcategory": f"Sub {number % 3}",
+        "price": round(10.0 + number * 7.5, 2),
+        "brand": BRANDS[number % len(BRANDS)],
+        "description": f"Description of product {number}",
+        "features": [f"feature {number % 5}"],
+        "rating": round(3.0 + (number % 20) / 10, 1),
+        "inventory": number % 4,
+        "tags": [f"tag{number % 6}", "all"],
+    }
+    product.update(fields)
+    return product
+
+
+@pytest.fixture
+def catalog_file(tmp_path, monkeypatch):
+    """
+    Point DATA_PATH at a temporary JSON catalog; returns a function that (re)writes it
+    """
+    path = tmp_path / "products.json"
+    monkeypatch.setitem(config, 'DATA_PATH', str(path))
+
+    def write(products):
+        path.write_text(json.dumps(products), encoding="utf-8")
+        return str(path)
+
+    return write
@@ -0,0 +1,41 @@
+import pytest
+
+from config import config
+
+PROTECTED = [
+    ("post", "/api/admin/reload"),
+    ("get", "/api/admin/profiles"),
+    ("get", "/api/admin/profiles/missing"),
+    ("delete", "/api/admin/slow-requests"),
+]
+
+
+@pytest.fixture
+def client():
+    from fastapi.testclient import TestClient
+    from app import app
+
+    with TestClient(app) as client:
+        yield client
+
+
+@pytest.mark.parametrize("method,path", PROTECTED)
+def test_admin_endpoints_are_disabled_without_a_token(client, monkeypatch, method, path):
+    monkeypatch.setitem(config, 'ADMIN_TOKEN', '')
+    response = getattr(client, method)(path, headers={"X-Admin-Token": ""})
+    assert response.status_code == 403
+
+
+@pytest.mark.parametrize("method,path", PROTECTED)
+def test_admin_endpoints_require_the_token(client, monkeypatch, method, path):
+    monkeypatch.setitem(config, 'ADMIN_TOKEN', 's3cret')
+    assert getattr(client, method)(path).status_code == 401
+    assert getattr(client, method)(path, headers={"X-Admin-Token": "wrong"}).status_code == 401
+
+
+def test_the_token_unlocks_reload_and_profiles(client, monkeypatch):
+    monkeypatch.setitem(config, 'ADMIN_TOKEN', 's3cret')
+    headers = {"X-Admin-Token": "s3cret"}
+    assert client.post("/api/admin/reload", headers=headers).status_code == 200
+    assert client.get("/api/admin/profiles", headers=headers).status_code == 200
+    assert client.get("/api/admin/profiles/missing", headers=headers).status_code == 404
@@ -0,0 +1,97 @@
+import asyncio
+import json
+import re
+
+import pytest
+
+from conftest import make_product
+from services.batch_scheduler import BatchScheduler
+from services.llm_service import LLMService
+from services.product_service import ProductService
+from services.retrieval_service import RetrievalService
+
+
+@pytest.fixture
+def service(catalog_file):
+    catalog_file([make_product(n) for n in range(1, 21)])
+    return ProductService()
+
+
+def scheduler(service, **limits):
+    """
+    A BatchScheduler whose upstream answers every user in the prompt with their label, recording the prompts
+    """
+    llm = LLMService(service, RetrievalService(service))
+    prompts = []
+
+    async def complete(messages, max_tokens=None):
+        prompt = messages[-1]["content"]
+        prompts.append(prompt)
+        labels = re.findall(r"^User (u\d+):$", prompt, re.MULTILINE)
+        if not labels:
+            return json.dumps([{"product_id": "single"}])
+        return "Here you go:\n" + json.dumps({label: [{"product_id": label}] for label in labels})
+
+    llm._acomplete = complete
+    return BatchScheduler(llm, **limits), prompts
+
+
+def products(service, *numbers):
+    by_id = service.snapshot.products_by_id
+    return [by_id[f"prod{n:03d}"] for n in numbers]
+
+
+async def submit_all(batcher, requests):
+    return await asyncio.gather(*(batcher.submit({"n": i}, [], candidates) for i, candidates in enumerate(requests)))
+
+
+def test_requests_within_the_window_share_one_call_and_get_their_own_answer(service):
+    batcher, prompts = scheduler(service, window_ms=50, max_batch_size=8, max_tokens=100000)
+    requests = [products(service, 1, 2, 3), products(service, 2, 3, 4), products(service, 5)]
+    results = asyncio.run(submit_all(batcher, requests))
+
+    assert len(prompts) == 1 and batcher.stats()["avg_batch_size"] == 3
+    assert [json.loads(content) for content, _ in results] == [[{"product_id": f"u{i}"}] for i in (1, 2, 3)]
+    assert [offered for _, offered in results] == requests
+    # Candidates offered to several users appear once in the shared table
+    assert prompts[0].count("|Product 2|") == 1
+
+
+def test_batches_are_split_by_size(service):
+    batcher, prompts = scheduler(service, window_ms=50, max_batch_size=2, max_tokens=100000)
+    results = asyncio.run(submit_all(batcher, [products(service, n) for n in (1, 2, 3)]))
+    assert len(prompts) == 2
+    # The user left alone in the second batch gets the regular single-user prompt
+    assert json.loads(results[2][0]) == [{"product_id": "single"}]
+
+
+def test_batches_are_split_before_exceeding_the_token_budget(service):
+    batcher, prompts = scheduler(service, window_ms=50, max_batch_size=8, max_tokens=700,
+                                 completion_tokens_per_user=300)
+    asyncio.run(submit_all(batcher, [products(service, 1), products(service, 2), products(service, 3)]))
+    # Each user reserves 300 completion tokens plus their section, so only two fit in 700
+    assert len(prompts) == 2
+    assert re.findall(r"^User (u\d+):$", prompts[0], re.MULTILINE) == ["u1", "u2"]
+
+
+def test_an_upstream_error_reaches_every_waiting_request(service):
+    batcher, _ = scheduler(service, window_ms=50, max_batch_size=8, max_tokens=100000)
+
+    async def fail(messages, max_tokens=None):
+        raise RuntimeError("upstream down")
+
+    batcher.llm_service._acomplete = fail
+
+    async def run():
+        return await asyncio.gather(
+            *(batcher.submit({}, [], products(service, n)) for n in (1, 2)), return_exceptions=True
+        )
+
+    assert [str(e) for e in asyncio.run(run())] == ["upstream down", "upstream down"]
+
+
+def test_split_response_skips_prose_and_fences():
+    content = 'Sure {not json} here:\n```json\n{"u1": [{"product_id": "a"}], "u2": []}\n```\n'
+    assert BatchScheduler._split_response(content) == {"u1": [{"product_id": "a"}], "u2": []}
+    with pytest.raises(ValueError):
+        BatchScheduler._split_response("no object here")
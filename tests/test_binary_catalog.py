@@ -0,0 +1,178 @@
+import json
+
+import numpy as np
+import pytest
+
+from conftest import make_product
+from services.binary_catalog import BinaryCatalog, main, write_binary_catalog
+from services.catalog_columns import ColumnarCatalog
+from services.catalog_loader import load_catalog
+from services.catalog_payload import CatalogPayload
+from services.catalog_snapshot import CatalogSnapshot
+from services.product_record import ProductRecord
+from services.prompt_builder import PromptFragments
+from services.similarity_index import SimilarityIndex
+
+ODD_PRODUCTS = [
+    make_product(1, rating=4, price=20),                   # integers in float columns
+    make_product(2, rating=4.0, price=19.99),              # floats that look integral
+    make_product(3, rating=None, inventory=None, brand=None),
+    {"id": "prod004", "name": "Sparse"},                   # fields absent entirely
+    make_product(5, price="12.50", inventory=2.5, tags="solo", features=[1, 2]),  # off-schema types
+    make_product(6, price=2 ** 60, inventory=2 ** 70, rating=True, warranty={"years": 2}),
+    make_product(7, name="Ünïcødé ✓", tags=[], features=["a", "a", "b"]),
+]
+
+
+def round_trip(tmp_path, products, **kwargs):
+    path = str(tmp_path / "catalog.pcat")
+    write_binary_catalog(products, path, **kwargs)
+    return BinaryCatalog(path)
+
+
+def test_products_round_trip_exactly(tmp_path):
+    catalog = round_trip(tmp_path, ODD_PRODUCTS)
+    restored = list(catalog.products())
+    # json.dumps tells 4 from 4.0 and also checks key order
+    assert json.dumps(restored) == json.dumps(ODD_PRODUCTS)
+    assert type(restored[0]["rating"]) is int and type(restored[1]["rating"]) is float
+    assert type(restored[0]["price"]) is int and type(restored[1]["price"]) is float
+
+
+def test_products_are_decoded_on_access(tmp_path):
+    catalog = round_trip(tmp_path, ODD_PRODUCTS)
+    decoded = []
+
+    def factory(product):
+        decoded.append(product["id"])
+        return product
+
+    products = catalog.products(factory)
+    assert len(products) == len(ODD_PRODUCTS) and decoded == []
+    assert products[-1] == ODD_PRODUCTS[-1] and products[np.int64(2)] == ODD_PRODUCTS[2]
+    assert products[1:3] == ODD_PRODUCTS[1:3]
+    assert decoded == ["prod007", "prod003", "prod002", "prod003"]
+    with pytest.raises(IndexError):
+        products[len(ODD_PRODUCTS)]
+
+
+def test_snapshots_decode_only_the_products_they_are_asked_for(tmp_path):
+    products = [make_product(n) for n in range(1, 30)]
+    matrix = SimilarityIndex(products, mode="exact").matrix
+    catalog = round_trip(tmp_path, products, similarity_matrix=matrix, payload=CatalogPayload(products))
+    decoded = []
+
+    def factory(product):
+        decoded.append(product["id"])
+        return ProductRecord.from_dict(product)
+
+    snapshot = CatalogSnapshot(catalog.products(factory), version=1, binary=catalog)
+    assert decoded == []
+    assert snapshot.products_by_id["prod007"].to_dict() == products[6]
+    assert "prod099" not in snapshot.products_by_id and snapshot.products_by_id.get("prod099") is None
+    assert len(snapshot.products_by_id) == len(products)
+    assert decoded == ["prod007"]
+
+
+def test_int_and_float_ratings_keep_their_payload_fingerprint(tmp_path):
+    catalog = round_trip(tmp_path, ODD_PRODUCTS)
+    assert CatalogPayload(catalog.products()).fingerprint == CatalogPayload(ODD_PRODUCTS).fingerprint
+
+
+def test_cleaned_columns_are_views_of_the_map(tmp_path):
+    catalog = round_trip(tmp_path, ODD_PRODUCTS)
+    binary_columns = ColumnarCatalog(catalog.products(), catalog)
+
+    for field, dtype in (("price", np.float64), ("rating", np.float32), ("inventory", np.int32)):
+        column = getattr(binary_columns, field)
+        assert column.dtype == dtype
+        assert np.shares_memory(column, catalog._map)
+        assert not column.flags.writeable
+    # Absent values are 0, as in columns built from parsed products
+    assert binary_columns.price[:4].tolist() == [20.0, 19.99, 32.5, 0.0]
+    assert binary_columns.rating[:4].tolist() == [4.0, 4.0, 0.0, 0.0]
+    assert binary_columns.inventory[:4].tolist() == [1, 2, 0, 0]
+    # Off-schema values are not usable numbers, so the columns see them as absent
+    assert binary_columns.price[4] == 0.0 and binary_columns.inventory[4] == 0
+    assert binary_columns.inventory[5] == 0
+
+
+def test_similarity_matrix_and_payload_are_stored(tmp_path):
+    products = [make_product(n) for n in range(1, 8)]
+    matrix = np.random.default_rng(0).random((len(products), 16), dtype=np.float32)
+    payload = CatalogPayload(products)
+    catalog = round_trip(tmp_path, products, similarity_matrix=matrix, payload=payload)
+
+    assert np.array_equal(catalog.similarity_matrix, matrix)
+    assert catalog.fingerprint == payload.fingerprint
+    bodies = catalog.payload_bodies()
+    assert bytes(bodies["identity"]) == payload.body
+    assert json.loads(bytes(bodies["identity"])) == products
+
+
+def test_stored_columns_match_the_ones_built_from_products(tmp_path):
+    products = [make_product(n) for n in (5, 3, 9, 1, 7)]
+    products += [make_product(3, name="Duplicate id"), make_product(2, tags=None)]
+    catalog = round_trip(tmp_path, products)
+    stored, built = ColumnarCatalog(products, catalog), ColumnarCatalog(products)
+
+    assert list(stored.ids) == built.ids
+    assert stored.id_order.tolist() == built.id_order.tolist()
+    assert list(stored.sorted_ids) == built.sorted_ids
+    assert dict(stored.row_by_id) == built.row_by_id and stored.row_by_id["prod003"] == 5
+    assert "prod004" not in stored.row_by_id and stored.row_by_id.get(3) is None
+    for facet in ("category", "subcategory", "brand", "tag"):
+        assert getattr(stored, f"{facet}_vocab") == getattr(built, f"{facet}_vocab")
+        assert getattr(stored, f"{facet}_codes").tolist() == getattr(built, f"{facet}_codes").tolist()
+        assert np.shares_memory(getattr(stored, f"{facet}_codes"), catalog._map)
+    assert stored.tag_offsets.tolist() == built.tag_offsets.tolist()
+
+
+def test_facets_with_non_string_values_are_derived_by_readers(tmp_path):
+    products = [make_product(1), make_product(2, category=5), make_product(3, category=None)]
+    catalog = round_trip(tmp_path, products)
+    assert catalog.facet("category") is None and catalog.facet("brand") is not None
+    columns = ColumnarCatalog(products, catalog)
+    assert columns.category_vocab == ColumnarCatalog(products).category_vocab
+
+
+def test_stored_prompt_rows_follow_the_short_codes(tmp_path):
+    products = [make_product(n, name=f"{'Long ' * n}name") for n in range(1, 6)]
+    catalog = round_trip(tmp_path, products)
+    for codes in ([0, 1, 2, 3, 4], [4000000, 1, 2, 70000, 4]):
+        stored, built = PromptFragments.from_binary(catalog, codes), PromptFragments(products, codes)
+        assert list(stored.rows) == built.rows
+        assert stored.tokens.tolist() == built.tokens.tolist()
+    # Rows that cannot be rendered are not stored, so readers fail the way they would on the JSON catalog
+    odd = tmp_path / "odd"
+    odd.mkdir()
+    assert PromptFragments.from_binary(round_trip(odd, ODD_PRODUCTS), list(range(7))) is None
+
+
+def test_load_catalog_maps_pcat_files(tmp_path):
+    products = [make_product(n) for n in range(1, 4)]
+    path = str(tmp_path / "catalog.pcat")
+    write_binary_catalog(products, path)
+    records, binary = load_catalog(path)
+    assert isinstance(binary, BinaryCatalog)
+    assert [r.to_dict() for r in records] == products
+
+
+def test_other_files_are_rejected(tmp_path):
+    path = tmp_path / "catalog.pcat"
+    path.write_bytes(b"PCATv001" + b"\0" * 64)
+    with pytest.raises(ValueError, match="regenerate"):
+        BinaryCatalog(str(path))
+
+
+def test_cli_writes_the_payload_and_fingerprint(tmp_path, capsys):
+    products = [make_product(n) for n in range(1, 6)]
+    source = tmp_path / "products.json"
+    source.write_text(json.dumps(products), encoding="utf-8")
+    target = str(tmp_path / "products.pcat")
+
+    assert main([str(source), target]) == 0
+    catalog = BinaryCatalog(target)
+    assert catalog.fingerprint == CatalogPayload(products).fingerprint
+    assert catalog.payload_bodies() and catalog.similarity_matrix.shape[0] == len(products)
+    assert catalog.fingerprint in capsys.readouterr().out
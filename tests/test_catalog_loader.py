@@ -0,0 +1,65 @@
+import io
+import json
+
+import pytest
+
+from conftest import make_product
+from services.catalog_loader import iter_json_array, load_catalog
+
+VALID = ['[]', ' [ ]\n', '[{"id": "a"}]', '[1, "two", [3], {"id": "x,]"}]', '\n[\n{"id": "a"} ,\n{"id": "b"}\n]\n\n']
+MALFORMED = ['', '   ', '[', '[{"id": "a"}', '[{"id": "a"},', '[{"id": "a"} {"id": "b"}]',
+             '[{"id": "a"},,{"id": "b"}]', '[,{"id": "a"}]', '[{"id": "a"},]', '[{"id": "a"}] x', '[] []',
+             '[{"id": "a"}]]', '[{"id": "a"]', '[{"id": "a"}, tru]']
+
+
+@pytest.mark.parametrize("text", VALID)
+@pytest.mark.parametrize("chunk_size", [1, 2, 7, 1 << 20])
+def test_valid_arrays_match_json_load(text, chunk_size):
+    assert list(iter_json_array(io.StringIO(text), chunk_size=chunk_size)) == json.loads(text)
+
+
+@pytest.mark.parametrize("text", MALFORMED)
+@pytest.mark.parametrize("chunk_size", [1, 2, 7, 1 << 20])
+def test_malformed_arrays_raise_like_json_load(text, chunk_size):
+    with pytest.raises(ValueError):
+        json.loads(text)
+    with pytest.raises(ValueError):
+        list(iter_json_array(io.StringIO(text), chunk_size=chunk_size))
+
+
+def test_top_level_must_be_an_array():
+    with pytest.raises(ValueError, match="Expected a JSON array"):
+        list(iter_json_array(io.StringIO('{"id": "a"}')))
+
+
+def test_oversized_element_is_rejected():
+    text = '[{"id": "' + "x" * 1000
+    with pytest.raises(ValueError, match="Malformed product"):
+        list(iter_json_array(io.StringIO(text), chunk_size=64, max_object_chars=256))
+
+
+def test_json_and_jsonl_load_the_same_records(tmp_path):
+    products = [make_product(n) for n in range(1, 6)]
+    json_path = tmp_path / "products.json"
+    json_path.write_text(json.dumps(products, indent=2), encoding="utf-8")
+    jsonl_path = tmp_path / "products.jsonl"
+    jsonl_path.write_text("\n".join(json.dumps(p) for p in products) + "\n\n", encoding="utf-8")
+
+    for path in (json_path, jsonl_path):
+        records, binary = load_catalog(str(path))
+        assert binary is None
+        assert [r.to_dict() for r in records] == products
+
+
+def test_products_without_an_id_are_rejected(tmp_path):
+    path = tmp_path / "products.json"
+    path.write_text(json.dumps([make_product(1), {"name": "no id"}]), encoding="utf-8")
+    with pytest.raises(ValueError, match="Product #1"):
+        load_catalog(str(path))
+
+
+def test_malformed_jsonl_reports_the_line(tmp_path):
+    path = tmp_path / "products.jsonl"
+    path.write_text(json.dumps(make_product(1)) + "\n{broken\n", encoding="utf-8")
+    with pytest.raises(ValueError, match="line 2"):
+        load_catalog(str(path))
@@ -0,0 +1,90 @@
+import gzip
+import json
+
+import pytest
+
+from conftest import make_product
+from services import catalog_payload
+from services.catalog_payload import CatalogPayload, etag_matches, page_etag
+
+PRODUCTS = [make_product(n, name=f"Produkt {n} – ü") for n in range(1, 6)]
+
+
+@pytest.fixture
+def payload(monkeypatch):
+    # Keep the representations deterministic whether or not brotli is installed
+    monkeypatch.setattr(catalog_payload, "brotli", None)
+    return CatalogPayload(PRODUCTS)
+
+
+@pytest.mark.parametrize("header,coding", [
+    (None, None),
+    ("", None),
+    ("identity", None),
+    ("gzip", "gzip"),
+    ("deflate, gzip;q=0.5", "gzip"),
+    ("gzip;q=0", None),
+    ("*", "gzip"),
+    ("*, gzip;q=0", None),
+    ("br", None),
+])
+def test_the_coding_follows_accept_encoding(payload, header, coding):
+    assert payload.select(header)[0] == coding
+
+
+def test_every_representation_decodes_to_the_same_json(payload):
+    _, identity, _ = payload.select(None)
+    _, compressed, _ = payload.select("gzip")
+    assert json.loads(identity) == PRODUCTS
+    assert gzip.decompress(compressed) == identity
+    assert payload.stats() == {"identity": len(identity), "gzip": len(compressed)}
+
+
+def test_etags_are_strong_per_coding_and_stable_across_rebuilds(payload):
+    identity_etag = payload.select(None)[2]
+    gzip_etag = payload.select("gzip")[2]
+    assert identity_etag == f'"{payload.fingerprint}"'
+    assert gzip_etag == f'"{payload.fingerprint}-gzip"'
+
+    rebuilt = CatalogPayload(list(PRODUCTS))
+    assert rebuilt.etags == payload.etags and rebuilt.encoded == payload.encoded
+    changed = CatalogPayload(PRODUCTS[:-1])
+    assert changed.fingerprint != payload.fingerprint
+
+
+def test_if_none_match_uses_the_weak_comparison_and_lists(payload):
+    etag = payload.etags["gzip"]
+    assert payload.matches(etag)
+    assert payload.matches(f'"other", W/{etag}')
+    assert payload.matches("*")
+    assert not payload.matches(None) and not payload.matches('"other"')
+    assert not etag_matches('"a"', [])
+
+
+def test_page_etags_depend_on_the_query_but_not_its_order():
+    a = page_etag("f1", [("limit", "5"), ("brand", "Acme")])
+    assert a == page_etag("f1", [("brand", "Acme"), ("limit", "5")])
+    assert a != page_etag("f1", [("limit", "6"), ("brand", "Acme")])
+    assert a != page_etag("f2", [("limit", "5"), ("brand", "Acme")])
+
+
+def test_full_catalog_endpoint_compresses_and_revalidates():
+    from fastapi.testclient import TestClient
+    from app import app
+
+    with TestClient(app) as client:
+        response = client.get("/api/products", headers={"Accept-Encoding": "gzip"})
+        assert response.status_code == 200
+        assert response.headers["content-encoding"] == "gzip"
+        assert "Accept-Encoding" in response.headers["vary"]
+        etag = response.headers["etag"]
+        assert etag.endswith('-gzip"')
+
+        plain = client.get("/api/products", headers={"Accept-Encoding": "identity"})
+        assert "content-encoding" not in plain.headers
+        assert plain.json() == response.json()
+
+        # Any representation's ETag revalidates, whichever coding the client now accepts
+        again = client.get("/api/products", headers={"Accept-Encoding": "identity", "If-None-Match": etag})
+        assert again.status_code == 304 and again.content == b""
+        assert again.headers["etag"] == plain.headers["etag"]
@@ -0,0 +1,59 @@
+import os
+
+from config import config
+from conftest import make_product
+from services.catalog_segments import (
+    SEGMENT_PREFIX, SegmentPublisher, current_segment, pointer_path, publish_segment,
+)
+from services.product_service import ProductService
+
+
+def catalog(size):
+    return [make_product(n) for n in range(1, size + 1)]
+
+
+def segments(directory):
+    return sorted(name for name in os.listdir(directory) if name.startswith(SEGMENT_PREFIX))
+
+
+def test_publishing_points_the_directory_at_the_new_segment(tmp_path):
+    path, fingerprint = publish_segment(catalog(3), str(tmp_path))
+    assert current_segment(str(tmp_path)) == path
+    assert os.path.basename(path) == f"{SEGMENT_PREFIX}{fingerprint}.pcat"
+    # No temporary files are left behind
+    assert sorted(os.listdir(tmp_path)) == sorted([os.path.basename(path), "CURRENT"])
+
+    again, same = publish_segment(catalog(3), str(tmp_path))
+    assert (again, same) == (path, fingerprint) and len(segments(tmp_path)) == 1
+
+
+def test_old_segments_are_pruned_but_never_the_current_one(tmp_path):
+    directory = str(tmp_path)
+    paths = [publish_segment(catalog(size), directory, keep=2)[0] for size in range(1, 5)]
+    assert segments(directory) == sorted(os.path.basename(p) for p in paths[-2:])
+
+    # Republishing an older catalog makes its segment the newest again
+    publish_segment(catalog(3), directory, keep=2)
+    assert current_segment(directory) == paths[2]
+    assert segments(directory) == sorted(os.path.basename(p) for p in paths[2:])
+
+
+def test_workers_reload_onto_the_published_segment(tmp_path, catalog_file, monkeypatch):
+    directory = str(tmp_path / "segments")
+    data_path = catalog_file(catalog(4))
+    publisher = SegmentPublisher(data_path, directory)
+    assert publisher.publish() and publisher.version == 1
+
+    monkeypatch.setitem(config, 'CATALOG_SEGMENT_DIR', directory)
+    service = ProductService()
+    assert service.source_path == pointer_path(directory)
+    assert [p["id"] for p in service.products] == [f"prod{n:03d}" for n in range(1, 5)]
+
+    # An unchanged data file publishes nothing new
+    assert publisher.reload() == (publisher, False) and publisher.version == 1
+
+    catalog_file(catalog(6))
+    assert publisher.reload()[1] and publisher.version == 2
+    _, changed = service.reload()
+    assert changed and len(service.products) == 6
+    assert service.get_product_by_id("prod006")["name"] == "Product 6"
@@ -0,0 +1,64 @@
+import pytest
+
+from services.coview_model import CoViewModel
+
+
+def model_with_clock(**bounds):
+    now = [0.0]
+    bounds = {"max_items": 100, "neighbours": 5, "half_life": 10, **bounds}
+    return CoViewModel(clock=lambda: now[0], **bounds), now
+
+
+def test_recent_views_weigh_more_and_repeats_are_ignored():
+    model, _ = model_with_clock()
+    model.record(["a", "b", "c"])
+    assert model.neighbours("c") == [("b", 1.0), ("a", 0.5)]
+    assert model.neighbours("a") == [("c", 0.5)]
+
+    model.record(["a", "b", "c"])
+    assert model.stats()["ignored_duplicates"] == 1 and model.neighbours("c")[0] == ("b", 1.0)
+
+
+def test_weights_halve_every_half_life():
+    model, now = model_with_clock()
+    model.record(["a", "b"])
+    now[0] = 20.0
+    assert model.neighbours("b") == [("a", pytest.approx(0.25))]
+
+    # A fresh co-view outweighs an older one of the same position
+    model.record(["c", "b"])
+    assert model.neighbours("b") == [("c", pytest.approx(1.0)), ("a", pytest.approx(0.25))]
+    assert model.scores(["b"]) == {"c": pytest.approx(1.0), "a": pytest.approx(0.25)}
+
+
+def test_renormalizing_keeps_the_decayed_weights():
+    model, now = model_with_clock()
+    model.record(["a", "b"])
+    # Far enough for the lazy scale to pass MAX_SCALE and be folded into the stored weights
+    now[0] = 500.0
+    model.record(["c", "b"])
+    assert model._scale_log2 == 50.0
+    weights = dict(model.neighbours("b"))
+    assert weights["c"] == pytest.approx(1.0) and weights["a"] == pytest.approx(2.0 ** -50)
+
+
+def test_items_and_neighbours_are_bounded():
+    model, _ = model_with_clock(max_items=4, neighbours=2)
+    for i in range(1, 7):
+        model.record(["hub", f"n{i}"])
+    assert model.stats()["items"] == 4 and "n1" not in model._edges
+    assert len(model._edges["hub"]) <= 4 and len(model.neighbours("hub")) == 2
+
+
+def test_unknown_history_ids_are_not_recorded(monkeypatch):
+    import app as app_module
+
+    model = CoViewModel(max_items=100, neighbours=5, half_life=3600)
+    monkeypatch.setattr(app_module, "coview_model", model)
+    known = list(app_module.product_service.snapshot.products_by_id)[:2]
+
+    app_module._record_coviews([f"bogus{i}" for i in range(50)])
+    assert model.stats()["items"] == 0
+    app_module._record_coviews([known[0], "bogus", known[1]])
+    assert model.stats()["items"] == 2
+    assert [other for other, _ in model.neighbours(known[1])] == [known[0]]
@@ -0,0 +1,103 @@
+import asyncio
+
+import pytest
+
+from conftest import make_product
+from services.coview_model import CoViewModel
+from services.fallback_ranker import FallbackRanker
+from services.llm_service import LLMService
+from services.product_service import ProductService
+from services.recommendation_cache import RecommendationCache
+from services.retrieval_service import RetrievalService
+
+
+@pytest.fixture
+def service(catalog_file):
+    catalog_file([make_product(1, category="Office", price=39.99)] +
+                 [make_product(n, category="Home", price=80.0 + n) for n in range(2, 9)])
+    return ProductService()
+
+
+def slow_llm(service, deadline):
+    """
+    An LLMService with a fallback ranker whose upstream answers after the deadline
+    """
+    retrieval = RetrievalService(service, top_k=5)
+    llm = LLMService(service, retrieval, fallback_ranker=FallbackRanker(service, retrieval))
+    llm.deadline_seconds = deadline
+
+    async def late_answer(*args, **kwargs):
+        await asyncio.sleep(deadline * 20)
+        return "[]"
+
+    llm._acomplete = late_answer
+    return llm
+
+
+@pytest.mark.parametrize("preferences, history", [
+    ({"priceRange": "all"}, ["prod002"]),
+    ({"priceRange": "0-50", "categories": ["Office"]}, ["prod001"]),
+    ({"categories": ["Office"]}, [f"prod{n:03d}" for n in range(1, 9)]),
+])
+def test_missed_deadline_returns_a_non_empty_fallback(service, preferences, history):
+    llm = slow_llm(service, deadline=0.01)
+    result = asyncio.run(llm.arecommend(preferences, history))
+    assert result["source"] == "fallback"
+    assert result["fallback_reason"] in ("deadline_exceeded", "empty_llm_response")
+    assert result["count"] == len(result["recommendations"]) > 0
+    for recommendation in result["recommendations"]:
+        assert recommendation["explanation"].startswith("Recommended because")
+        assert 1 <= recommendation["confidence_score"] <= 10
+
+
+def test_fallback_is_never_empty_for_a_non_empty_catalog(service):
+    retrieval = RetrievalService(service, top_k=5)
+    ranker = FallbackRanker(service, retrieval)
+    everything = [p["id"] for p in service.products]
+    result = ranker.recommend({"categories": ["Office"]}, everything, count=3)
+    assert result["count"] == 3
+
+
+def test_upstream_errors_fall_back(service):
+    llm = slow_llm(service, deadline=1.0)
+
+    async def broken(*args, **kwargs):
+        raise RuntimeError("connection refused")
+
+    llm._acomplete = broken
+    result = asyncio.run(llm.arecommend({"priceRange": "all"}, ["prod002"]))
+    assert result["source"] == "fallback" and result["fallback_reason"] == "llm_error"
+    assert result["count"] > 0
+
+
+def test_a_late_answer_still_fills_the_cache(service):
+    retrieval = RetrievalService(service, top_k=5)
+    llm = LLMService(service, retrieval, cache=RecommendationCache(),
+                     fallback_ranker=FallbackRanker(service, retrieval))
+    llm.deadline_seconds = 0.01
+
+    async def late_answer(*args, **kwargs):
+        await asyncio.sleep(0.1)
+        return '[{"product_id": "prod003", "explanation": "late", "score": 8}]'
+
+    llm._acomplete = late_answer
+
+    async def run():
+        first = await llm.arecommend({"priceRange": "all"}, ["prod002"])
+        await asyncio.sleep(0.2)
+        return first, await llm.arecommend({"priceRange": "all"}, ["prod002"])
+
+    first, second = asyncio.run(run())
+    assert first["source"] == "fallback" and first["fallback_reason"] == "deadline_exceeded"
+    assert second["source"] == "cache"
+    assert [r["product"]["id"] for r in second["recommendations"]] == ["prod003"]
+
+
+def test_explanations_name_the_matching_signals(service):
+    coview = CoViewModel(max_items=100, neighbours=5, half_life=3600)
+    coview.record(["prod002", "prod005"])
+    ranker = FallbackRanker(service, RetrievalService(service, top_k=8, coview=coview))
+    result = ranker.recommend({"categories": ["Home"]}, ["prod002"], count=8)
+    explanations = {r["product"]["id"]: r["explanation"] for r in result["recommendations"]}
+    assert "shoppers who viewed Product 2 also viewed it" in explanations["prod005"]
+    assert "it is in your preferred Home category" in explanations["prod003"]
@@ -0,0 +1,70 @@
+from services import metrics
+from services.metrics import Counter, Gauge, Histogram, Registry
+
+
+def test_families_render_in_the_prometheus_text_format():
+    registry = Registry()
+    requests = Counter("requests", "Requests served", ["path"], registry=registry)
+    size = Gauge("queue_size", "Queued items", registry=registry)
+    requests.inc(path="/b")
+    requests.inc(2, path='/a"\n')
+    size.set_function(lambda: 7)
+
+    assert registry.render() == (
+        "# HELP requests Requests served\n"
+        "# TYPE requests counter\n"
+        'requests_total{path="/a\\"\\n"} 2\n'
+        'requests_total{path="/b"} 1\n'
+        "# HELP queue_size Queued items\n"
+        "# TYPE queue_size gauge\n"
+        "queue_size 7\n"
+    )
+
+
+def test_histogram_buckets_are_cumulative():
+    registry = Registry()
+    latency = Histogram("latency_seconds", "Latency", buckets=(0.5, 0.1), registry=registry)
+    for value in (0.05, 0.1, 0.3, 2.0):
+        latency.observe(value)
+
+    lines = registry.render().splitlines()[2:]
+    assert lines == [
+        'latency_seconds_bucket{le="0.1"} 2',
+        'latency_seconds_bucket{le="0.5"} 3',
+        'latency_seconds_bucket{le="+Inf"} 4',
+        "latency_seconds_sum 2.45",
+        "latency_seconds_count 4",
+    ]
+
+
+def test_stage_timers_report_into_the_current_request():
+    child = Histogram("stage_seconds", "Stages", ["stage"], registry=Registry()).labels("retrieval")
+    stages = {}
+    token = metrics.request_stages.set(stages)
+    try:
+        for _ in range(2):
+            with metrics.StageTimer(child, "retrieval"):
+                pass
+    finally:
+        metrics.request_stages.reset(token)
+    assert child.count == 2 and list(stages) == ["retrieval"] and stages["retrieval"] >= 0
+
+    # Outside a request only the histogram is updated
+    with metrics.StageTimer(child, "retrieval"):
+        pass
+    assert child.count == 3
+
+
+def test_metrics_endpoint_exposes_request_latency_by_route():
+    from fastapi.testclient import TestClient
+    from app import app
+
+    with TestClient(app) as client:
+        client.get("/api/products", params={"limit": 1})
+        response = client.get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+    body = response.text
+    assert "# TYPE recommendation_stage_seconds histogram" in body
+    assert 'http_request_duration_seconds_count{route="/api/products",method="GET",status="200"}' in body
+    assert "\ncatalog_version " in body
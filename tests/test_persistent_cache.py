@@ -0,0 +1,99 @@
+import threading
+
+import pytest
+
+from services.persistent_cache import PersistentRecommendationStore
+
+
+@pytest.fixture
+def open_store(tmp_path):
+    stores = []
+
+    def open_store(**limits):
+        store = PersistentRecommendationStore(str(tmp_path / "cache.db"), ttl_seconds=3600, **limits)
+        stores.append(store)
+        return store
+
+    yield open_store
+    for store in stores:
+        store.close()
+
+
+def value(size):
+    return [["prod001", "x" * size, 5]]
+
+
+def test_eviction_keeps_stored_bytes_between_the_target_and_the_bound(open_store):
+    store = open_store(max_bytes=50_000, batch_size=64)
+    for i in range(2000):
+        store.put(f"key{i}", "fp", value(200))
+    store.flush()
+    stats = store.stats()
+    assert 45_000 <= stats["bytes"] <= 50_000
+    assert stats["evictions"] == 2000 - stats["entries"]
+    # The most recently written entries are the ones kept
+    assert store.get("key1999", "fp") is not None
+    assert store.get("key0", "fp") is None
+
+
+def test_stores_sharing_a_file_keep_it_within_the_bound(open_store):
+    first = open_store(max_bytes=50_000, batch_size=16)
+    second = open_store(max_bytes=50_000, batch_size=16)
+    for i in range(1000):
+        first.put(f"first{i}", "fp", value(200))
+        second.put(f"second{i}", "fp", value(200))
+    first.flush()
+    second.flush()
+    stats = first.stats()
+    assert stats["bytes"] <= 50_000
+    assert stats["entries"] == 2000 - first.evictions - second.evictions
+
+
+def test_writer_survives_an_unexpected_error(open_store, monkeypatch):
+    store = open_store(max_bytes=10_000_000)
+    apply = store._apply
+    failures = []
+
+    def fail_once(connection, batch):
+        if not failures:
+            failures.append(batch)
+            raise RuntimeError("boom")
+        apply(connection, batch)
+
+    monkeypatch.setattr(store, "_apply", fail_once)
+    store.put("lost", "fp", value(1))
+    assert store.flush(timeout=5)
+    assert store.stats()["write_errors"] == 1
+    store.put("kept", "fp", value(1))
+    assert store.flush(timeout=5)
+    assert store.get("kept", "fp") == value(1)
+
+
+def test_hits_are_tallied_into_one_update_per_entry(open_store):
+    store = open_store(max_bytes=10_000_000, flush_interval=50)
+    store.put("hot", "fp", value(10))
+    store.put("warm", "fp", value(10))
+    store.flush()
+
+    def touch():
+        for i in range(3000):
+            store.touch("hot" if i % 3 else "warm", "fp")
+
+    threads = [threading.Thread(target=touch) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert store._queue.qsize() <= 1
+    store.flush()
+    assert [key for key, _ in store.warm("fp", 10)] == ["hot", "warm"]
+    hits = dict(store._reader.execute("SELECT key, hits FROM recommendations").fetchall())
+    assert hits == {"hot": 8000, "warm": 4000}
+
+
+def test_fingerprints_keep_entries_apart(open_store):
+    store = open_store(max_bytes=10_000_000)
+    store.put("key", "catalog:model@0.7", value(1))
+    store.flush()
+    assert store.get("key", "catalog:model@0.7") == value(1)
+    assert store.get("key", "catalog:model@0.2") is None
@@ -0,0 +1,99 @@
+import asyncio
+from types import SimpleNamespace
+
+from services.heavy_hitters import SpaceSaving
+from services.precompute_scheduler import PrecomputeScheduler
+from services.recommendation_cache import RecommendationCache
+
+
+class FakeLLMService:
+    """
+    The precompute surface of LLMService: stores a placeholder answer, or fails for the keys in `failing`
+    """
+
+    def __init__(self, clock):
+        self.cache = RecommendationCache(max_entries=100, max_bytes=1 << 20, ttl_seconds=100, clock=clock)
+        self.product_service = SimpleNamespace(version=1)
+        self.failing = set()
+        self.calls = []
+
+    async def precompute(self, user_preferences, browsing_history, cache_key, catalog_version):
+        self.calls.append(cache_key)
+        if cache_key in self.failing:
+            raise RuntimeError("upstream down")
+        self.cache.put(cache_key, catalog_version, [{"product_id": cache_key}])
+
+
+def make_scheduler(calls_per_minute=100, **limits):
+    now = [0.0]
+    llm = FakeLLMService(lambda: now[0])
+    scheduler = PrecomputeScheduler(llm, tracked_keys=10, min_count=2, refresh_margin=30,
+                                    calls_per_minute=calls_per_minute, concurrency=2, **limits)
+    return scheduler, llm, now
+
+
+def record(scheduler, key, times):
+    for _ in range(times):
+        scheduler.record(key, {"category": key}, [])
+
+
+def test_popular_profiles_missing_from_the_cache_are_recomputed_once():
+    scheduler, llm, _ = make_scheduler()
+    record(scheduler, "a", 5)
+    record(scheduler, "b", 3)
+    record(scheduler, "rare", 1)
+
+    assert asyncio.run(scheduler.refresh()) == 2
+    assert llm.calls == ["a", "b"] and scheduler.refreshed == 2
+    # Cached profiles are left alone until they are about to expire
+    assert asyncio.run(scheduler.refresh()) == 0
+
+
+def test_expiring_and_invalidated_entries_are_refreshed_missing_ones_first():
+    scheduler, llm, now = make_scheduler()
+    record(scheduler, "a", 5)
+    record(scheduler, "b", 3)
+    llm.cache.put("a", 1, [])
+    now[0] = 80.0
+    llm.cache.put("b", 1, [])
+
+    # "a" expires within the 30 s margin, "b" does not
+    assert asyncio.run(scheduler.refresh()) == 1 and llm.calls == ["a"]
+
+    llm.product_service.version = 2
+    record(scheduler, "c", 9)
+    now[0] = 85.0
+    llm.cache.put("c", 1, [])
+    llm.calls.clear()
+    asyncio.run(scheduler.refresh())
+    # A reload invalidates every entry; they come back most popular first
+    assert llm.calls == ["c", "a", "b"]
+
+
+def test_the_call_budget_defers_the_rest_and_failures_are_counted():
+    scheduler, llm, _ = make_scheduler(calls_per_minute=2)
+    for key, times in (("a", 6), ("b", 5), ("c", 4)):
+        record(scheduler, key, times)
+    llm.failing.add("b")
+
+    assert asyncio.run(scheduler.refresh()) == 2
+    assert llm.calls == ["a", "b"]
+    assert (scheduler.refreshed, scheduler.failed, scheduler.deferred) == (1, 1, 1)
+    assert scheduler.stats()["budget_remaining"] == 0
+
+
+def test_space_saving_keeps_heavy_hitters_and_decays():
+    sketch = SpaceSaving(3)
+    for i in range(50):
+        sketch.offer("hot", payload=i)
+        sketch.offer(f"cold{i}")
+    (key, count, error, payload), = sketch.top(1)
+    # "hot" takes half of all traffic, so it is tracked and its count never underestimates
+    assert key == "hot" and count - error <= 50 <= count and payload == 49
+    assert len(sketch) == 3 and sketch.total == 100
+
+    sketch.decay()
+    assert sketch.top(1)[0][1] == count // 2 and sketch.total == 50
+    for _ in range(6):
+        sketch.decay()
+    assert len(sketch) == 0
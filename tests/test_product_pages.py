@@ -0,0 +1,100 @@
+import pytest
+
+from conftest import make_product
+from services.product_service import ProductService
+
+
+def all_pages(service, limit, **filters):
+    """
+    Walk every page and return (ids in order, number of pages)
+    """
+    ids, cursor, pages = [], None, 0
+    while True:
+        page = service.page_products(limit, cursor=cursor, **filters)
+        ids.extend(p["id"] for p in page["products"])
+        pages += 1
+        cursor = page["next_cursor"]
+        if cursor is None:
+            return ids, pages
+
+
+def test_pages_cover_the_catalog_in_id_order(catalog_file):
+    catalog_file([make_product(n) for n in (5, 3, 9, 1, 7, 2, 8)])
+    service = ProductService()
+    ids, pages = all_pages(service, 3)
+    assert ids == ["prod001", "prod002", "prod003", "prod005", "prod007", "prod008", "prod009"]
+    assert pages == 3
+    assert service.page_products(3)["total"] == 7
+
+
+def test_cursor_stays_valid_across_a_reload(catalog_file):
+    catalog_file([make_product(n) for n in range(1, 11)])
+    service = ProductService()
+    first = service.page_products(4)
+    assert [p["id"] for p in first["products"]] == ["prod001", "prod002", "prod003", "prod004"]
+
+    # Products before and after the cursor come and go, including the one the cursor names
+    catalog_file([make_product(n) for n in (0, 2, 3, 5, 6, 8, 9, 10, 11)])
+    _, changed = service.reload()
+    assert changed and service.version == 2
+
+    rest = []
+    cursor = first["next_cursor"]
+    while cursor is not None:
+        page = service.page_products(4, cursor=cursor)
+        rest.extend(p["id"] for p in page["products"])
+        cursor = page["next_cursor"]
+    # Everything after prod004 that still exists, once, and nothing already returned
+    assert rest == ["prod005", "prod006", "prod008", "prod009", "prod010", "prod011"]
+
+
+def test_filters_projection_and_totals(catalog_file):
+    catalog_file([make_product(n) for n in range(1, 25)])
+    service = ProductService()
+    filters = {"categories": ["Home"], "min_price": 20, "in_stock": True}
+    expected = [
+        make_product(n)["id"] for n in range(1, 25)
+        if make_product(n)["category"] == "Home" and make_product(n)["price"] >= 20 and make_product(n)["inventory"] > 0
+    ]
+    ids, _ = all_pages(service, 2, **filters)
+    assert ids == expected
+    assert service.page_products(2, **filters)["total"] == len(expected)
+
+    page = service.page_products(2, fields=["id", "price"])
+    assert page["products"] == [{"id": "prod001", "price": 17.5}, {"id": "prod002", "price": 25.0}]
+
+
+def test_malformed_cursor_is_rejected(catalog_file):
+    catalog_file([make_product(1)])
+    service = ProductService()
+    with pytest.raises(ValueError):
+        service.page_products(2, cursor="not a cursor!")
+
+
+def test_paged_endpoint_revalidates_with_etags():
+    from fastapi.testclient import TestClient
+    from app import app
+
+    with TestClient(app) as client:
+        response = client.get("/api/products", params={"limit": 5})
+        assert response.status_code == 200
+        body = response.json()
+        assert len(body["products"]) == 5 and body["next_cursor"]
+        etag = response.headers["etag"]
+
+        again = client.get("/api/products", params={"limit": 5}, headers={"If-None-Match": etag})
+        assert again.status_code == 304
+        following = client.get("/api/products", params={"limit": 5, "cursor": body["next_cursor"]})
+        assert following.headers["etag"] != etag
+
+
+@pytest.mark.parametrize("query", [{}, {"foo": "bar"}, {"fields": ""}, {"_": "1700000000", "category": ""}])
+def test_unrelated_or_empty_parameters_keep_the_full_array(query):
+    from fastapi.testclient import TestClient
+    from app import app
+
+    with TestClient(app) as client:
+        response = client.get("/api/products", params=query)
+        assert response.status_code == 200
+        assert isinstance(response.json(), list)
+        assert response.headers["etag"] == client.get("/api/products").headers["etag"]
@@ -0,0 +1,73 @@
+import pytest
+
+from conftest import make_product
+from services.product_service import ProductService
+
+PRODUCTS = [
+    make_product(1, tags=["red", "red", "sale"]),
+    make_product(2, tags=[]),
+    make_product(3, category=None, tags=None),
+    make_product(4, tags=["sale"]),
+    make_product(5, brand="Acme", tags=["red"]),
+    make_product(6, price=25.0),
+]
+
+
+def ids(products):
+    return [p["id"] for p in products]
+
+
+@pytest.fixture
+def service(catalog_file):
+    catalog_file(PRODUCTS)
+    return ProductService()
+
+
+def test_facet_lookups_list_matching_products_in_catalog_order(service):
+    assert ids(service.get_products_by_category("Sports")) == ["prod002", "prod006"]
+    assert ids(service.get_products_by_subcategory("Sub 1")) == ["prod001", "prod004"]
+    assert ids(service.get_products_by_brand("Acme")) == ["prod003", "prod005", "prod006"]
+    # A tag repeated within one product lists it once
+    assert ids(service.get_products_by_tag("red")) == ["prod001", "prod005"]
+    assert ids(service.get_products_by_tag("sale")) == ["prod001", "prod004"]
+    assert service.get_products_by_category("Garden") == [] and service.get_products_by_tag("blue") == []
+
+
+def test_price_ranges_are_inclusive_and_sorted_by_price(service):
+    assert ids(service.get_products_in_price_range(17.5, 32.5)) == ["prod001", "prod002", "prod006", "prod003"]
+    assert ids(service.get_products_in_price_range(high=20)) == ["prod001"]
+    assert ids(service.get_products_in_price_range(low=40)) == ["prod004", "prod005"]
+    assert len(service.get_products_in_price_range()) == len(PRODUCTS)
+
+
+def test_reload_publishes_a_new_version_only_when_the_content_changes(catalog_file):
+    catalog_file(PRODUCTS)
+    service = ProductService()
+    first = service.snapshot
+
+    catalog_file(list(PRODUCTS))
+    snapshot, changed = service.reload()
+    assert not changed and snapshot is first and service.version == 1 and service.reloads == 0
+
+    catalog_file(PRODUCTS + [make_product(7)])
+    snapshot, changed = service.reload()
+    assert changed and service.snapshot is snapshot and service.version == 2 and service.reloads == 1
+    assert service.get_product_by_id("prod007") is not None
+    # Readers holding the old snapshot keep a complete, unchanged catalog
+    assert len(first.products) == len(PRODUCTS) and "prod007" not in first.products_by_id
+
+
+def test_a_failed_reload_keeps_the_current_snapshot(catalog_file):
+    path = catalog_file(PRODUCTS)
+    service = ProductService()
+    current = service.snapshot
+
+    with open(path, "w", encoding="utf-8") as f:
+        f.write('[{"id": "prod001", ')
+    with pytest.raises(RuntimeError):
+        service.reload()
+    assert service.snapshot is current and service.version == 1
+    assert service.stats()["last_reload_error"]
+
+    catalog_file(PRODUCTS + [make_product(7)])
+    assert service.reload()[1] and service.stats()["last_reload_error"] is None
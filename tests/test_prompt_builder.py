@@ -0,0 +1,46 @@
+import pytest
+
+from conftest import make_product
+from services.product_service import ProductService
+from services.prompt_builder import PromptBuilder, PromptFragments, estimate_tokens, short_id
+
+
+@pytest.fixture
+def service(catalog_file):
+    catalog_file([make_product(n) for n in range(1, 41)])
+    return ProductService()
+
+
+def test_candidates_are_packed_until_the_budget_is_spent(service):
+    builder = PromptBuilder(service, context_window=800, max_completion_tokens=300, margin=50)
+    candidates = list(service.products)
+    prompt, packed = builder.build({"priceRange": "all"}, candidates[:2], candidates)
+
+    assert 0 < len(packed) < len(candidates)
+    # Best-first candidates are kept as a prefix, never skipping ahead to smaller rows
+    assert packed == candidates[:len(packed)]
+    assert estimate_tokens(prompt) <= builder.budget
+    rows = service.snapshot.prompt_fragments.rows
+    assert rows[len(packed) - 1] in prompt and rows[len(packed)] not in prompt
+
+
+def test_a_larger_budget_packs_more(service):
+    candidates = list(service.products)
+    small = PromptBuilder(service, context_window=800, max_completion_tokens=300, margin=50)
+    large = PromptBuilder(service, context_window=4096, max_completion_tokens=300, margin=50)
+    assert len(small.build({}, [], candidates)[1]) < len(large.build({}, [], candidates)[1]) == len(candidates)
+
+
+def test_unknown_candidates_are_skipped_and_history_rows_drop_the_id(service):
+    builder = PromptBuilder(service)
+    stranger = make_product(99)
+    prompt, packed = builder.build({}, [service.products[4]], [stranger, service.products[0]])
+    assert packed == [service.products[0]]
+    assert "\n0|Product 1|" in prompt
+    assert "\nProduct 5|" in prompt and "\n4|Product 5|" not in prompt
+
+
+def test_rows_escape_the_delimiter_and_use_base36_short_ids():
+    row = PromptFragments.encode(36 * 36 + 35, {"name": "A|B\nC", "category": None, "brand": "X", "price": 12.5})
+    assert row == "10z|A/B C||X|12.5|\n"
+    assert [short_id(code) for code in (0, 35, 36)] == ["0", "z", "10"]
@@ -0,0 +1,78 @@
+from services.recommendation_cache import RecommendationCache, canonical_request_key
+
+
+class FakeClock:
+    """
+    Manually advanced monotonic clock
+    """
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_hit_within_the_same_catalog_version():
+    cache = RecommendationCache(max_entries=10, max_bytes=10000, ttl_seconds=60)
+    cache.put("key", 1, {"count": 1})
+    assert cache.get("key", 1) == {"count": 1}
+    assert cache.stats()["hits"] == 1
+
+
+def test_version_bump_misses_and_drops_every_entry():
+    cache = RecommendationCache(max_entries=10, max_bytes=10000, ttl_seconds=60)
+    cache.put("a", 1, {"count": 1})
+    cache.put("b", 1, {"count": 2})
+
+    assert cache.get("a", 2) is None
+    stats = cache.stats()
+    assert stats["entries"] == 0
+    assert stats["catalog_version"] == 2
+    assert stats["invalidations"] == 1
+    # The old version's entries do not come back for a late reader either
+    assert cache.get("b", 1) is None
+
+
+def test_late_store_for_an_older_version_is_discarded():
+    cache = RecommendationCache(max_entries=10, max_bytes=10000, ttl_seconds=60)
+    cache.put("new", 2, {"count": 1})
+    cache.put("old", 1, {"count": 2})
+
+    assert cache.get("old", 2) is None
+    assert cache.get("new", 2) == {"count": 1}
+
+
+def test_entries_expire_after_the_ttl():
+    clock = FakeClock()
+    cache = RecommendationCache(max_entries=10, max_bytes=10000, ttl_seconds=60, clock=clock)
+    cache.put("key", 1, {"count": 1})
+    clock.now = 59.0
+    assert cache.get("key", 1) is not None
+    clock.now = 60.0
+    assert cache.get("key", 1) is None
+    assert cache.stats()["expirations"] == 1
+
+
+def test_least_recently_used_entry_is_evicted_first():
+    cache = RecommendationCache(max_entries=2, max_bytes=10000, ttl_seconds=60)
+    cache.put("a", 1, {"count": 1})
+    cache.put("b", 1, {"count": 2})
+    cache.get("a", 1)
+    cache.put("c", 1, {"count": 3})
+
+    assert cache.get("b", 1) is None
+    assert cache.get("a", 1) is not None
+    assert cache.get("c", 1) is not None
+
+
+def test_equivalent_requests_share_a_key():
+    first = canonical_request_key(
+        {"priceRange": "50-150", "categories": ["Home", "Electronics"], "brands": []}, ["prod001"]
+    )
+    second = canonical_request_key(
+        {"priceRange": " 50.0-150 ", "categories": ["Electronics", "Home", "Home"], "brands": None}, ["prod001"]
+    )
+    assert first == second
+    assert canonical_request_key({"priceRange": "50-150"}, ["prod002", "prod001"]) != \
+        canonical_request_key({"priceRange": "50-150"}, ["prod001", "prod002"])
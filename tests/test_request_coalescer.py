@@ -0,0 +1,86 @@
+import asyncio
+
+import pytest
+
+from services.request_coalescer import RequestCoalescer
+
+
+def test_concurrent_identical_requests_share_one_call():
+    async def scenario():
+        coalescer = RequestCoalescer()
+        calls = []
+        release = asyncio.Event()
+
+        async def work():
+            calls.append(1)
+            await release.wait()
+            return {"count": 3}
+
+        waiters = [asyncio.ensure_future(coalescer.run("key", work)) for _ in range(5)]
+        await asyncio.sleep(0)
+        assert coalescer.stats()["inflight"] == 1
+        release.set()
+        results = await asyncio.gather(*waiters)
+        return coalescer, calls, results
+
+    coalescer, calls, results = asyncio.run(scenario())
+    assert len(calls) == 1
+    assert all(result == {"count": 3} for result in results)
+    stats = coalescer.stats()
+    assert stats["upstream_calls"] == 1
+    assert stats["coalesced"] == 4
+    assert stats["inflight"] == 0
+
+
+def test_different_keys_and_later_requests_run_separately():
+    async def scenario():
+        coalescer = RequestCoalescer()
+        calls = []
+
+        async def work(key):
+            calls.append(key)
+            await asyncio.sleep(0)
+            return key
+
+        results = await asyncio.gather(coalescer.run("a", lambda: work("a")), coalescer.run("b", lambda: work("b")))
+        assert results == ["a", "b"]
+        # Nothing is kept once a call finishes, so the same key runs again
+        assert await coalescer.run("a", lambda: work("a")) == "a"
+        return calls
+
+    assert asyncio.run(scenario()) == ["a", "b", "a"]
+
+
+def test_cancelled_waiter_does_not_cancel_the_shared_call():
+    async def scenario():
+        coalescer = RequestCoalescer()
+        release = asyncio.Event()
+
+        async def work():
+            await release.wait()
+            return "done"
+
+        first = asyncio.ensure_future(coalescer.run("key", work))
+        second = asyncio.ensure_future(coalescer.run("key", work))
+        await asyncio.sleep(0)
+        first.cancel()
+        release.set()
+        with pytest.raises(asyncio.CancelledError):
+            await first
+        return await second
+
+    assert asyncio.run(scenario()) == "done"
+
+
+def test_errors_reach_every_waiter():
+    async def scenario():
+        coalescer = RequestCoalescer()
+
+        async def work():
+            await asyncio.sleep(0)
+            raise RuntimeError("upstream failed")
+
+        return await asyncio.gather(coalescer.run("key", work), coalescer.run("key", work), return_exceptions=True)
+
+    results = asyncio.run(scenario())
+    assert [type(result) for result in results] == [RuntimeError, RuntimeError]
@@ -0,0 +1,90 @@
+import json
+
+import pytest
+
+from services.response_parser import RecommendationParser, normalize_item
+
+PRODUCTS = {pid: {"id": pid, "name": pid.title()} for pid in ("prod001", "prod002", "prod003")}
+
+
+@pytest.fixture
+def parser():
+    return RecommendationParser(PRODUCTS.get)
+
+
+def ids(result):
+    return [r["product"]["id"] for r in result["recommendations"]]
+
+
+ITEMS = [
+    {"product_id": "prod001", "explanation": "Fits your budget", "score": 9},
+    {"product_id": "prod002", "explanation": "Popular [top] pick", "score": 7},
+]
+
+
+@pytest.mark.parametrize("text", [
+    json.dumps(ITEMS),
+    "```json\n" + json.dumps(ITEMS, indent=2) + "\n```",
+    "Sure! Based on [your history], here you go:\n" + json.dumps(ITEMS) + "\nLet me know [if] you need more.",
+])
+def test_well_formed_output_in_any_wrapping(parser, text):
+    result = parser.parse(text)
+    assert ids(result) == ["prod001", "prod002"]
+    assert result["count"] == 2
+    assert result["recommendations"][0] == {
+        "product": PRODUCTS["prod001"], "explanation": "Fits your budget", "confidence_score": 9
+    }
+    assert "error" not in result
+
+
+def test_malformed_output_falls_back_to_the_tolerant_scan(parser):
+    text = ('[{"product_id": "prod001", "explanation": "a", "score": 8,},'
+            ' {"product_id": "prod002" "explanation": "broken"},'
+            ' {"product_id": "prod003", "explanation": "c"}')
+    assert ids(parser.parse(text)) == ["prod001", "prod003"]
+
+
+def test_unknown_duplicate_and_invalid_items_are_dropped(parser):
+    text = json.dumps([
+        {"product_id": "prod404", "explanation": "unknown"},
+        {"product_id": "prod001", "explanation": "first"},
+        {"product_id": "prod001", "explanation": "duplicate"},
+        {"product_id": "", "explanation": "empty id"},
+        {"explanation": "no id"},
+        {"product_id": "prod002"},
+    ])
+    result = parser.parse(text)
+    assert ids(result) == ["prod001", "prod002"]
+    assert result["recommendations"][0]["explanation"] == "first"
+
+
+def test_nothing_usable_is_reported(parser):
+    for text in ("no recommendations today", "[]", json.dumps([{"product_id": "prod404"}])):
+        result = parser.parse(text)
+        assert result["recommendations"] == [] and result["count"] == 0
+        assert "error" in result
+    assert parser.parse(None)["error"] == "LLM response is not text"
+
+
+def test_per_call_resolver_overrides_the_default(parser):
+    short_ids = {"p1": PRODUCTS["prod003"]}
+    text = json.dumps([{"product_id": "p1"}, {"product_id": "prod001"}])
+    assert ids(parser.parse(text, short_ids.get)) == ["prod003"]
+    assert parser.enrich({"product_id": "p1"}, short_ids.get)["product"] is PRODUCTS["prod003"]
+    assert parser.enrich({"product_id": "p1"}) is None
+
+
+@pytest.mark.parametrize("item, expected", [
+    ({"product_id": " prod001 ", "explanation": "x", "score": 4}, ("prod001", "x", 4)),
+    ({"product_id": 17, "explanation": None}, ("17", "", 5)),
+    ({"product_id": "a", "explanation": 3, "score": "7.6"}, ("a", "3", 8)),
+    ({"product_id": "a", "score": 42}, ("a", "", 10)),
+    ({"product_id": "a", "score": -3}, ("a", "", 1)),
+    ({"product_id": "a", "score": "high"}, ("a", "", 5)),
+    ({"product_id": "a", "score": float("inf")}, ("a", "", 5)),
+    ({"product_id": True}, None),
+    ({"product_id": "  "}, None),
+    (["prod001"], None),
+])
+def test_normalize_item(item, expected):
+    assert normalize_item(item) == expected
@@ -0,0 +1,85 @@
+import asyncio
+
+import pytest
+
+from conftest import make_product
+from services.coview_model import CoViewModel
+from services.llm_service import LLMService
+from services.product_service import ProductService
+from services.retrieval_service import RetrievalService
+
+
+@pytest.fixture
+def service(catalog_file):
+    catalog_file([make_product(1, category="Office", price=39.99)] +
+                 [make_product(n, category="Home", price=80.0 + n) for n in range(2, 9)])
+    return ProductService()
+
+
+def test_history_covering_the_filtered_set_widens_to_the_rest_of_the_catalog(service):
+    retrieval = RetrievalService(service, top_k=5)
+    rows, scores = retrieval.rank({"priceRange": "0-50", "categories": ["Office"]}, ["prod001"])
+    ids = [service.products[i]["id"] for i in rows]
+    assert len(ids) == 5 and "prod001" not in ids
+    assert len(scores) == 5
+
+
+def test_history_covering_the_catalog_leaves_no_candidates(service):
+    retrieval = RetrievalService(service, top_k=5)
+    history = [p["id"] for p in service.products]
+    rows, _ = retrieval.rank({"categories": ["Office"]}, history)
+    assert rows.size == 0
+
+
+def test_no_candidates_skips_the_upstream_call(service):
+    llm = LLMService(service, RetrievalService(service, top_k=5))
+
+    async def unreachable(*args, **kwargs):
+        raise AssertionError("the LLM must not be called without candidates")
+
+    llm._acomplete = unreachable
+    history = [p["id"] for p in service.products]
+    result = asyncio.run(llm._agenerate_uncached({"categories": ["Office"]}, history, "key", service.version))
+    assert result["recommendations"] == [] and result["count"] == 0
+
+
+@pytest.fixture
+def catalog(catalog_file):
+    catalog_file([make_product(n, rating=4.0, tags=[f"tag{n % 3}"]) for n in range(1, 13)])
+    return ProductService()
+
+
+def ranked_ids(service, rows):
+    return [service.products[i]["id"] for i in rows]
+
+
+def test_ranking_follows_the_filter_and_excludes_the_history(catalog):
+    retrieval = RetrievalService(catalog, top_k=20)
+    rows, scores = retrieval.rank({"categories": ["Home", "Sports"], "inStock": True}, ["prod005", "unknown"])
+    ids = ranked_ids(catalog, rows)
+    products = {p["id"]: p for p in catalog.products}
+    assert "prod005" not in ids
+    assert all(products[i]["category"] in ("Home", "Sports") and products[i]["inventory"] > 0 for i in ids)
+    assert list(scores) == sorted(scores, reverse=True)
+    # prod002 shares prod005's brand and tag, prod009 only its category
+    assert ids[:2] == ["prod002", "prod009"]
+
+
+def test_ties_keep_catalog_order_and_results_are_repeatable(catalog):
+    retrieval = RetrievalService(catalog, top_k=4)
+    rows, scores = retrieval.rank({}, [])
+    assert ranked_ids(catalog, rows) == ["prod001", "prod002", "prod003", "prod004"]
+    assert len(set(scores.tolist())) == 1
+    again, _ = retrieval.rank({}, [])
+    assert again.tolist() == rows.tolist()
+
+
+def test_co_viewed_products_are_boosted(catalog):
+    coview = CoViewModel(max_items=100, neighbours=5, half_life=3600)
+    for _ in range(3):
+        coview.record(["prod002", "prod011"])
+        coview.record(["prod011", "prod002"])
+    without, _ = RetrievalService(catalog, top_k=3).rank({}, ["prod002"])
+    with_coview, _ = RetrievalService(catalog, top_k=3, coview=coview).rank({}, ["prod002"])
+    assert ranked_ids(catalog, without)[0] != "prod011"
+    assert ranked_ids(catalog, with_coview)[0] == "prod011"
@@ -0,0 +1,182 @@
+import base64
+import hashlib
+import hmac
+import json
+
+import pytest
+
+from conftest import make_product
+from services.product_service import ProductService
+from services.session_store import SequenceGap, SessionStore, session_key
+
+
+class FakeClock:
+    """
+    Manually advanced monotonic clock
+    """
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def service(catalog_file):
+    catalog_file([make_product(n) for n in range(1, 21)])
+    return ProductService()
+
+
+def ids(*numbers):
+    return [f"prod{n:03d}" for n in numbers]
+
+
+def prompt_rows(service, history):
+    """
+    The prompt rows a full rebuild would render for the history's ids
+    """
+    catalog = service.snapshot
+    rows = catalog.prompt_fragments.rows
+    return "".join(
+        rows[catalog.columns.row_by_id[pid]].split("|", 1)[1] for pid in history.ids if pid in catalog.columns.row_by_id
+    )
+
+
+def test_deltas_append_in_order(service):
+    store = SessionStore(service, history_size=10)
+    assert store.append("s", ids(1, 2), seq=0) == {"received": 2, "length": 2}
+    assert store.append("s", ids(3), seq=2) == {"received": 3, "length": 3}
+    history = store.history("s")
+    assert list(history.ids) == ids(1, 2, 3)
+    assert history.rows.tolist() == [0, 1, 2]
+    assert history.prompt_rows == prompt_rows(service, history)
+
+
+def test_retried_delta_skips_the_overlap(service):
+    store = SessionStore(service, history_size=10)
+    store.append("s", ids(1, 2, 3), seq=0)
+    # The client did not see the last response and resends from seq 1 with one new item
+    assert store.append("s", ids(2, 3, 4), seq=1) == {"received": 4, "length": 4}
+    # An exact replay changes nothing
+    assert store.append("s", ids(2, 3, 4), seq=1) == {"received": 4, "length": 4}
+    assert list(store.history("s").ids) == ids(1, 2, 3, 4)
+
+
+def test_gap_raises_with_what_the_server_received(service):
+    store = SessionStore(service, history_size=10)
+    store.append("s", ids(1, 2), seq=0)
+    with pytest.raises(SequenceGap) as gap:
+        store.append("s", ids(5), seq=3)
+    assert gap.value.received == 2
+    assert list(store.history("s").ids) == ids(1, 2)
+
+
+def test_negative_seq_is_rejected(service):
+    store = SessionStore(service, history_size=10)
+    with pytest.raises(ValueError):
+        store.append("s", ids(1), seq=-1)
+
+
+def test_reset_starts_the_sequence_over(service):
+    store = SessionStore(service, history_size=10)
+    store.append("s", ids(1, 2, 3), seq=0)
+    assert store.append("s", ids(4), seq=7, reset=True) == {"received": 1, "length": 1}
+    assert list(store.history("s").ids) == ids(4)
+
+
+def test_ring_evicts_the_oldest_and_keeps_features_in_step(service):
+    store = SessionStore(service, history_size=3)
+    store.append("s", ids(1, 2, 3, 4, 5))
+    history = store.history("s")
+    assert list(history.ids) == ids(3, 4, 5)
+    assert history.received == 5
+    assert history.prompt_rows == prompt_rows(service, history)
+    expected = {}
+    for pid in history.ids:
+        code = int(service.columns.category_codes[service.columns.row_by_id[pid]])
+        expected[code] = expected.get(code, 0) + 1
+    assert history.category_counts == expected
+
+
+def test_re_viewed_product_moves_to_the_newest_position(service):
+    store = SessionStore(service, history_size=4)
+    store.append("s", ids(1, 2, 3, 2))
+    history = store.history("s")
+    assert list(history.ids) == ids(1, 3, 2)
+    assert [p["id"] for p in history.products] == ids(1, 3, 2)
+    assert history.prompt_rows == prompt_rows(service, history)
+    # The moved product is not the oldest any more, so it survives the next eviction
+    store.append("s", ids(4, 5))
+    assert list(store.history("s").ids) == ids(3, 2, 4, 5)
+
+
+def test_catalog_reload_rebuilds_features_once(service, catalog_file):
+    store = SessionStore(service, history_size=10)
+    store.append("s", ids(1, 2, 3))
+    catalog_file([make_product(n, name=f"Renamed {n}") for n in (2, 3, 4)])
+    service.reload()
+
+    history = store.history("s")
+    assert history.catalog_version == service.version
+    assert [p["name"] for p in history.products] == ["Renamed 2", "Renamed 3"]
+    assert history.prompt_rows == prompt_rows(service, history)
+    assert store.history("s") is history
+    assert store.stats()["feature_rebuilds"] == 1
+
+
+def test_idle_sessions_expire_and_the_least_recent_is_evicted(service):
+    clock = FakeClock()
+    store = SessionStore(service, max_sessions=2, history_size=10, ttl_seconds=60, clock=clock)
+    store.append("a", ids(1))
+    store.append("b", ids(2))
+    store.history("a")
+    store.append("c", ids(3))
+    assert store.history("b") is None
+    assert store.stats()["evictions"] == 1
+
+    clock.now = 61.0
+    assert store.history("a") is None
+    assert store.stats()["expirations"] == 2
+
+
+def make_token(secret, claims):
+    def segment(data):
+        return base64.urlsafe_b64encode(json.dumps(data).encode()).rstrip(b"=").decode()
+
+    signing_input = f"{segment({'alg': 'HS256', 'typ': 'JWT'})}.{segment(claims)}"
+    signature = hmac.new(secret.encode(), signing_input.encode(), hashlib.sha256).digest()
+    return f"{signing_input}.{base64.urlsafe_b64encode(signature).rstrip(b'=').decode()}"
+
+
+def test_session_key_prefers_a_verified_user():
+    session_id = "a" * 20
+    token = make_token("secret", {"sub": 42})
+    assert session_key(f"Bearer {token}", session_id, secret="secret") == "user:42"
+    assert session_key(f"Bearer {token}", session_id, secret="other") == "sid:" + session_id
+    expired = make_token("secret", {"sub": 42, "exp": 1})
+    assert session_key(f"Bearer {expired}", None, secret="secret") is None
+    assert session_key(None, "short", secret="secret") is None
+
+
+def test_history_endpoint_reports_gaps_with_409():
+    from fastapi.testclient import TestClient
+    from app import app
+
+    headers = {"X-Session-Id": "test-session-0123456789"}
+    with TestClient(app) as client:
+        first = client.post("/api/session/history", json={"append": ids(1, 2), "seq": 0, "reset": True},
+                            headers=headers)
+        assert first.json() == {"received": 2, "length": 2}
+
+        gap = client.post("/api/session/history", json={"append": ids(4), "seq": 3}, headers=headers)
+        assert gap.status_code == 409
+        assert gap.json()["received"] == 2
+
+        retry = client.post("/api/session/history", json={"append": ids(2, 3), "seq": 1}, headers=headers)
+        assert retry.json() == {"received": 3, "length": 3}
+        assert client.get("/api/session/history", headers=headers).json()["history"] == ids(1, 2, 3)
+
+        negative = client.post("/api/session/history", json={"append": ids(5), "seq": -1}, headers=headers)
+        assert negative.status_code == 422
+        assert client.post("/api/session/history", json={"append": ids(5)}).status_code == 400
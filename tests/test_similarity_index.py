@@ -0,0 +1,44 @@
+import numpy as np
+
+from conftest import make_product
+from services.similarity_index import SimilarityIndex
+
+
+def catalog(n, **fields):
+    return [make_product(i, **fields) for i in range(n)]
+
+
+def test_auto_mode_switches_to_lsh_above_the_exact_limit():
+    products = catalog(20)
+    assert not SimilarityIndex(products, dim=64, mode="auto", exact_limit=20).approximate
+    assert SimilarityIndex(products, dim=64, mode="auto", exact_limit=19).approximate
+    assert SimilarityIndex(products, dim=64, mode="approximate", exact_limit=1000).approximate
+    assert not SimilarityIndex(products, dim=64, mode="exact", exact_limit=1).approximate
+
+
+def test_oversized_buckets_are_capped():
+    # Identical text hashes every product into the same bucket of every table
+    products = catalog(300, description="same words", features=["same"], tags=["same"])
+    index = SimilarityIndex(products, dim=64, mode="approximate", n_tables=4, max_bucket=25)
+    candidates = index._lsh_candidates(index.matrix[0], min_candidates=1)
+    assert 25 <= candidates.size <= 4 * 25
+    rows, _ = index.similar_to_rows([0], k=10)
+    assert rows.size == 10 and 0 not in rows
+
+
+def test_approximate_and_exact_agree_on_a_clear_nearest_neighbour():
+    products = catalog(400)
+    products[123] = make_product(123, description="titanium espresso grinder burr", tags=["coffee", "grinder"])
+    products[321] = make_product(321, description="titanium espresso grinder burrs", tags=["coffee", "grinder"])
+    exact = SimilarityIndex(products, dim=256, mode="exact")
+    approximate = SimilarityIndex(products, dim=256, mode="approximate", matrix=exact.matrix)
+    assert exact.similar_to_rows([123], k=1)[0].tolist() == [321]
+    assert approximate.similar_to_rows([123], k=1)[0].tolist() == [321]
+
+
+def test_a_precomputed_matrix_is_used_only_when_its_shape_matches():
+    products = catalog(10)
+    matrix = np.random.default_rng(0).random((10, 32), dtype=np.float32)
+    assert SimilarityIndex(products, dim=32, mode="exact", matrix=matrix).matrix is matrix
+    rebuilt = SimilarityIndex(products, dim=64, mode="exact", matrix=matrix).matrix
+    assert rebuilt.shape == (10, 64)
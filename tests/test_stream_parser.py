@@ -0,0 +1,94 @@
+import json
+import random
+
+import pytest
+
+from services.stream_parser import IncrementalJSONArrayParser
+
+ITEMS = [
+    {"product_id": "prod001", "explanation": "Matches your [Electronics] interest {and} budget", "score": 9},
+    {"product_id": "prod002", "explanation": "Quoted \"brackets\" ] } [ { and a backslash \\", "score": 8},
+    {"product_id": "prod003", "explanation": "Unicode é中 and an escaped \\\" quote", "score": 7,
+     "extra": {"nested": [1, [2, {"x": "]"}]]}},
+]
+
+RESPONSES = [
+    json.dumps(ITEMS),
+    json.dumps(ITEMS, indent=2),
+    "Here are my top [3] picks {see below}:\n```json\n" + json.dumps(ITEMS, indent=1) + "\n```\nEnjoy [them]!",
+    json.dumps(ITEMS, ensure_ascii=False),
+]
+
+
+def parse_chunks(chunks):
+    """
+    Feed chunks to a fresh parser and return (objects, parser)
+    """
+    parser = IncrementalJSONArrayParser()
+    objects = []
+    for chunk in chunks:
+        objects.extend(parser.feed(chunk))
+    return objects, parser
+
+
+def split(text, cuts):
+    """
+    Cut text at the given sorted positions
+    """
+    bounds = [0, *cuts, len(text)]
+    return [text[a:b] for a, b in zip(bounds, bounds[1:])]
+
+
+@pytest.mark.parametrize("text", RESPONSES)
+def test_every_single_split_point_gives_the_same_objects(text):
+    for cut in range(len(text) + 1):
+        objects, parser = parse_chunks(split(text, [cut]))
+        assert objects == ITEMS, f"split at {cut}"
+        assert parser.finished
+
+
+@pytest.mark.parametrize("text", RESPONSES)
+def test_random_chunkings_give_the_same_objects(text):
+    rng = random.Random(1234)
+    for _ in range(300):
+        cuts = sorted(rng.sample(range(len(text) + 1), rng.randint(1, 40)))
+        objects, parser = parse_chunks(split(text, cuts))
+        assert objects == ITEMS, f"cuts {cuts}"
+        assert parser.finished
+
+
+def test_one_character_chunks():
+    text = RESPONSES[2]
+    objects, parser = parse_chunks(list(text))
+    assert objects == ITEMS
+    assert parser.finished
+
+
+def test_objects_are_returned_as_soon_as_they_close():
+    text = json.dumps(ITEMS)
+    first_end = 1 + len(json.dumps(ITEMS[0]))
+    parser = IncrementalJSONArrayParser()
+    assert parser.feed(text[:first_end - 1]) == []
+    assert parser.feed(text[first_end - 1:first_end]) == ITEMS[:1]
+    assert not parser.finished
+
+
+def test_trailing_commas_are_tolerated_and_malformed_objects_skipped():
+    text = '[{"product_id": "a", "score": 5,}, {"product_id": "b" "score": 1}, {"product_id": "c"}]'
+    for cut in range(len(text) + 1):
+        objects, parser = parse_chunks(split(text, [cut]))
+        assert objects == [{"product_id": "a", "score": 5}, {"product_id": "c"}]
+        assert parser.skipped == 1
+
+
+def test_text_after_the_array_is_ignored():
+    objects, parser = parse_chunks(['[{"product_id": "a"}]', ' [{"product_id": "b"}]'])
+    assert objects == [{"product_id": "a"}]
+    assert parser.finished
+
+
+def test_truncated_stream_keeps_the_completed_objects():
+    text = json.dumps(ITEMS)
+    objects, parser = parse_chunks([text[:text.rindex("{") + 10]])
+    assert objects == ITEMS[:2]
+    assert not parser.finished